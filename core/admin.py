@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.contenttypes.admin import GenericTabularInline
+from django.db.models import F
+from django.utils.html import format_html
 from store.admin import ProductAdmin, ProductImageInline
 from tags.models import TaggedItem
 from store.models import Product
-from .models import User
+from .models import SlowQuery, User
 
 
 @admin.register(User)
@@ -40,3 +42,55 @@ class CoreProductAdmin(ProductAdmin):
 
 admin.site.unregister(Product)
 admin.site.register(Product, CoreProductAdmin)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = [
+        "fingerprint_text",
+        "view",
+        "calls",
+        "total_time",
+        "mean_time",
+        "max_time",
+        "last_seen",
+    ]
+    list_filter = ["database", "view"]
+    list_per_page = 50
+    ordering = ["-total_time"]
+    search_fields = ["fingerprint", "view"]
+    fields = [
+        "view",
+        "database",
+        "calls",
+        "total_time",
+        "max_time",
+        "first_seen",
+        "last_seen",
+        "fingerprint",
+        "sql",
+        "plan_text",
+        "plan_captured_at",
+    ]
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(mean=F("total_time") / F("calls"))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="fingerprint")
+    def fingerprint_text(self, query: SlowQuery):
+        return query.fingerprint[:120]
+
+    @admin.display(description="mean_time", ordering="mean")
+    def mean_time(self, query: SlowQuery):
+        return round(query.mean_time, 4)
+
+    @admin.display(description="plan")
+    def plan_text(self, query: SlowQuery):
+        return format_html("<pre>{}</pre>", query.plan or "Not captured yet")
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
@@ -6,4 +7,22 @@ class CoreConfig(AppConfig):
     name = "core"
 
     def ready(self) -> None:
+        import core.checks
         import core.signals.handlers
+        from django.contrib.admin.checks import check_dependencies
+        from django.core.checks import registry
+
+        # Replaced by core.checks.check_admin_dependencies, which runs the
+        # admin's middleware checks against the middleware profiles
+        registry.registry.registered_checks.discard(check_dependencies)
+
+        if getattr(settings, "METRICS_ENABLED", True):
+            from rest_framework import serializers
+            from .metrics import timed_data
+
+            # Serializer time for the metrics, outermost .data only
+            for serializer_class in (
+                serializers.Serializer,
+                serializers.ListSerializer,
+            ):
+                serializer_class.data = timed_data(serializer_class.__dict__["data"])
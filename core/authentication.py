@@ -0,0 +1,62 @@
+from functools import partial
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+# Access tokens issued by core.serializers.TokenObtainPairSerializer carry the
+# customer_id, is_staff and membership claims. Requests authenticated with
+# them get a ClaimsUser: the claims (and everything derived from them, like
+# is_authenticated) are answered from the token, and the user row is only
+# loaded if a view reads any other attribute.
+#
+# Claims are trusted until the access token expires, which is why
+# ACCESS_TOKEN_LIFETIME is short; refreshing re-reads them from the database.
+
+CLAIMS = ["customer_id", "is_staff", "membership"]
+
+
+def set_user_claims(token, user):
+    token["customer_id"] = user.customer.id
+    token["is_staff"] = user.is_staff
+    token["membership"] = user.customer.membership
+    return token
+
+
+class ClaimsUser(SimpleLazyObject):
+    def __init__(self, token, load_user):
+        super().__init__(load_user)
+        self.__dict__["token"] = token
+
+    # Properties win over LazyObject.__getattr__, so these never load the user
+    @property
+    def pk(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    id = pk
+
+    @property
+    def customer_id(self):
+        return self.token["customer_id"]
+
+    @property
+    def is_staff(self):
+        return self.token["is_staff"]
+
+    @property
+    def membership(self):
+        return self.token["membership"]
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in CLAIMS):
+            # Tokens issued before the claims existed
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token, partial(super().get_user, validated_token))
@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.contrib.admin.checks import check_dependencies
+from django.core import checks
+from django.urls import NoReverseMatch, reverse
+from django.utils.module_loading import import_string
+from .middleware import match_profile, profile_prefixes
+
+# System checks for the middleware profiles (see core.middleware).
+#
+# The admin's own middleware checks (admin.E408 - admin.E410) only look at
+# MIDDLEWARE, so CoreConfig.ready() swaps admin's check_dependencies for
+# check_admin_dependencies below, which runs them against MIDDLEWARE plus the
+# profile that serves the admin.
+
+PROFILE_MIDDLEWARE = "core.middleware.MiddlewareProfileMiddleware"
+SESSION_MIDDLEWARE = "django.contrib.sessions.middleware.SessionMiddleware"
+AUTHENTICATION_MIDDLEWARE = "django.contrib.auth.middleware.AuthenticationMiddleware"
+MESSAGE_MIDDLEWARE = "django.contrib.messages.middleware.MessageMiddleware"
+
+ADMIN_MIDDLEWARE = {
+    "admin.E408": AUTHENTICATION_MIDDLEWARE,
+    "admin.E409": MESSAGE_MIDDLEWARE,
+    "admin.E410": SESSION_MIDDLEWARE,
+}
+
+
+def uses_profiles():
+    return PROFILE_MIDDLEWARE in settings.MIDDLEWARE
+
+
+def index_of(class_path, paths):
+    """Position of the first of `paths` that is `class_path` or a subclass"""
+    cls = import_string(class_path)
+    for index, path in enumerate(paths):
+        try:
+            candidate = import_string(path)
+        except ImportError:
+            continue  # Reported by check_middleware_profiles
+        if isinstance(candidate, type) and issubclass(candidate, cls):
+            return index
+    return None
+
+
+@checks.register()
+def check_middleware_profiles(app_configs, **kwargs):
+    if not uses_profiles():
+        return []
+    errors = []
+    profiles = getattr(settings, "MIDDLEWARE_PROFILES", {})
+    if "default" not in profiles:
+        errors.append(
+            checks.Error(
+                "MIDDLEWARE_PROFILES has no 'default' profile.",
+                hint="Paths that match no MIDDLEWARE_PROFILE_PREFIXES use it.",
+                id="core.E001",
+            )
+        )
+    for prefix, name in profile_prefixes():
+        if name not in profiles:
+            errors.append(
+                checks.Error(
+                    f"MIDDLEWARE_PROFILE_PREFIXES maps {prefix!r} to the unknown "
+                    f"middleware profile {name!r}.",
+                    id="core.E002",
+                )
+            )
+
+    # Profiles run after MIDDLEWARE, so a session middleware there serves all
+    global_session = index_of(SESSION_MIDDLEWARE, settings.MIDDLEWARE) is not None
+    for name, paths in profiles.items():
+        for path in paths:
+            try:
+                import_string(path)
+            except ImportError:
+                errors.append(
+                    checks.Error(
+                        f"Middleware profile {name!r} has {path!r}, which can't "
+                        "be imported.",
+                        id="core.E003",
+                    )
+                )
+        session = index_of(SESSION_MIDDLEWARE, paths)
+        authentication = index_of(AUTHENTICATION_MIDDLEWARE, paths)
+        if (
+            authentication is not None
+            and not global_session
+            and (session is None or session > authentication)
+        ):
+            errors.append(
+                checks.Error(
+                    f"Middleware profile {name!r} runs "
+                    f"'{AUTHENTICATION_MIDDLEWARE}' without "
+                    f"'{SESSION_MIDDLEWARE}' before it.",
+                    id="core.E004",
+                )
+            )
+    return errors
+
+
+@checks.register(checks.Tags.admin)
+def check_admin_dependencies(app_configs, **kwargs):
+    errors = check_dependencies(app_configs=app_configs, **kwargs)
+    if not uses_profiles():
+        return errors
+
+    try:
+        admin_path = reverse("admin:index")
+    except NoReverseMatch:
+        return errors
+    name = match_profile(profile_prefixes(), admin_path)
+    paths = [
+        *settings.MIDDLEWARE,
+        *getattr(settings, "MIDDLEWARE_PROFILES", {}).get(name, []),
+    ]
+    errors = [error for error in errors if error.id not in ADMIN_MIDDLEWARE]
+    for error_id, class_path in ADMIN_MIDDLEWARE.items():
+        if index_of(class_path, paths) is None:
+            errors.append(
+                checks.Error(
+                    f"'{class_path}' must be in MIDDLEWARE or in the {name!r} "
+                    f"middleware profile, which serves {admin_path}, in order "
+                    "to use the admin application.",
+                    id=error_id,
+                )
+            )
+    return errors
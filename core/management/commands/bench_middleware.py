@@ -0,0 +1,68 @@
+from statistics import median
+from time import perf_counter
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+from core.middleware import Profile
+
+
+def view(request):
+    return JsonResponse({})
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request cost of the middleware alone: the single "
+        "chain every URL used to get versus the per-prefix profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--path", action="append", help="Defaults to /store/ and /admin/ URLs"
+        )
+
+    def handle(self, *args, **options):
+        paths = options["path"] or ["/store/products/", "/admin/store/product/"]
+        flat = settings.MIDDLEWARE + settings.MIDDLEWARE_PROFILES["default"]
+        flat.remove("core.middleware.MiddlewareProfileMiddleware")
+        chains = {
+            "single chain": self.build(flat),
+            "profiles": self.build(settings.MIDDLEWARE),
+        }
+
+        factory = RequestFactory()
+        for path in paths:
+            timings = {
+                name: self.time(chain, factory, path, options["requests"])
+                for name, chain in chains.items()
+            }
+            before, after = timings["single chain"], timings["profiles"]
+            self.stdout.write(
+                f"{path}: {before:.1f}us -> {after:.1f}us per request "
+                f"({before / after:.2f}x)"
+            )
+
+    def build(self, paths):
+        # Run the process_view hooks too, as the handler would before a view
+        def get_response(request):
+            for hook in profile.view_middleware:
+                response = hook(request, view, (), {})
+                if response is not None:
+                    return response
+            return view(request)
+
+        profile = Profile(paths, get_response)
+        return profile.chain
+
+    def time(self, chain, factory, path, count):
+        for _ in range(min(count, 100)):
+            chain(factory.get(path))
+        samples = []
+        for _ in range(count):
+            request = factory.get(path)
+            start = perf_counter()
+            chain(request)
+            samples.append(perf_counter() - start)
+        return median(samples) * 1_000_000
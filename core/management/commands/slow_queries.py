@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from core.models import SlowQuery
+
+SORTS = {
+    "total": "-total_time",
+    "mean": "-mean",
+    "max": "-max_time",
+    "calls": "-calls",
+}
+
+
+class Command(BaseCommand):
+    help = "List the slowest query fingerprints recorded by the slow query log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--sort", choices=SORTS, default="total")
+        parser.add_argument("--view", help="Only queries issued by this view")
+        parser.add_argument(
+            "--plans", action="store_true", help="Print the captured EXPLAIN plans"
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="Delete the recorded queries"
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} slow queries"))
+            return
+
+        queries = SlowQuery.objects.annotate(mean=F("total_time") / F("calls"))
+        if options["view"]:
+            queries = queries.filter(view=options["view"])
+        queries = queries.order_by(SORTS[options["sort"]])[: options["limit"]]
+
+        for query in queries:
+            self.stdout.write(
+                f"{query.total_time:9.3f}s total  {query.calls:6} calls  "
+                f"{query.mean * 1000:8.1f}ms mean  {query.max_time * 1000:8.1f}ms max  "
+                f"{query.view} ({query.database})"
+            )
+            self.stdout.write(f"    {query.fingerprint}")
+            if options["plans"] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f"      {line}")
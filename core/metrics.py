@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from uuid import uuid4
+from django.conf import settings
+
+# Request metrics in the Prometheus text format.
+#
+# Every metric is kept as plain counters: histograms become cumulative
+# `_bucket`, `_sum` and `_count` counters, the way Prometheus exposes them.
+# That makes aggregating worker processes a sum: each process writes its
+# totals to its own file in METRICS_DIR every METRICS_FLUSH_INTERVAL seconds
+# and /metrics adds up all the files. Files of stopped workers are kept, so
+# the totals never go backwards; clear the directory when deploying.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    "storefront_requests_total": (
+        "counter",
+        "Requests by view, method and status code",
+        None,
+    ),
+    "storefront_request_duration_seconds": (
+        "histogram",
+        "Time from the first middleware to the response, by view",
+        LATENCY_BUCKETS,
+    ),
+    "storefront_db_queries": (
+        "histogram",
+        "ORM queries per request, by view",
+        QUERY_BUCKETS,
+    ),
+    "storefront_db_query_duration_seconds": (
+        "histogram",
+        "Time spent in ORM queries per request, by view",
+        LATENCY_BUCKETS,
+    ),
+    "storefront_serializer_duration_seconds": (
+        "histogram",
+        "Time spent in serializer .data per request, by view",
+        LATENCY_BUCKETS,
+    ),
+    "storefront_cache_requests_total": (
+        "counter",
+        "Cache lookups by cache, view and result (hit / miss)",
+        None,
+    ),
+}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        # (name, labels) -> [observations per bucket..., +Inf, sum]; expanded
+        # into cumulative counters only when read
+        self.histograms = {}
+        self.file_name = f"{os.getpid()}-{uuid4().hex}.json"
+        self.flushed_at = time.monotonic()
+
+    def after_fork(self):
+        """Start a forked worker on its own file, without the parent's totals
+        (they stay in the parent's file) or a lock held mid-fork"""
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.histograms = {}
+        self.file_name = f"{os.getpid()}-{uuid4().hex}.json"
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] += amount
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            values = dict(self.values)
+            histograms = [
+                (key, list(counts)) for key, counts in self.histograms.items()
+            ]
+        for (name, labels), counts in histograms:
+            bounds = [*map(str, METRICS[name][2]), "+Inf"]
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                values[(f"{name}_bucket", (*labels, ("le", bound)))] = total
+            values[(f"{name}_sum", labels)] = counts[-1]
+            values[(f"{name}_count", labels)] = total
+        return values
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+            self.histograms.clear()
+
+    def flush(self, force=False):
+        directory = getattr(settings, "METRICS_DIR", None)
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+        if not directory or (
+            not force and time.monotonic() - self.flushed_at < interval
+        ):
+            return
+        self.flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        rows = [
+            [name, labels, value] for (name, labels), value in self.snapshot().items()
+        ]
+        # Write and rename, so readers never see a half written file
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(rows, file)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Totals of every process (just this one without METRICS_DIR)"""
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        totals = defaultdict(float)
+        for file_name in os.listdir(directory):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as file:
+                    rows = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                totals[(name, tuple(tuple(label) for label in labels))] += value
+        return totals
+
+
+registry = Registry()
+# Preforking servers (gunicorn --preload) import this module before forking
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry.after_fork)
+
+
+def render(values):
+    by_metric = defaultdict(list)
+    for (name, labels), value in values.items():
+        for suffix in ("_bucket", "_sum", "_count"):
+            base = name.removesuffix(suffix)
+            if base != name and base in METRICS:
+                break
+        else:
+            base = name
+        by_metric[base].append((name, labels, value))
+
+    lines = []
+    for base in sorted(by_metric):
+        kind, help_text, _ = METRICS[base]
+        lines.append(f"# HELP {base} {help_text}")
+        lines.append(f"# TYPE {base} {kind}")
+        for name, labels, value in sorted(by_metric[base], key=sort_key):
+            label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels)
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f"{name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def sort_key(sample):
+    name, labels, _ = sample
+    others = [label for label in labels if label[0] != "le"]
+    bound = next((float(value) for key, value in labels if key == "le"), 0)
+    return others, name, bound
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Per request measurements, filled in by MetricsMiddleware and the hooks below
+
+
+class RequestMetrics:
+    __slots__ = ["view", "queries", "query_time", "serializer_time", "serializing"]
+
+    def __init__(self):
+        self.view = "unmatched"
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+
+current_request = ContextVar("current_request_metrics", default=None)
+
+
+def record_cache(cache, hit):
+    state = current_request.get()
+    registry.inc(
+        "storefront_cache_requests_total",
+        cache=cache,
+        view=state.view if state else "none",
+        result="hit" if hit else "miss",
+    )
+
+
+def timed_data(data):
+    """Wraps a serializer's `data` property to add to serializer_time"""
+
+    def wrapper(serializer):
+        state = current_request.get()
+        # Nested serializers are part of the outermost one's time
+        if state is None or state.serializing:
+            return data.fget(serializer)
+        state.serializing = True
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            state.serializer_time += time.perf_counter() - start
+            state.serializing = False
+
+    return property(wrapper)
@@ -0,0 +1,375 @@
+import gzip
+import hashlib
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from . import metrics, profiling
+from .routers import _replica_reads
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Middleware profiles.
+#
+# MIDDLEWARE only holds what every request needs; the rest comes from the
+# MIDDLEWARE_PROFILES chain picked by the longest MIDDLEWARE_PROFILE_PREFIXES
+# match ("default" otherwise). Each chain is built once, at startup, the same
+# way Django builds MIDDLEWARE, so JWT API requests skip sessions, CSRF,
+# messages and the debug toolbar instead of running them for nothing. The
+# chains are validated by the system checks in core.checks.
+
+
+class Profile:
+    def __init__(self, paths, get_response):
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+        handler = get_response
+        for path in reversed(paths):
+            try:
+                middleware = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, "process_view"):
+                self.view_middleware.insert(0, middleware.process_view)
+            if hasattr(middleware, "process_template_response"):
+                self.template_response_middleware.append(
+                    middleware.process_template_response
+                )
+            if hasattr(middleware, "process_exception"):
+                self.exception_middleware.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+        self.chain = handler
+
+
+def profile_prefixes():
+    """MIDDLEWARE_PROFILE_PREFIXES items, longest prefix first"""
+    return sorted(
+        getattr(settings, "MIDDLEWARE_PROFILE_PREFIXES", {}).items(),
+        key=lambda item: len(item[0]),
+        reverse=True,
+    )
+
+
+def match_profile(prefixes, path):
+    for prefix, name in prefixes:
+        if path.startswith(prefix):
+            return name
+    return "default"
+
+
+class MiddlewareProfileMiddleware:
+    """Runs the request through its URL prefix's middleware profile"""
+
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.profiles = {
+            name: Profile(paths, get_response)
+            for name, paths in settings.MIDDLEWARE_PROFILES.items()
+        }
+        self.prefixes = profile_prefixes()
+
+    def profile_name(self, path):
+        return match_profile(self.prefixes, path)
+
+    def __call__(self, request):
+        request.middleware_profile = self.profile_name(request.path_info)
+        return self.profiles[request.middleware_profile].chain(request)
+
+    # The handler calls these hooks on this middleware only, so they are
+    # passed on to the ones in the request's profile.
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for hook in self.profiles[request.middleware_profile].view_middleware:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+    def process_template_response(self, request, response):
+        profile = self.profiles[request.middleware_profile]
+        for hook in profile.template_response_middleware:
+            response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for hook in self.profiles[request.middleware_profile].exception_middleware:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+
+
+# Read replicas.
+#
+# Clients that just wrote read from the primary for REPLICA_PIN_SECONDS, so
+# they see their own writes. Browsers are pinned with a cookie; API clients
+# that don't keep cookies are pinned in the cache by their Authorization
+# header.
+
+PIN_COOKIE = "replica_pin"
+PIN_KEY = "core:replica-pin:{}"
+
+
+def pin_key(request):
+    authorization = request.headers.get("Authorization")
+    if not authorization:
+        return None
+    return PIN_KEY.format(hashlib.md5(authorization.encode()).hexdigest())
+
+
+class ReplicaMiddleware:
+    """Lets safe requests to `read_from_replica` views read from replicas"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_replica_token", None)
+            if token is not None:
+                _replica_reads.reset(token)
+
+        if request.method not in SAFE_METHODS:
+            self.pin(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None)
+        if (
+            request.method in SAFE_METHODS
+            and getattr(view_class, "read_from_replica", False)
+            and not self.is_pinned(request)
+        ):
+            request._replica_token = _replica_reads.set(True)
+
+    def is_pinned(self, request):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        key = pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+        response.set_cookie(
+            PIN_COOKIE, "1", max_age=seconds, httponly=True, samesite="Lax"
+        )
+        key = pin_key(request)
+        if key is not None:
+            cache.set(key, True, seconds)
+
+
+# Response compression.
+#
+# JSON responses of at least COMPRESSION_MIN_SIZE bytes are sent brotli (when
+# the brotli package is installed) or gzip compressed, whichever the client
+# prefers. Other content types are left alone, so HTML pages carrying CSRF
+# tokens stay out of reach of BREACH. Responses with an ETag (the catalog's
+# conditional GETs) repeat, so they are compressed once: the compressed body
+# is cached under a digest of the uncompressed one, which is far cheaper to
+# compute than the compression and can't serve a body that has since changed.
+
+COMPRESSED_KEY = "core:compressed:{}:{}"
+
+
+def accepted_encodings(request):
+    """Accept-Encoding codings with a non-zero q, best first"""
+    accepted = []
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding.strip() and quality > 0:
+            accepted.append((quality, coding.strip().lower()))
+    return [coding for _, coding in sorted(accepted, key=lambda item: -item[0])]
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=getattr(settings, "BROTLI_QUALITY", 5))
+    return gzip.compress(body, compresslevel=getattr(settings, "GZIP_LEVEL", 6))
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encodings = ["br", "gzip"] if brotli else ["gzip"]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+            or response.get("Content-Type", "").split(";")[0]
+            not in getattr(settings, "COMPRESSION_CONTENT_TYPES", ["application/json"])
+        ):
+            return response
+
+        patch_vary_headers(response, ["Accept-Encoding"])
+        encoding = self.negotiate(request)
+        if encoding is None:
+            return response
+
+        etag = response.get("ETag")
+        if etag:
+            key = COMPRESSED_KEY.format(
+                encoding, hashlib.sha256(response.content).hexdigest()
+            )
+            body = cache.get(key)
+            if body is None:
+                body = compress(response.content, encoding)
+                cache.set(
+                    key, body, getattr(settings, "COMPRESSION_CACHE_TIMEOUT", 600)
+                )
+            # Same representation, different bytes
+            if not etag.startswith("W/"):
+                response["ETag"] = f"W/{etag}"
+        else:
+            body = compress(response.content, encoding)
+
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        return response
+
+    def negotiate(self, request):
+        for coding in accepted_encodings(request):
+            if coding in self.encodings:
+                return coding
+            if coding == "*":
+                return self.encodings[0]
+        return None
+
+
+# Request metrics (see core.metrics)
+
+
+class MetricsMiddleware:
+    """Times requests and counts their queries, labelled `basename-action`"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = metrics.RequestMetrics()
+        token = metrics.current_request.set(state)
+
+        def count_query(execute, sql, params, many, context):
+            start = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                state.queries += 1
+                state.query_time += perf_counter() - start
+
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        elapsed = perf_counter() - start
+
+        registry = metrics.registry
+        registry.inc(
+            "storefront_requests_total",
+            view=state.view,
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.observe(
+            "storefront_request_duration_seconds", elapsed, view=state.view
+        )
+        registry.observe("storefront_db_queries", state.queries, view=state.view)
+        registry.observe(
+            "storefront_db_query_duration_seconds", state.query_time, view=state.view
+        )
+        if state.serializer_time:
+            registry.observe(
+                "storefront_serializer_duration_seconds",
+                state.serializer_time,
+                view=state.view,
+            )
+        registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = metrics.current_request.get()
+        if state is not None:
+            state.view = view_label(request, view_func)
+
+
+def view_label(request, view_func):
+    # DRF viewsets: "products-list", "cart-items-create", "orders-create"...
+    actions = getattr(view_func, "actions", None)
+    basename = getattr(view_func, "initkwargs", {}).get("basename")
+    if actions and basename:
+        return (
+            f"{basename}-{actions.get(request.method.lower(), request.method.lower())}"
+        )
+    match = request.resolver_match
+    if match is not None and match.view_name:
+        return match.view_name
+    return getattr(view_func, "__name__", "unknown")
+
+
+# Sampled profiling (see core.profiling)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.should_profile(request):
+            return self.get_response(request)
+
+        profiler = profiling.Profiler()
+        start = perf_counter()
+        with profiler.run():
+            response = self.get_response(request)
+        duration = perf_counter() - start
+        if not profiler.enabled:
+            return response
+
+        view = getattr(request, "profile_view", "unmatched")
+        try:
+            profile_id = profiler.save(request, response, duration, view)
+        except OSError:
+            logger.warning("Can't save the profile of %s", request.path, exc_info=True)
+        else:
+            response["X-Profile-Id"] = profile_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile_view = view_label(request, view_func)
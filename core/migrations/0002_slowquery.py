@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint_hash", models.CharField(max_length=32)),
+                ("view", models.CharField(max_length=255)),
+                ("database", models.CharField(max_length=100)),
+                ("fingerprint", models.TextField()),
+                (
+                    "sql",
+                    models.TextField(
+                        help_text="The latest query, without its parameters"
+                    ),
+                ),
+                ("calls", models.PositiveIntegerField(default=0)),
+                ("total_time", models.FloatField(default=0, help_text="Seconds")),
+                ("max_time", models.FloatField(default=0, help_text="Seconds")),
+                ("plan", models.TextField(blank=True)),
+                ("plan_captured_at", models.DateTimeField(null=True)),
+                ("first_seen", models.DateTimeField(auto_now_add=True)),
+                ("last_seen", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "slow queries",
+                "unique_together": {("fingerprint_hash", "view")},
+            },
+        ),
+    ]
@@ -4,3 +4,31 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
+
+
+class SlowQuery(models.Model):
+    """Totals of the slow queries sharing a fingerprint and view"""
+
+    fingerprint_hash = models.CharField(max_length=32)
+    view = models.CharField(max_length=255)
+    database = models.CharField(max_length=100)
+    fingerprint = models.TextField()
+    sql = models.TextField(help_text="The latest query, without its parameters")
+    calls = models.PositiveIntegerField(default=0)
+    total_time = models.FloatField(default=0, help_text="Seconds")
+    max_time = models.FloatField(default=0, help_text="Seconds")
+    plan = models.TextField(blank=True)
+    plan_captured_at = models.DateTimeField(null=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [["fingerprint_hash", "view"]]
+        verbose_name_plural = "slow queries"
+
+    def __str__(self) -> str:
+        return self.fingerprint[:80]
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls else 0
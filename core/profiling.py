@@ -0,0 +1,172 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from uuid import uuid4
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+# Sampled request profiling.
+#
+# A request is profiled when it carries "X-Profile: <PROFILING_TOKEN>", or by
+# chance: PROFILING_ROUTES maps path prefixes to the fraction of their
+# requests to profile, PROFILING_SAMPLE_RATE covers every other path.
+#
+# Each profile is a cProfile dump (open it with pstats, snakeviz or flameprof)
+# plus a JSON file with the request and the SQL it ran. PROFILING_DIR keeps
+# the newest PROFILING_MAX_PROFILES of them, older ones are deleted.
+
+HEADER = "X-Profile"
+
+
+def should_profile(request):
+    token = getattr(settings, "PROFILING_TOKEN", None)
+    header = request.headers.get(HEADER)
+    if token and header and constant_time_compare(header, token):
+        return True
+
+    path = request.path_info
+    rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+    for prefix, route_rate in getattr(settings, "PROFILING_ROUTES", {}).items():
+        if path.startswith(prefix):
+            rate = route_rate
+            break
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def capture_sql(queries):
+    max_queries = getattr(settings, "PROFILING_MAX_QUERIES", 200)
+
+    def record(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # The SQL only: parameters can hold personal data
+            if len(queries) < max_queries:
+                queries.append(
+                    {
+                        "sql": sql,
+                        "many": many,
+                        "duration": time.perf_counter() - start,
+                        "database": context["connection"].alias,
+                    }
+                )
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record))
+        yield
+
+
+def profiles_dir():
+    return getattr(
+        settings,
+        "PROFILING_DIR",
+        os.path.join(tempfile.gettempdir(), "storefront-profiles"),
+    )
+
+
+def save_profile(profiler, meta):
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Names sort oldest first
+    profile_id = f"{time.time_ns()}-{uuid4().hex[:8]}"
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as file:
+        json.dump({"id": profile_id, **meta}, file)
+    trim(directory)
+    return profile_id
+
+
+def trim(directory):
+    keep = getattr(settings, "PROFILING_MAX_PROFILES", 200)
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+    for profile_id in ids[:-keep] if len(ids) > keep else []:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass  # Trimmed by another process
+
+
+def list_profiles():
+    directory = profiles_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as file:
+                    profiles.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    # Ids come from URLs, never let them leave the directory
+    if os.path.basename(profile_id) != profile_id:
+        raise FileNotFoundError(profile_id)
+    return os.path.join(profiles_dir(), profile_id + suffix)
+
+
+def load_profile(profile_id, sort="cumulative", limit=40, restrict=None):
+    """The profile's metadata and its pstats report"""
+    with open(profile_path(profile_id, ".json")) as file:
+        meta = json.load(file)
+    report = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id, ".prof"), stream=report)
+    stats.strip_dirs().sort_stats(sort)
+    if restrict:
+        stats.print_stats(restrict, limit)
+    else:
+        stats.print_stats(limit)
+    return meta, report.getvalue()
+
+
+class Profiler:
+    """Profiles one request and saves it with the SQL it ran"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.enabled = False
+
+    @contextmanager
+    def run(self):
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Another profiler is active (e.g. silk): run unprofiled
+            yield
+            return
+        self.enabled = True
+        try:
+            with capture_sql(self.queries):
+                yield
+        finally:
+            self.profiler.disable()
+
+    def save(self, request, response, duration, view):
+        return save_profile(
+            self.profiler,
+            {
+                "method": request.method,
+                "path": request.get_full_path(),
+                "view": view,
+                "status": response.status_code,
+                "duration": duration,
+                "sql_time": sum(query["duration"] for query in self.queries),
+                "queries": self.queries,
+                "created_at": time.time(),
+            },
+        )
@@ -0,0 +1,34 @@
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to DRF's stdlib json renderer
+    orjson = None
+
+# UUIDs (cart ids) and datetimes are encoded by orjson itself; Decimals and
+# the rest of what DRF's encoder knows (lazy strings, querysets...) go through
+# the encoder's default(), so the output matches JSONRenderer's compact JSON.
+
+
+class ORJSONRenderer(JSONRenderer):
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        ret = orjson.dumps(data, default=self.default, option=self.options)
+        # Like JSONRenderer, keep the output a strict JavaScript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+            ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
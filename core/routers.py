@@ -0,0 +1,108 @@
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Read replicas.
+#
+# DATABASE_REPLICAS lists the aliases in DATABASES that replicate "default".
+# Reads only go to them inside replica_reads(), which ReplicaMiddleware enters
+# for safe-method requests to views with `read_from_replica = True`; all other
+# reads, and every write, use the primary.
+#
+# Each replica's lag is measured at most every REPLICA_LAG_CHECK_INTERVAL
+# seconds and shared through the cache. Replicas more than REPLICA_MAX_LAG
+# seconds behind, or that can't be reached, are skipped; with none left,
+# reads fall back to the primary.
+#
+# Locally, a second alias for the same SQLite file (or a MySQL replica) works
+# as a replica; test settings should mark it {"TEST": {"MIRROR": "default"}}.
+
+LAG_KEY = "core:replica-lag:{}"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """Let reads in the block use replicas (or, with False, the primary only)"""
+    token = _replica_reads.set(allowed)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind its primary, None if unknown"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+                "END"
+            )
+            (lag,) = cursor.fetchone()
+            return None if lag is None else float(lag)
+        if connection.vendor == "mysql":
+            cursor.execute("SHOW REPLICA STATUS")
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            status = dict(zip([column[0] for column in cursor.description], row))
+            return status.get("Seconds_Behind_Source")
+    # Backends without replication (e.g. SQLite files) are never behind
+    return 0
+
+
+def replica_lag(alias):
+    key = LAG_KEY.format(alias)
+    lag = cache.get(key)
+    if lag is None:
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            logger.warning("Can't measure the lag of replica %s", alias, exc_info=True)
+            lag = None
+        # Unknown lag is remembered as infinite, so the replica is skipped
+        lag = float("inf") if lag is None else lag
+        cache.set(key, lag, getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 5))
+    return lag
+
+
+def healthy_replicas():
+    max_lag = getattr(settings, "REPLICA_MAX_LAG", 2)
+    return [
+        alias
+        for alias in getattr(settings, "DATABASE_REPLICAS", [])
+        if replica_lag(alias) <= max_lag
+    ]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else "default"
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or instances read from a replica would be saved there
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {"default", *getattr(settings, "DATABASE_REPLICAS", [])}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, "DATABASE_REPLICAS", []):
+            return False
+        return None
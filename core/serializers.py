@@ -1,7 +1,15 @@
+from django.contrib.auth import get_user_model
 from djoser.serializers import (
     UserSerializer as BaseUserSerializer,
     UserCreateSerializer as BaseUserCreateSerializer,
 )
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer as BaseTokenObtainPairSerializer,
+    TokenRefreshSerializer as BaseTokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import set_user_claims
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -12,3 +20,24 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 class UserSerializer(BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
         fields = ["id", "username", "email", "first_name", "last_name"]
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # The access token inherits the claims of its refresh token
+        return set_user_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Re-read the claims, so staff / membership changes apply on refresh
+        access = AccessToken(data["access"])
+        user = (
+            get_user_model()
+            .objects.select_related("customer")
+            .get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]})
+        )
+        data["access"] = str(set_user_claims(access, user))
+        return data
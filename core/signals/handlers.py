@@ -1,7 +1,27 @@
+import atexit
+from celery.signals import task_postrun
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
 from django.dispatch import receiver
 from store.signals import order_created
+from ..slow_queries import flush, log_slow_queries
 
 
 @receiver(order_created)
 def on_order_created(sender, **kwargs):
     print(kwargs["order"])
+
+
+@receiver(connection_created)
+def watch_slow_queries(sender, connection, **kwargs):
+    if not getattr(settings, "SLOW_QUERY_LOG_ENABLED", True):
+        return
+    # First, so wrappers added later with execute_wrapper() can still pop()
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+request_finished.connect(flush, dispatch_uid="flush_slow_queries")
+task_postrun.connect(flush, dispatch_uid="flush_slow_queries", weak=False)
+atexit.register(flush)
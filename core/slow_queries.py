@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections, transaction
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Slow query log.
+#
+# log_slow_queries() is installed as an execute wrapper on every database
+# connection (core.signals.handlers), so it sees the queries of requests,
+# Celery tasks and commands alike. Queries slower than SLOW_QUERY_THRESHOLD
+# seconds are reduced to a fingerprint (literals and placeholders become ?,
+# IN lists collapse) and handed to the record_slow_query task, which keeps
+# per fingerprint and view totals in core.SlowQuery. That happens once the
+# request or task is over (commands and the shell: every BATCH_SIZE queries
+# and at exit), so neither the task nor EXPLAIN runs while the slow query's
+# rows are still being read.
+#
+# A SLOW_QUERY_EXPLAIN_RATE sample of slow SELECTs also gets its plan, read
+# with the original parameters. With SLOW_QUERY_EXPLAIN_ANALYZE
+# the plan comes from EXPLAIN ANALYZE, which runs the query again, so that
+# is only done on DATABASE_REPLICAS aliases.
+
+_capturing = ContextVar("slow_query_capturing", default=False)
+_pending = ContextVar("slow_queries_pending", default=None)
+
+BATCH_SIZE = 100
+# Waiting on locks, not slow SQL
+TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    sql = STRINGS.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = NUMBERS.sub("?", sql)
+    sql = LISTS.sub("(...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def fingerprint_hash(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
+def current_view():
+    state = metrics.current_request.get()
+    if state is not None:
+        return state.view
+    try:
+        from celery import current_task
+    except ImportError:
+        return "-"
+    if current_task and current_task.name:
+        return f"task:{current_task.name}"
+    return "-"
+
+
+def explain(connection, sql, params):
+    analyze = getattr(settings, "SLOW_QUERY_EXPLAIN_ANALYZE", False) and (
+        connection.alias in getattr(settings, "DATABASE_REPLICAS", [])
+    )
+    prefix = connection.ops.explain_query_prefix(
+        **({"analyze": True} if analyze else {})
+    )
+    # A savepoint, so a failing EXPLAIN can't abort the caller's transaction
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", params)
+        return "\n".join(
+            " ".join(str(column) for column in row) for row in cursor.fetchall()
+        )
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if (
+        duration < getattr(settings, "SLOW_QUERY_THRESHOLD", 0.2)
+        or _capturing.get()
+        or sql.startswith(TRANSACTION_STATEMENTS)
+    ):
+        return result
+
+    view = current_view()
+    pending = _pending.get()
+    if pending is None:
+        pending = []
+        _pending.set(pending)
+    # The parameters stay in this process: they are only used for EXPLAIN
+    pending.append((context["connection"].alias, sql, params, many, duration, view))
+    if view == "-" and len(pending) >= BATCH_SIZE:
+        flush()
+    return result
+
+
+def flush(**kwargs):
+    """Records the slow queries seen so far (see core.signals.handlers)"""
+    pending = _pending.get()
+    if not pending or _capturing.get():
+        return
+    _pending.set(None)
+
+    from .tasks import record_slow_query
+
+    token = _capturing.set(True)
+    try:
+        for alias, sql, params, many, duration, view in pending:
+            try:
+                record_slow_query.apply_async(
+                    kwargs={
+                        "fingerprint": fingerprint(sql),
+                        "sql": sql,
+                        "view": view,
+                        "database": alias,
+                        "duration": duration,
+                        "plan": sample_plan(alias, sql, params, many),
+                    },
+                    retry=False,
+                )
+            except Exception:
+                # The log must never fail the request it is watching
+                logger.warning("Can't record a slow query", exc_info=True)
+    finally:
+        _capturing.reset(token)
+
+
+def sample_plan(alias, sql, params, many):
+    if (
+        many
+        or sql.lstrip()[:6].upper() != "SELECT"
+        or random.random() >= getattr(settings, "SLOW_QUERY_EXPLAIN_RATE", 0.1)
+    ):
+        return ""
+    connection = connections[alias]
+    # flush() runs after request_finished / task_postrun may have closed the
+    # connection; one opened just for EXPLAIN is closed again, not left open
+    was_closed = connection.connection is None
+    try:
+        return explain(connection, sql, params)
+    except Exception:
+        logger.warning("Can't EXPLAIN a slow query", exc_info=True)
+        return ""
+    finally:
+        if was_closed:
+            connection.close()
@@ -0,0 +1,39 @@
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import SlowQuery
+from .slow_queries import fingerprint_hash
+
+
+@shared_task(ignore_result=True)
+def record_slow_query(fingerprint, sql, view, database, duration, plan=""):
+    """Add one slow query onto its fingerprint's totals (see core.slow_queries)"""
+    with transaction.atomic():
+        query, created = SlowQuery.objects.get_or_create(
+            fingerprint_hash=fingerprint_hash(fingerprint),
+            view=view,
+            defaults={
+                "fingerprint": fingerprint,
+                "database": database,
+                "sql": sql,
+                "calls": 1,
+                "total_time": duration,
+                "max_time": duration,
+            },
+        )
+        changes = {}
+        if not created:
+            changes = {
+                "sql": sql,
+                "database": database,
+                "calls": F("calls") + 1,
+                "total_time": F("total_time") + duration,
+                "max_time": Greatest("max_time", duration),
+                "last_seen": timezone.now(),
+            }
+        if plan:
+            changes.update(plan=plan, plan_captured_at=timezone.now())
+        if changes:
+            SlowQuery.objects.filter(pk=query.pk).update(**changes)
@@ -1,5 +1,15 @@
 from django.views.generic import TemplateView
 from django.urls import path
+from . import views
 
-
-urlpatterns = [path("", TemplateView.as_view(template_name="core/index.html"))]
+urlpatterns = [
+    path("", TemplateView.as_view(template_name="core/index.html")),
+    path("metrics", views.metrics, name="metrics"),
+    path("admin/profiles/", views.profile_list, name="profiles"),
+    path("admin/profiles/<str:profile_id>/", views.profile_detail, name="profile"),
+    path(
+        "admin/profiles/<str:profile_id>/download/",
+        views.profile_download,
+        name="profile-download",
+    ),
+]
@@ -1,3 +1,78 @@
+import re
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from . import profiling
+from .metrics import registry, render as render_metrics
 
 # Create your views here.
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, optionally behind METRICS_TOKEN"""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(registry.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# Admin viewer for the sampled profiles (see core.profiling)
+
+PROFILE_SORTS = ["cumulative", "tottime", "calls"]
+
+
+@staff_member_required
+def profile_list(request):
+    return render(
+        request,
+        "core/profiles.html",
+        {
+            **admin.site.each_context(request),
+            "title": "Request profiles",
+            "profiles": profiling.list_profiles(),
+        },
+    )
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    sort = request.GET.get("sort")
+    sort = sort if sort in PROFILE_SORTS else "cumulative"
+    restrict = request.GET.get("q") or None
+    try:
+        profile, report = profiling.load_profile(profile_id, sort, restrict=restrict)
+    except (FileNotFoundError, ValueError):
+        raise Http404("No such profile")
+    except re.error:
+        profile, report = profiling.load_profile(profile_id, sort)
+        report = f"Invalid filter {restrict!r}\n\n{report}"
+    return render(
+        request,
+        "core/profile.html",
+        {
+            **admin.site.each_context(request),
+            "title": f"{profile['method']} {profile['path']}",
+            "profile": profile,
+            "report": report,
+            "sort": sort,
+            "sorts": PROFILE_SORTS,
+            "q": restrict or "",
+        },
+    )
+
+
+@staff_member_required
+def profile_download(request, profile_id):
+    try:
+        path = profiling.profile_path(profile_id, ".prof")
+        return FileResponse(open(path, "rb"), as_attachment=True)
+    except FileNotFoundError:
+        raise Http404("No such profile")
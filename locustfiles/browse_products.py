@@ -14,10 +14,19 @@ class WebsiteUser(HttpUser):
 
         collection_id = randint(2, 6)
 
-        self.client.get(
-            f"/store/products/?collection_id={collection_id}", name="/store/products"
+        response = self.client.get(
+            f"/store/products/?collection_id={collection_id}&pagination=cursor",
+            name="/store/products",
         )
 
+        # Keep browsing deeper pages through the keyset cursor links
+        next_url = response.json().get("next")
+        for _ in range(randint(0, 3)):
+            if not next_url:
+                break
+            response = self.client.get(next_url, name="/store/products?cursor")
+            next_url = response.json().get("next")
+
     @task(4)
     def view_product(self):
 
@@ -1,17 +1,167 @@
-from time import sleep
-
+import logging
+import time
+from uuid import uuid4
 from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from templated_mail.mail import BaseEmailMessage
+
+logger = logging.getLogger(__name__)
+
+# Customer notification fan-out.
+#
+# notify_customers walks the customers' users in id order with a server-side
+# iterator and enqueues one send_notification_chunk per `chunk_size` users, so
+# memory stays bounded whatever the number of recipients. Each chunk renders
+# the template once and sends all its messages over one SMTP connection.
+#
+# Progress lives in the cache under the run id: the parent stores its cursor
+# after every enqueued chunk and chunks mark themselves as sent. Running
+# notify_customers again with the same run_id resumes after the cursor, and a
+# redelivered chunk that already went out is skipped. The run id defaults to
+# the task id and the parent is acked late, so a parent redelivered after a
+# crash resumes its run too.
+#
+# Sending is throttled on emails, not tasks: chunks take their size out of a
+# per-minute budget shared by all workers (NOTIFY_CUSTOMERS_EMAILS_PER_MINUTE)
+# and a chunk that doesn't fit is enqueued again for the next minute.
+
+RUN_KEY = "playground:notify:{}"
+SENT_KEY = "playground:notify:{}:sent"
+CHUNK_KEY = "playground:notify:{}:chunk:{}"
+EMAILS_KEY = "playground:notify:emails:{}"
+RUN_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def get_progress(run_id):
+    run = cache.get(RUN_KEY.format(run_id))
+    if run is None:
+        return None
+    return {**run, "sent": cache.get(SENT_KEY.format(run_id), 0)}
+
+
+def recipients(after_id=0, last_id=None):
+    queryset = (
+        get_user_model()
+        .objects.filter(customer__isnull=False, is_active=True, id__gt=after_id)
+        .exclude(email="")
+    )
+    if last_id is not None:
+        queryset = queryset.filter(id__lte=last_id)
+    return queryset.order_by("id").values_list("id", "email")
+
+
+def reserve_emails(count):
+    """Take `count` emails out of this minute's budget; returns 0, or the
+    seconds until the next minute when the budget can't cover them"""
+    limit = getattr(settings, "NOTIFY_CUSTOMERS_EMAILS_PER_MINUTE", 600)
+    now = time.time()
+    key = EMAILS_KEY.format(int(now // 60))
+    cache.add(key, 0, 120)
+    used = cache.incr(key, count)
+    # A chunk larger than the whole budget still goes out, alone in its minute
+    if used > limit and used > count:
+        cache.decr(key, count)
+        return 60 - now % 60
+    return 0
+
+
+@shared_task(bind=True, acks_late=True)
+def notify_customers(
+    self,
+    message,
+    template_name="emails/notification.html",
+    chunk_size=500,
+    run_id=None,
+):
+    # A redelivered task keeps its id, so it resumes its own run
+    run_id = run_id or self.request.id or uuid4().hex
+    key = RUN_KEY.format(run_id)
+    run = cache.get(key) or {
+        "message": message,
+        "cursor": 0,
+        "chunks": 0,
+        "recipients": 0,
+        "done": False,
+    }
+    if run["done"]:
+        return run_id
+    if run["cursor"]:
+        logger.info("Resuming notification run %s after user %s", run_id, run["cursor"])
+
+    chunk = []
+
+    def enqueue():
+        send_notification_chunk.delay(
+            run_id, message, template_name, chunk[0][0] - 1, chunk[-1][0]
+        )
+        run["cursor"] = chunk[-1][0]
+        run["chunks"] += 1
+        run["recipients"] += len(chunk)
+        cache.set(key, run, RUN_TIMEOUT)
+        chunk.clear()
+
+    for recipient in recipients(run["cursor"]).iterator(chunk_size=chunk_size):
+        chunk.append(recipient)
+        if len(chunk) == chunk_size:
+            enqueue()
+    if chunk:
+        enqueue()
+
+    run["done"] = True
+    cache.set(key, run, RUN_TIMEOUT)
+    logger.info(
+        "Notification run %s: %d recipients in %d chunks",
+        run_id,
+        run["recipients"],
+        run["chunks"],
+    )
+    return run_id
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5)
+def send_notification_chunk(self, run_id, message, template_name, after_id, last_id):
+    """Email the recipients with after_id < id <= last_id"""
+    chunk_key = CHUNK_KEY.format(run_id, last_id)
+    if cache.get(chunk_key):
+        return 0
+
+    emails = [email for _, email in recipients(after_id, last_id)]
+    wait = reserve_emails(len(emails))
+    if wait:
+        # A new task rather than a retry, so waiting uses up no max_retries
+        self.apply_async(self.request.args, self.request.kwargs, countdown=wait)
+        return 0
 
-# from storefront.celery import celery
+    template = BaseEmailMessage(
+        template_name=template_name, context={"message": message}
+    )
+    template.render()
+    messages = []
+    for email in emails:
+        email_message = EmailMultiAlternatives(
+            template.subject, template.body, settings.DEFAULT_FROM_EMAIL, [email]
+        )
+        if template.alternatives:
+            email_message.attach_alternative(template.html, "text/html")
+        elif template.content_subtype == "html":
+            email_message.content_subtype = "html"
+        messages.append(email_message)
 
+    try:
+        with get_connection() as connection:
+            sent = connection.send_messages(messages) or 0
+    except Exception as error:
+        raise self.retry(exc=error, countdown=2**self.request.retries * 30)
 
-@shared_task
-# @celery.task
-def notify_customers(message):
-    print("Sending 10k emails...")
-    print(message)
-    sleep(10)
-    print("Emails were successfully sent!")
+    cache.set(chunk_key, True, RUN_TIMEOUT)
+    try:
+        cache.incr(SENT_KEY.format(run_id), sent)
+    except ValueError:
+        cache.add(SENT_KEY.format(run_id), sent, RUN_TIMEOUT)
+    return sent
 
 
 """
@@ -1,14 +1,21 @@
 from typing import Any
 from django.contrib import admin, messages
 from django.contrib.contenttypes.admin import GenericTabularInline
-from django.db.models import Count, F
+from django.db.models import F
 from django.db.models.query import QuerySet
-from django.http import HttpRequest
 from django.urls import reverse
 from django.utils.translation import ngettext
 from django.utils.html import format_html
 from django.utils.http import urlencode
-from .models import Collection, Customer, Product, ProductImage, Order, OrderItem
+from .models import (
+    Collection,
+    Customer,
+    Product,
+    ProductImage,
+    Order,
+    OrderItem,
+    OutboxEvent,
+)
 from tags.models import TaggedItem
 
 
@@ -23,7 +30,7 @@ class CollectionAdmin(admin.ModelAdmin):
     search_fields = ["title"]
 
     # Add links to the product_count field
-    @admin.display(description="products_count")
+    @admin.display(description="products_count", ordering="products_count")
     def products_count(self, collection):
 
         url = (
@@ -34,9 +41,6 @@ class CollectionAdmin(admin.ModelAdmin):
 
         return format_html("<a href={}>{}</a>", url, collection.products_count)
 
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).annotate(products_count=Count("products"))
-
 
 ###########################################################################################
 # PRODUCT
@@ -139,11 +143,20 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     autocomplete_fields = ["user"]
-    list_display = ["id", "first_name", "last_name", "membership", "orders"]
+    list_display = [
+        "id",
+        "first_name",
+        "last_name",
+        "membership",
+        "orders_count",
+        "lifetime_value",
+        "last_order_at",
+    ]
     list_editable = ["membership"]
     list_per_page = 10
     list_select_related = ["user"]
     ordering = ["user__first_name", "user__last_name"]
+    readonly_fields = ["orders_count", "lifetime_value", "last_order_at"]
     search_fields = ["first_name__istartswith", "last_name__istartswith"]
 
     """
@@ -152,16 +165,6 @@ class CustomerAdmin(admin.ModelAdmin):
         return f"{customer.user.first_name} {customer.user.last_name}"
 """
 
-    @admin.display(ordering="orders")
-    def orders(self, order):
-        return order.orders
-
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).annotate(orders=Count("order"))
-
-
-# TODO: Calculate total sum of money of all orders that each Customer has made
-
 
 ######################################################################################
 # ORDER ITEM
@@ -189,3 +192,16 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ["placed_at", "customer"]
     list_per_page = 10
     ordering = ["-placed_at"]
+
+
+###########################################
+# OUTBOX
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ["id", "topic", "key", "attempts", "created_at", "processed_at"]
+    list_filter = ["topic", ("processed_at", admin.EmptyFieldListFilter)]
+    readonly_fields = ["created_at", "processed_at", "last_error"]
+    list_per_page = 50
+    ordering = ["-id"]
@@ -0,0 +1,116 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from core import metrics
+from core.routers import replica_reads
+
+# Versioned response cache for the anonymous catalog endpoints.
+#
+# Every cached response key embeds the current generation of the resource it
+# was built from. Writes never delete keys: signal handlers just bump the
+# generation, which orphans all old entries at once (they age out by TTL).
+
+GENERATION_KEY = "store:generation:{}"
+MODIFIED_KEY = "store:modified:{}"
+RESPONSE_KEY = "store:response:{}:{}:{}"
+STATS_KEY = "store:response-cache:{}"
+
+
+def get_generation(resource):
+    key = GENERATION_KEY.format(resource)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed with a timestamp rather than 1 so an evicted counter can never
+        # come back to a value that old cached responses were stored under.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_modified(resource):
+    """Time of the resource's last generation bump, as a Unix timestamp"""
+    key = MODIFIED_KEY.format(resource)
+    modified = cache.get(key)
+    if modified is None:
+        # Unknown after an eviction: now is late, but never too early
+        cache.add(key, time.time(), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_generation(*resources):
+    for resource in resources:
+        key = GENERATION_KEY.format(resource)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+        cache.set(MODIFIED_KEY.format(resource), time.time(), timeout=None)
+
+
+def record(outcome):
+    metrics.record_cache("response", outcome == "hits")
+    try:
+        cache.incr(STATS_KEY.format(outcome))
+    except ValueError:
+        cache.add(STATS_KEY.format(outcome), 1, timeout=None)
+
+
+def get_stats():
+    stats = cache.get_many([STATS_KEY.format("hits"), STATS_KEY.format("misses")])
+    hits = stats.get(STATS_KEY.format("hits"), 0)
+    misses = stats.get(STATS_KEY.format("misses"), 0)
+    return {"hits": hits, "misses": misses}
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format("hits"), STATS_KEY.format("misses")])
+
+
+def build_response_key(request, resource):
+    # Hyperlinked fields render absolute URLs, so the host is part of the key.
+    # Query params carry filter / search / ordering / page; sort them so
+    # ?a=1&b=2 and ?b=2&a=1 share an entry.
+    url = request.build_absolute_uri(request.path)
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(f"{url}?{params}".encode()).hexdigest()
+    return RESPONSE_KEY.format(resource, get_generation(resource), digest)
+
+
+class CachedResponseMixin:
+    """Serves anonymous list / retrieve responses from the cache.
+
+    Set `cache_resource` to the generation counter the view depends on.
+    """
+
+    cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user and request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = build_response_key(request, self.cache_resource)
+        data = cache.get(key)
+        if data is not None:
+            record("hits")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        record("misses")
+        # Outlives any replica lag once stored, so it is read from the primary
+        with replica_reads(False):
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = getattr(settings, "STORE_RESPONSE_CACHE_TIMEOUT", 10 * 60)
+            cache.set(key, response.data, timeout)
+        response["X-Cache"] = "MISS"
+        return response
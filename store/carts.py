@@ -0,0 +1,399 @@
+from datetime import timedelta
+from decimal import Decimal
+from uuid import UUID, uuid4
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from .models import Cart, CartItem, Product
+
+# Pluggable cart storage, selected with STORE_CART_BACKEND.
+#
+# DatabaseCartStore (the default) keeps carts as Cart / CartItem rows and the
+# viewsets run their regular ORM code. RedisCartStore keeps each cart as one
+# Redis hash with a sliding TTL:
+#
+#     store:cart:{cart_id}  created_at, updated_at -> ISO timestamps,
+#                           p:{product_id} -> qty
+#
+# so abandoned carts cost no database writes at all. Items are priced from
+# short-lived product snapshots and the cart is only written to the database
+# by CreateOrderSerializer at checkout (see materialize()). In Redis carts an
+# item's id is its product id.
+
+
+def too_many_message(product_ids=None):
+    message = f"A cart holds at most {CartItem.MAX_QUANTITY} of a product"
+    return f"{message}: {product_ids}" if product_ids else message
+
+
+class TooManyItems(Exception):
+    """A write would take products past CartItem.MAX_QUANTITY"""
+
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+class DatabaseCartStore:
+    materialized = True
+
+    def forget_product(self, product_id):
+        pass
+
+    def materialize(self, cart_id):
+        pass
+
+
+class RedisCartStore:
+    materialized = False
+
+    CART_KEY = "store:cart:{}"
+    PRODUCT_KEY = "store:cart-product:{}"
+    ITEM_FIELD = "p:{}"
+
+    def __init__(self, client=None):
+        self._client = client
+        self.cart_ttl = getattr(settings, "STORE_CART_TTL", timedelta(days=7))
+        self.product_ttl = getattr(
+            settings, "STORE_CART_PRODUCT_TTL", timedelta(minutes=5)
+        )
+
+    @property
+    def client(self):
+        if self._client is not None:
+            return self._client
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+
+    def cart_key(self, cart_id):
+        """Raises ValueError for malformed ids, like a UUIDField lookup"""
+        return self.CART_KEY.format(UUID(str(cart_id)).hex)
+
+    ##########################################################################
+    # PRODUCT SNAPSHOTS
+
+    def get_products(self, product_ids):
+        """{product_id: {"id", "title", "unit_price"}} of the existing products"""
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return {}
+
+        pipe = self.client.pipeline(transaction=False)
+        for product_id in product_ids:
+            pipe.hgetall(self.PRODUCT_KEY.format(product_id))
+        products = {
+            product_id: {
+                "id": product_id,
+                "title": snapshot[b"title"].decode(),
+                "unit_price": Decimal(snapshot[b"unit_price"].decode()),
+            }
+            for product_id, snapshot in zip(product_ids, pipe.execute())
+            if snapshot
+        }
+
+        missing = [
+            product_id for product_id in product_ids if product_id not in products
+        ]
+        if missing:
+            pipe = self.client.pipeline(transaction=False)
+            for product in Product.objects.filter(pk__in=missing).values(
+                "id", "title", "unit_price"
+            ):
+                products[product["id"]] = product
+                key = self.PRODUCT_KEY.format(product["id"])
+                pipe.hset(
+                    key,
+                    mapping={
+                        "title": product["title"],
+                        "unit_price": str(product["unit_price"]),
+                    },
+                )
+                pipe.expire(key, self.product_ttl)
+            pipe.execute()
+        return products
+
+    def forget_product(self, product_id):
+        self.client.delete(self.PRODUCT_KEY.format(product_id))
+
+    ##########################################################################
+    # CARTS
+
+    def create(self):
+        cart_id = uuid4()
+        key = self.cart_key(cart_id)
+        pipe = self.client.pipeline()
+        now = timezone.now().isoformat()
+        pipe.hset(key, mapping={"created_at": now, "updated_at": now})
+        pipe.expire(key, self.cart_ttl)
+        pipe.execute()
+        return cart_id
+
+    def get_quantities(self, cart_id):
+        """{product_id: quantity}, or None when there is no such cart"""
+        try:
+            fields = self.client.hgetall(self.cart_key(cart_id))
+        except ValueError:
+            return None
+        if not fields:
+            return None
+        return {
+            int(field[2:]): int(quantity)
+            for field, quantity in fields.items()
+            if field.startswith(b"p:")
+        }
+
+    def get_items(self, cart_id):
+        """CartItemSerializer-shaped items, or None when there is no such cart"""
+        quantities = self.get_quantities(cart_id)
+        if quantities is None:
+            return None
+        products = self.get_products(quantities)
+        return [
+            {
+                "id": product_id,
+                "product": products[product_id],
+                "quantity": quantity,
+                "total_price": quantity * products[product_id]["unit_price"],
+            }
+            for product_id, quantity in sorted(quantities.items())
+            # Deleted products drop out of the cart
+            if product_id in products
+        ]
+
+    def delete(self, cart_id):
+        try:
+            return bool(self.client.delete(self.cart_key(cart_id)))
+        except ValueError:
+            return False
+
+    def write(self, cart_id, add=None, replace=None, remove=(), only_existing=False):
+        """Apply item changes to an existing cart in one MULTI / EXEC.
+
+        `add` increments and `replace` overwrites {product_id: quantity},
+        `remove` drops product ids. With `only_existing`, products that are not
+        in the cart yet are left out. Returns the resulting quantities of the
+        written products, or None when there is no such cart. Raises
+        TooManyItems, writing nothing, when an increment would take a product
+        past CartItem.MAX_QUANTITY.
+        """
+        try:
+            key = self.cart_key(cart_id)
+        except ValueError:
+            return None
+        add, replace = add or {}, replace or {}
+        fields = {self.ITEM_FIELD.format(product_id) for product_id in [*add, *replace]}
+
+        def apply(pipe):
+            # WATCH makes EXEC fail, and the transaction retry, if the cart is
+            # changed, expired or deleted in between
+            if not pipe.exists(key):
+                return None
+            present = set(pipe.hkeys(key)) if only_existing else None
+            # Read under WATCH, so the sums can't be outgrown before EXEC
+            if add:
+                added = [self.ITEM_FIELD.format(product_id) for product_id in add]
+                too_many = sorted(
+                    product_id
+                    for product_id, current in zip(add, pipe.hmget(key, added))
+                    if int(current or 0) + add[product_id] > CartItem.MAX_QUANTITY
+                )
+                if too_many:
+                    raise TooManyItems(too_many)
+
+            def keep(product_id):
+                field = self.ITEM_FIELD.format(product_id)
+                return present is None or field.encode() in present
+
+            pipe.multi()
+            if remove:
+                pipe.hdel(key, *(self.ITEM_FIELD.format(p) for p in remove))
+            for product_id, quantity in add.items():
+                if keep(product_id):
+                    pipe.hincrby(key, self.ITEM_FIELD.format(product_id), quantity)
+            mapping = {
+                self.ITEM_FIELD.format(product_id): quantity
+                for product_id, quantity in replace.items()
+                if keep(product_id)
+            }
+            mapping["updated_at"] = timezone.now().isoformat()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.cart_ttl)
+            pipe.hmget(key, sorted(fields) or ["created_at"])
+            return True
+
+        results = self.client.transaction(apply, key)
+        if not results:
+            return None
+        # HMGET was queued last, after the writes
+        return {
+            int(field[2:]): int(quantity)
+            for field, quantity in zip(sorted(fields), results[-1])
+            if quantity is not None
+        }
+
+    ##########################################################################
+    # CHECKOUT
+
+    def materialize(self, cart_id):
+        """Write the cart as Cart / CartItem rows inside the caller's
+        transaction; the Redis copy is dropped once it commits.
+
+        The Cart primary key makes a concurrent checkout of the same cart fail.
+        """
+        quantities = self.get_quantities(cart_id)
+        if quantities is None:
+            return
+        products = self.get_products(quantities)
+        cart = Cart.objects.create(pk=cart_id)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        )
+        transaction.on_commit(lambda: self.delete(cart_id))
+
+
+def get_cart_store():
+    return import_string(
+        getattr(settings, "STORE_CART_BACKEND", "store.carts.DatabaseCartStore")
+    )()
+
+
+##############################################################################
+# VIEWSET MIXINS
+#
+# Both fall through to the regular ORM actions when the store is materialized.
+
+
+class CartStoreMixin:
+    @property
+    def cart_store(self):
+        if not hasattr(self, "_cart_store"):
+            self._cart_store = get_cart_store()
+        return self._cart_store
+
+    def get_cart_data(self, cart_id):
+        items = self.cart_store.get_items(cart_id)
+        if items is None:
+            raise Http404
+        return {
+            "id": str(UUID(str(cart_id))),
+            "items": items,
+            "total_price": sum([item["total_price"] for item in items]),
+        }
+
+
+class StoredCartMixin(CartStoreMixin):
+    def create(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().create(request, *args, **kwargs)
+        cart_id = self.cart_store.create()
+        return Response(self.get_cart_data(cart_id), status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.get_cart_data(kwargs["pk"]))
+
+    def destroy(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().destroy(request, *args, **kwargs)
+        if not self.cart_store.delete(kwargs["pk"]):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class StoredCartItemMixin(CartStoreMixin):
+    def get_cart_item(self, cart_id, product_id):
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            raise Http404
+        for item in self.get_cart_data(cart_id)["items"]:
+            if item["id"] == product_id:
+                return item
+        raise Http404
+
+    def list(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().list(request, *args, **kwargs)
+        return Response(self.get_cart_data(kwargs["cart_pk"])["items"])
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.get_cart_item(kwargs["cart_pk"], kwargs["pk"]))
+
+    def create(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data["product_id"]
+        if not self.cart_store.get_products([product_id]):
+            raise serializers.ValidationError(
+                {"product_id": ["Product does not exist"]}
+            )
+        try:
+            quantities = self.cart_store.write(
+                kwargs["cart_pk"],
+                add={product_id: serializer.validated_data["quantity"]},
+            )
+        except TooManyItems:
+            raise serializers.ValidationError({"quantity": [too_many_message()]})
+        if quantities is None:
+            raise Http404
+        return Response(
+            {
+                "id": product_id,
+                "product_id": product_id,
+                "quantity": quantities[product_id],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    def partial_update(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().partial_update(request, *args, **kwargs)
+        item = self.get_cart_item(kwargs["cart_pk"], kwargs["pk"])
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantities = self.cart_store.write(
+            kwargs["cart_pk"],
+            replace={item["id"]: serializer.validated_data["quantity"]},
+            only_existing=True,
+        )
+        if not quantities:
+            raise Http404
+        return Response({"quantity": quantities[item["id"]]})
+
+    def destroy(self, request, *args, **kwargs):
+        if self.cart_store.materialized:
+            return super().destroy(request, *args, **kwargs)
+        item = self.get_cart_item(kwargs["cart_pk"], kwargs["pk"])
+        self.cart_store.write(kwargs["cart_pk"], remove=[item["id"]])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def stored_batch(self, request, cart_pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        grouped, _ = serializer.group_operations(self.cart_store.get_products)
+        try:
+            quantities = self.cart_store.write(
+                cart_pk,
+                add=grouped["add"],
+                replace=grouped["set"],
+                remove=grouped["remove"],
+            )
+        except TooManyItems as error:
+            raise serializers.ValidationError(
+                {"operations": [too_many_message(error.product_ids)]}
+            )
+        if quantities is None:
+            raise Http404
+        return Response(self.get_cart_data(cart_pk))
@@ -0,0 +1,237 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from .models import CartItem, OrderItem, Product, ProductImage
+from .serializers import (
+    TAX_RATE,
+    CartSerializer,
+    OrderSerializer,
+    ProductSerializer,
+)
+
+# Read-only fast path for list / retrieve actions.
+#
+# Instead of building model instances and walking DRF's per-field machinery
+# for every row, the page is fetched as .values() dicts, derived fields are
+# computed in one pass, related URLs are reversed once per distinct id and
+# nested children come from one grouped query per relation. The output is
+# the same Python data the regular serializers produce, so the rendered
+# bytes are identical (see store/tests/test_fastpath.py and
+# `manage.py bench_serializers`).
+#
+# Enabled with STORE_FAST_SERIALIZATION = True. Requests using ?expand= fall
+# back to the regular serializers.
+
+
+class FastSerializer:
+    serializer_class = None
+    columns = []
+
+    def __init__(self, request):
+        self.request = request
+        self.fields, self.expand = self.serializer_class.get_field_selection(request)
+        # Reuse the serializer's own fields for scalar conversions (decimal
+        # quantizing, timezone handling) so formatting can never drift.
+        self.serializer_fields = self.serializer_class(
+            context={"request": request}
+        ).fields
+
+    def values(self, queryset):
+        columns = list(self.columns)
+        columns += [name for name in queryset.query.annotations if name not in columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def get_getters(self, rows):
+        raise NotImplementedError
+
+    def render(self, rows):
+        rows = list(rows)
+        getters = self.get_getters(rows)
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+class FastProductSerializer(FastSerializer):
+    serializer_class = ProductSerializer
+    columns = [
+        "id",
+        "title",
+        "slug",
+        "description",
+        "unit_price",
+        "inventory",
+        "collection_id",
+        "last_update",
+    ]
+
+    def get_images(self, product_ids):
+        storage = ProductImage._meta.get_field("image").storage
+        images = defaultdict(list)
+        for product_id, image_id, name in ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).values_list("product_id", "id", "image"):
+            url = self.request.build_absolute_uri(storage.url(name)) if name else None
+            images[product_id].append({"id": image_id, "image": url})
+        return images
+
+    def get_collection_urls(self, collection_ids):
+        return {
+            collection_id: reverse(
+                "collection-detail", kwargs={"pk": collection_id}, request=self.request
+            )
+            for collection_id in collection_ids
+        }
+
+    def get_getters(self, rows):
+        unit_price = self.serializer_fields.get("unit_price")
+        getters = {
+            "id": lambda row: row["id"],
+            "title": lambda row: row["title"],
+            "slug": lambda row: row["slug"],
+            "description": lambda row: row["description"],
+            "unit_price": lambda row: unit_price.to_representation(row["unit_price"]),
+            "price_with_tax": lambda row: row["unit_price"] * TAX_RATE,
+            "inventory": lambda row: row["inventory"],
+        }
+        if "collection" in self.fields:
+            urls = self.get_collection_urls({row["collection_id"] for row in rows})
+            getters["collection"] = lambda row: urls[row["collection_id"]]
+        if "images" in self.fields:
+            images = self.get_images([row["id"] for row in rows])
+            getters["images"] = lambda row: images.get(row["id"], [])
+
+        # ProductSerializer.order_id has no backing attribute, DRF skips it
+        return [(name, getters[name]) for name in self.fields if name in getters]
+
+
+class FastOrderSerializer(FastSerializer):
+    serializer_class = OrderSerializer
+    columns = ["id", "customer_id", "placed_at", "payment_status"]
+
+    def get_items(self, order_ids):
+        # Same two queries as prefetch_related("items__product")
+        items = list(
+            OrderItem.objects.filter(order_id__in=order_ids).values(
+                "id", "order_id", "product_id", "unit_price", "quantity"
+            )
+        )
+        products = {
+            product["id"]: product
+            for product in Product.objects.filter(
+                id__in={item["product_id"] for item in items}
+            ).values("id", "title", "unit_price")
+        }
+
+        grouped = defaultdict(list)
+        for item in items:
+            grouped[item["order_id"]].append(
+                {
+                    "id": item["id"],
+                    "product": products[item["product_id"]],
+                    "unit_price": item["unit_price"],
+                    "quantity": item["quantity"],
+                }
+            )
+        return grouped
+
+    def get_getters(self, rows):
+        placed_at = self.serializer_fields.get("placed_at")
+        payment_status = self.serializer_fields.get("payment_status")
+        getters = {
+            "id": lambda row: row["id"],
+            "customer_id": lambda row: row["customer_id"],
+            "placed_at": lambda row: placed_at.to_representation(row["placed_at"]),
+            "payment_status": lambda row: payment_status.to_representation(
+                row["payment_status"]
+            ),
+        }
+        if "items" in self.fields:
+            items = self.get_items([row["id"] for row in rows])
+            getters["items"] = lambda row: items.get(row["id"], [])
+        return [(name, getters[name]) for name in self.fields]
+
+
+class FastCartSerializer(FastSerializer):
+    serializer_class = CartSerializer
+    columns = ["id"]
+
+    def get_items(self, cart_ids):
+        items = list(
+            CartItem.objects.filter(cart_id__in=cart_ids).values(
+                "id", "cart_id", "product_id", "quantity"
+            )
+        )
+        products = {
+            product["id"]: product
+            for product in Product.objects.filter(
+                id__in={item["product_id"] for item in items}
+            ).values("id", "title", "unit_price")
+        }
+
+        grouped = defaultdict(list)
+        for item in items:
+            product = products[item["product_id"]]
+            grouped[item["cart_id"]].append(
+                {
+                    "id": item["id"],
+                    "product": product,
+                    "quantity": item["quantity"],
+                    "total_price": item["quantity"] * product["unit_price"],
+                }
+            )
+        return grouped
+
+    def get_getters(self, rows):
+        getters = {"id": lambda row: str(row["id"])}
+        if "items" in self.fields or "total_price" in self.fields:
+            items = self.get_items([row["id"] for row in rows])
+            getters["items"] = lambda row: items.get(row["id"], [])
+            getters["total_price"] = lambda row: sum(
+                [item["total_price"] for item in items.get(row["id"], [])]
+            )
+        return [(name, getters[name]) for name in self.fields]
+
+
+class FastRetrieveMixin:
+    """Routes retrieve through `fast_serializer_class` when enabled"""
+
+    fast_serializer_class = None
+
+    def use_fast_path(self):
+        return getattr(settings, "STORE_FAST_SERIALIZATION", False) and not (
+            self.request.query_params.get("expand")
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().retrieve(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(request)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            (row,) = serializer.values(
+                self.filter_queryset(self.get_queryset()).filter(
+                    **{self.lookup_field: kwargs[lookup_url_kwarg]}
+                )
+            )[:1]
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(request, row)
+        return Response(serializer.render([row])[0])
+
+
+class FastPathMixin(FastRetrieveMixin):
+    """Routes list and retrieve through `fast_serializer_class` when enabled"""
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.fast_serializer_class(request)
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.render(page))
+        return Response(serializer.render(rows))
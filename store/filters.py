@@ -1,5 +1,7 @@
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import OrderingFilter, SearchFilter
 from .models import Product
+from .search import get_search_backend
 
 
 class ProductFilter(FilterSet):
@@ -10,3 +12,25 @@ class ProductFilter(FilterSet):
             "unit_price": ["gt", "lt"],
             "inventory": ["gt", "lt"],
         }
+
+
+class ProductSearchFilter(SearchFilter):
+    """?search= through the indexed full-text backend from store.search"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, "").strip()
+        if not terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, terms)
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """Drops ?ordering=relevance when there is no ?search= to rank against"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and "relevance" not in queryset.query.annotations:
+            ordering = [
+                field for field in ordering if field.lstrip("-") != "relevance"
+            ] or self.get_default_ordering(view)
+        return ordering
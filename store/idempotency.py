@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+from functools import partial, wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+# Idempotency-Key support for unsafe actions.
+#
+# The first request with a given key runs normally and its response (status,
+# data, Location) is stored under the key together with a fingerprint of the
+# request. Retries with the same key get the stored response back without
+# reaching the action. While the first request is still running, duplicates
+# wait for it instead of racing it. Reusing a key for a different request is
+# rejected with 422.
+#
+# Keys are scoped to something the server issued: the user, or what the view
+# picks in get_idempotency_scope() (e.g. the cart in the URL). Requests with
+# no scope run without idempotency, so anonymous clients can't read or block
+# each other's responses by guessing keys.
+
+HEADER = "Idempotency-Key"
+RECORD_KEY = "store:idempotency:{}:{}"
+LOCK_KEY = "store:idempotency-lock:{}:{}"
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    source = f"{request.method}|{request.path}|{body}"
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+def idempotent(handler):
+    """Runs a view method through IdempotencyMixin.idempotent_response; for
+    actions the mixin doesn't wrap itself (custom ones or a create override)"""
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            partial(handler, self), request, *args, **kwargs
+        )
+
+    return wrapper
+
+
+class IdempotencyMixin:
+    """Honours the Idempotency-Key header on `idempotent_actions`"""
+
+    idempotent_actions = ["create"]
+
+    def create(self, request, *args, **kwargs):
+        return self.idempotent_response(super().create, request, *args, **kwargs)
+
+    def partial_update(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            super().partial_update, request, *args, **kwargs
+        )
+
+    def get_idempotency_scope(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return None
+
+    def idempotent_response(self, handler, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        scope = self.get_idempotency_scope(request) if key else None
+        if scope is None or self.action not in self.idempotent_actions:
+            return handler(request, *args, **kwargs)
+
+        record_key = RECORD_KEY.format(scope, key)
+        lock_key = LOCK_KEY.format(scope, key)
+        request_fingerprint = fingerprint(request)
+        ttl = getattr(settings, "STORE_IDEMPOTENCY_TTL", 24 * 60 * 60)
+        lock_timeout = getattr(settings, "STORE_IDEMPOTENCY_LOCK_TIMEOUT", 30)
+
+        deadline = time.monotonic() + lock_timeout
+        while True:
+            record = cache.get(record_key)
+            if record is not None:
+                return self.replay(record, request_fingerprint)
+            if cache.add(lock_key, request_fingerprint, timeout=lock_timeout):
+                break
+            if time.monotonic() > deadline:
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            time.sleep(0.05)
+
+        try:
+            response = handler(request, *args, **kwargs)
+            # Server errors are worth retrying, so they are not remembered
+            if response.status_code < 500:
+                cache.set(
+                    record_key,
+                    {
+                        "fingerprint": request_fingerprint,
+                        "status": response.status_code,
+                        "data": response.data,
+                        "location": response.get("Location"),
+                    },
+                    ttl,
+                )
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def replay(self, record, request_fingerprint):
+        if record["fingerprint"] != request_fingerprint:
+            return Response(
+                {"detail": "Idempotency-Key was already used for another request"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(record["data"], status=record["status"])
+        if record["location"]:
+            response["Location"] = record["location"]
+        response["Idempotent-Replayed"] = "true"
+        return response
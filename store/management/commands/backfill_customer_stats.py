@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the customers' orders_count, lifetime_value and "
+        "last_order_at from their orders, one chunk of customers at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without fixing it"
+        )
+
+    def handle(self, *args, **options):
+        last_id = 0
+        checked = drifted = 0
+        while True:
+            with transaction.atomic():
+                # Lock the chunk so concurrent orders wait for its recount
+                customers = list(
+                    Customer.objects.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .only("orders_count", "lifetime_value", "last_order_at")[
+                        : options["chunk_size"]
+                    ]
+                )
+                if not customers:
+                    break
+                last_id = customers[-1].pk
+                changed = self.recompute(customers)
+                if changed and not options["dry_run"]:
+                    Customer.objects.bulk_update(
+                        changed, ["orders_count", "lifetime_value", "last_order_at"]
+                    )
+            checked += len(customers)
+            drifted += len(changed)
+            self.stdout.write(f"{checked} customers checked, {drifted} drifted")
+
+        verb = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} drifted customer(s) {verb}"))
+
+    def recompute(self, customers):
+        actual = Customer.objects.filter(
+            pk__in=[customer.pk for customer in customers]
+        ).recount_order_stats()
+
+        changed = []
+        for customer in customers:
+            stored = (
+                customer.orders_count,
+                customer.lifetime_value,
+                customer.last_order_at,
+            )
+            if actual[customer.pk] != stored:
+                (
+                    customer.orders_count,
+                    customer.lifetime_value,
+                    customer.last_order_at,
+                ) = actual[customer.pk]
+                changed.append(customer)
+        return changed
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+from store.models import (
+    Cart,
+    CartItem,
+    Collection,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+)
+from store.serializers import CreateOrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Check out many carts concurrently against a few hot products and "
+        "report throughput and overselling. Needs a database that lets "
+        "concurrent writers wait (PostgreSQL / MySQL). The rows it creates "
+        "are committed and deleted again at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--products", type=int, default=3)
+        parser.add_argument("--inventory", type=int, default=100)
+
+    def handle(self, *args, **options):
+        collection, users, carts, products = self.seed(**options)
+        try:
+            self.run(users, carts, products, options)
+        finally:
+            orders = Order.objects.filter(customer__user__in=users)
+            OrderItem.objects.filter(order__in=orders).delete()
+            orders.delete()
+            Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+            Product.objects.filter(collection=collection).delete()
+            collection.delete()
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def seed(self, buyers, products, inventory, **options):
+        collection = Collection.objects.create(title="bench checkout")
+        hot = Product.objects.bulk_create(
+            Product(
+                title=f"Hot product {i}",
+                slug=f"hot-product-{i}",
+                unit_price=Decimal("9.99"),
+                inventory=inventory,
+                collection=collection,
+            )
+            for i in range(products)
+        )
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f"bench-buyer-{i}", email=f"buyer{i}@dev.com")
+            for i in range(buyers)
+        )
+        # bulk_create skips the post_save handler that creates customers
+        Customer.objects.bulk_create(Customer(user=user) for user in users)
+        carts = Cart.objects.bulk_create(Cart() for _ in range(buyers))
+        # Every buyer wants one of each hot product
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=1)
+            for cart in carts
+            for product in hot
+        )
+        return collection, users, carts, hot
+
+    def run(self, users, carts, products, options):
+        def checkout(cart, user):
+            serializer = CreateOrderSerializer(
+                data={"cart_id": str(cart.pk)}, context={"user_id": user.pk}
+            )
+            try:
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                return "ordered"
+            except ValidationError:
+                return "out of stock"
+            finally:
+                connection.close()
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            outcomes = list(executor.map(checkout, carts, users))
+        elapsed = perf_counter() - start
+
+        ordered = outcomes.count("ordered")
+        sold = (
+            OrderItem.objects.filter(product__in=products).aggregate(
+                sold=Sum("quantity")
+            )["sold"]
+            or 0
+        )
+        remaining = Product.objects.filter(
+            pk__in=[product.pk for product in products]
+        ).aggregate(remaining=Sum("inventory"))["remaining"]
+        stocked = options["inventory"] * len(products)
+        oversold = sold - stocked if sold > stocked else 0
+
+        self.stdout.write(
+            f"{len(carts)} checkouts on {options['threads']} threads in "
+            f"{elapsed:.2f}s ({len(carts) / elapsed:.1f}/s)\n"
+            f"ordered {ordered}, rejected {outcomes.count('out of stock')}\n"
+            f"stocked {stocked}, sold {sold}, remaining {remaining}, "
+            f"oversold {oversold}"
+        )
+        if oversold or sold + remaining != stocked:
+            self.stderr.write("Inventory does not add up!")
@@ -0,0 +1,79 @@
+from statistics import mean
+from time import perf_counter
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.middleware import brotli, compress
+from core.renderers import ORJSONRenderer, orjson
+from store.views import OrderViewSet, ProductViewSet
+from .bench_serializers import Command as SerializerBenchmark, Rollback
+
+
+class Command(SerializerBenchmark):
+    help = (
+        "Compare DRF's JSONRenderer with the orjson renderer and the bytes "
+        "sent plain, gzip and brotli compressed, on product and order list "
+        "pages. Seeds its own rows and rolls them back."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--page-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("orjson is not installed, both renderers use json")
+        try:
+            with transaction.atomic():
+                user = self.seed(options["products"], options["orders"])
+                self.compare(user, options["repeat"], options["page_size"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def compare(self, user, repeat, page_size):
+        factory = APIRequestFactory()
+        endpoints = [
+            ("/store/products/", ProductViewSet),
+            ("/store/orders/", OrderViewSet),
+        ]
+        encodings = ["gzip", "br"] if brotli else ["gzip"]
+
+        for url, viewset in endpoints:
+            request = factory.get(url)
+            force_authenticate(request, user=user)
+            pagination = type(
+                "BenchPagination", (PageNumberPagination,), {"page_size": page_size}
+            )
+            view = viewset.as_view({"get": "list"}, pagination_class=pagination)
+            data = view(request).data
+
+            timings = {}
+            bodies = {}
+            for label, renderer in [
+                ("json", JSONRenderer()),
+                ("orjson", ORJSONRenderer()),
+            ]:
+                samples = []
+                for _ in range(repeat):
+                    start = perf_counter()
+                    bodies[label] = renderer.render(data)
+                    samples.append(perf_counter() - start)
+                timings[label] = mean(samples) * 1000
+
+            body = bodies["orjson"]
+            sizes = []
+            for encoding in encodings:
+                start = perf_counter()
+                compressed = compress(body, encoding)
+                elapsed = (perf_counter() - start) * 1000
+                sizes.append(f"{encoding} {len(compressed):>7} B ({elapsed:.2f} ms)")
+
+            identical = "yes" if bodies["json"] == bodies["orjson"] else "NO"
+            self.stdout.write(
+                f"{url:<18} json {timings['json']:6.2f} ms   "
+                f"orjson {timings['orjson']:6.2f} ms   "
+                f"identical: {identical}\n"
+                f"{'':<18} plain {len(body):>7} B   " + "   ".join(sizes)
+            )
@@ -0,0 +1,103 @@
+from decimal import Decimal
+from statistics import mean
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from store.models import Collection, Order, OrderItem, Product, ProductImage
+from store.views import OrderViewSet, ProductViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the regular DRF serializers with the .values() fast path on "
+        "product and order list pages. Seeds its own rows and rolls them back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options["products"], options["orders"])
+                self.run(user, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, product_count, order_count):
+        collection = Collection.objects.create(title="bench")
+        products = Product.objects.bulk_create(
+            Product(
+                title=f"Product {i}",
+                slug=f"product-{i}",
+                description="Benchmark product",
+                unit_price=Decimal("9.99") + i,
+                inventory=100,
+                collection=collection,
+            )
+            for i in range(product_count)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"store/images/{product.id}.jpg")
+            for product in products
+            for _ in range(2)
+        )
+
+        user = get_user_model().objects.create(
+            username="bench", email="bench@dev.com", is_staff=True
+        )
+        orders = Order.objects.bulk_create(
+            Order(customer=user.customer) for _ in range(order_count)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=product,
+                unit_price=product.unit_price,
+                quantity=1,
+            )
+            for order in orders
+            for product in products[:3]
+        )
+        return user
+
+    def run(self, user, repeat):
+        factory = APIRequestFactory()
+        endpoints = [
+            ("/store/products/", ProductViewSet),
+            ("/store/orders/", OrderViewSet),
+        ]
+
+        for url, viewset in endpoints:
+            view = viewset.as_view({"get": "list"})
+            timings = {}
+            bodies = {}
+            for label, fast in [("drf", False), ("fast", True)]:
+                with override_settings(STORE_FAST_SERIALIZATION=fast):
+                    samples = []
+                    for _ in range(repeat):
+                        request = factory.get(url)
+                        force_authenticate(request, user=user)
+                        start = perf_counter()
+                        response = view(request).render()
+                        samples.append(perf_counter() - start)
+                    timings[label] = mean(samples) * 1000
+                    bodies[label] = response.content
+
+            identical = "yes" if bodies["drf"] == bodies["fast"] else "NO"
+            self.stdout.write(
+                f"{url:<18} drf {timings['drf']:7.2f} ms   "
+                f"fast {timings['fast']:7.2f} ms   "
+                f"speedup {timings['drf'] / timings['fast']:4.1f}x   "
+                f"identical: {identical}"
+            )
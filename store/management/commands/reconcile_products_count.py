@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from store.cache import bump_generation
+from store.models import Collection
+
+
+class Command(BaseCommand):
+    help = "Recount Collection.products_count and fix collections that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without fixing it"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Lock the rows so concurrent product writes wait for the recount.
+            # FOR UPDATE can't be combined with GROUP BY, so lock first.
+            list(Collection.objects.select_for_update().values_list("pk", flat=True))
+            collections = Collection.objects.annotate(
+                actual=Count("products")
+            ).values_list("id", "title", "products_count", "actual")
+            drifted = [row for row in collections if row[2] != row[3]]
+
+            for collection_id, title, stored, actual in drifted:
+                self.stdout.write(f"{collection_id} {title}: {stored} -> {actual}")
+                if not options["dry_run"]:
+                    Collection.objects.filter(pk=collection_id).update(
+                        products_count=actual
+                    )
+
+            if drifted and not options["dry_run"]:
+                transaction.on_commit(lambda: bump_generation("collections"))
+
+        verb = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(drifted)} drifted collection(s) {verb}")
+        )
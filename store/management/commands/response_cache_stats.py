@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from store.cache import get_generation, get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit / miss counters of the catalog response cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+
+        self.stdout.write(f"hits:      {stats['hits']}")
+        self.stdout.write(f"misses:    {stats['misses']}")
+        self.stdout.write(f"hit ratio: {ratio:.1%}")
+        for resource in ["products", "collections"]:
+            self.stdout.write(f"{resource} generation: {get_generation(resource)}")
+
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# Full-text index of store_product used by store.search. The DDL is frozen
+# here, per database vendor, so later changes to store.search can't rewrite
+# this migration.
+
+INSTALL_SQL = {
+    "postgresql": [
+        """
+        ALTER TABLE store_product ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+        """,
+        "CREATE INDEX store_product_search_vector_idx ON store_product "
+        "USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        """
+        CREATE VIRTUAL TABLE store_product_fts USING fts5(
+            title, description,
+            content='store_product', content_rowid='id', tokenize='porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER store_product_fts_ai AFTER INSERT ON store_product BEGIN
+            INSERT INTO store_product_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+        """,
+        """
+        CREATE TRIGGER store_product_fts_ad AFTER DELETE ON store_product BEGIN
+            INSERT INTO store_product_fts(store_product_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+        """,
+        """
+        CREATE TRIGGER store_product_fts_au
+        AFTER UPDATE OF title, description ON store_product BEGIN
+            INSERT INTO store_product_fts(store_product_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO store_product_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+        """,
+        "INSERT INTO store_product_fts(store_product_fts) VALUES ('rebuild')",
+    ],
+    "mysql": [
+        "ALTER TABLE store_product "
+        "ADD FULLTEXT INDEX store_product_search_idx (title, description)"
+    ],
+}
+
+UNINSTALL_SQL = {
+    "postgresql": [
+        "DROP INDEX IF EXISTS store_product_search_vector_idx",
+        "ALTER TABLE store_product DROP COLUMN IF EXISTS search_vector",
+    ],
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS store_product_fts_ai",
+        "DROP TRIGGER IF EXISTS store_product_fts_ad",
+        "DROP TRIGGER IF EXISTS store_product_fts_au",
+        "DROP TABLE IF EXISTS store_product_fts",
+    ],
+    "mysql": ["ALTER TABLE store_product DROP INDEX store_product_search_idx"],
+}
+
+
+def install_search_index(apps, schema_editor):
+    for sql in INSTALL_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def uninstall_search_index(apps, schema_editor):
+    for sql in UNINSTALL_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0022_alter_productimage_image"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
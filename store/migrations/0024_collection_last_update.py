@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0023_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collection",
+            name="last_update",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_products_count(apps, schema_editor):
+    Collection = apps.get_model("store", "Collection")
+    Product = apps.get_model("store", "Product")
+    counts = (
+        Product.objects.filter(collection_id=OuterRef("pk"))
+        .order_by()
+        .values("collection_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Collection.objects.update(products_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0024_collection_last_update"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collection",
+            name="products_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_products_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0025_collection_products_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(
+                fields=["created_at", "id"], name="store_cart_created_e4200b_idx"
+            ),
+        ),
+    ]
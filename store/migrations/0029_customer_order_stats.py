@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0028_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="last_order_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="lifetime_value",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="orders_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
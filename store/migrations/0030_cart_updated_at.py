@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0029_customer_order_stats"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="cart",
+            name="store_cart_created_e4200b_idx",
+        ),
+        # Existing carts have no recorded activity: they get a full TTL from
+        # the migration on rather than being reaped by their creation time
+        migrations.AddField(
+            model_name="cart",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(
+                fields=["updated_at", "id"], name="store_cart_updated_00e2f1_idx"
+            ),
+        ),
+    ]
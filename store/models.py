@@ -1,8 +1,15 @@
-from django.db import models
+from collections import Counter
+from django.db import IntegrityError, connections, models, transaction
+from decimal import Decimal
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
 from django.contrib import admin
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator, MinValueValidator
+from django.utils import timezone
 from uuid import uuid4
+from .cache import bump_generation
 from .validators import validate_file_size
 
 
@@ -11,16 +18,134 @@ class Promotion(models.Model):
     discount = models.FloatField()
 
 
+class CollectionQuerySet(models.QuerySet):
+    def adjust_products_count(self, deltas):
+        """Apply {collection_id: delta} to the stored products_count.
+
+        Runs in the caller's transaction; rows are touched in id order so
+        concurrent moves between the same collections cannot deadlock.
+        """
+        for collection_id, delta in sorted(deltas.items()):
+            if delta:
+                self.filter(pk=collection_id).update(
+                    products_count=F("products_count") + delta, last_update=Now()
+                )
+
+
 class Collection(models.Model):
     title = models.CharField(max_length=100)
     featured_product = models.ForeignKey(
         "Product", on_delete=models.SET_NULL, null=True, related_name="+"
     )
+    last_update = models.DateTimeField(auto_now=True)
+    # Maintained by Product saves / deletes and ProductQuerySet bulk methods,
+    # `manage.py reconcile_products_count` repairs any drift.
+    products_count = models.IntegerField(default=0, editable=False)
+
+    objects = CollectionQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
 
 
+class ProductQuerySet(models.QuerySet):
+    """Keeps products_count and cache generations right for writes that skip signals"""
+
+    def _count_by_collection(self):
+        return Counter(
+            dict(
+                self.order_by().values_list("collection_id").annotate(count=Count("id"))
+            )
+        )
+
+    def _products_moved(self, removed, added):
+        deltas = Counter(added)
+        deltas.subtract(removed)
+        Collection.objects.adjust_products_count(deltas)
+        transaction.on_commit(lambda: bump_generation("products", "collections"))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            self._products_moved(
+                Counter(), Counter(product.collection_id for product in objs)
+            )
+        return created
+
+    def _products_changed(self):
+        transaction.on_commit(lambda: bump_generation("products"))
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "collection" not in fields and "collection_id" not in fields:
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            self._products_changed()
+            return updated
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            removed = Product.objects.filter(
+                pk__in=[product.pk for product in objs]
+            )._count_by_collection()
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            self._products_moved(
+                removed, Counter(product.collection_id for product in objs)
+            )
+        return updated
+
+    def update(self, **kwargs):
+        collection = kwargs.get("collection", kwargs.get("collection_id"))
+        if collection is None:
+            updated = super().update(**kwargs)
+            self._products_changed()
+            return updated
+
+        collection_id = getattr(collection, "pk", collection)
+        with transaction.atomic(using=self.db):
+            removed = self._count_by_collection()
+            updated = super().update(**kwargs)
+            self._products_moved(removed, Counter({collection_id: updated}))
+        return updated
+
+    def reserve_inventory(self, quantities):
+        """Take {product_id: quantity} out of inventory in one UPDATE.
+
+        All or nothing: returns the ids without enough stock (or deleted), and
+        then leaves inventory untouched. Concurrent reservations wait on the
+        row locks and re-check the condition, so stock never goes negative.
+        """
+        if not quantities:
+            return []
+
+        def per_product(expression):
+            return Case(
+                *(
+                    When(pk=product_id, then=expression(quantity))
+                    for product_id, quantity in quantities.items()
+                ),
+                output_field=models.IntegerField(),
+            )
+
+        with transaction.atomic(using=self.db):
+            updated = self.filter(
+                pk__in=quantities, inventory__gte=per_product(Value)
+            ).update(
+                inventory=per_product(lambda quantity: F("inventory") - quantity),
+                last_update=Now(),
+            )
+            if updated == len(quantities):
+                return []
+            # Undo the rows that did have stock before reading the shortfall
+            transaction.set_rollback(True, using=self.db)
+
+        stock = dict(self.filter(pk__in=quantities).values_list("id", "inventory"))
+        return sorted(
+            product_id
+            for product_id, quantity in quantities.items()
+            if stock.get(product_id, 0) < quantity
+        )
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField()
@@ -35,9 +160,31 @@ class Product(models.Model):
     )
     promotions = models.ManyToManyField(Promotion, blank=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.title
 
+    # Remember the collection the row was loaded with, so the post_save
+    # handler can move products_count without re-reading the row. Deferred
+    # collection_id (e.g. .only()) is read by the pre_save handler instead.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "collection_id" in field_names:
+            instance._loaded_collection_id = instance.collection_id
+        return instance
+
+    # The products_count updates in the signal handlers share the transaction
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+        self._loaded_collection_id = self.collection_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            return super().delete(*args, **kwargs)
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -49,6 +196,61 @@ class ProductImage(models.Model):
         return f"{self.product}"
 
 
+class CustomerQuerySet(models.QuerySet):
+    def adjust_order_stats(self, deltas, last_order_at=None):
+        """Apply {customer_id: (orders, lifetime_value)} deltas to the stored
+        order stats; `last_order_at` is set on every customer in `deltas`.
+
+        Rows are touched in id order, like Collection.adjust_products_count.
+        """
+        for customer_id, (orders, value) in sorted(deltas.items()):
+            changes = {}
+            if orders:
+                changes["orders_count"] = F("orders_count") + orders
+            if value:
+                changes["lifetime_value"] = F("lifetime_value") + value
+            if last_order_at is not None:
+                changes["last_order_at"] = last_order_at
+            if changes:
+                self.filter(pk=customer_id).update(**changes)
+
+    def recount_order_stats(self):
+        """{customer_id: (orders_count, lifetime_value, last_order_at)} of the
+        customers in this queryset, computed from their orders"""
+        ids = list(self.values_list("pk", flat=True))
+        orders = {
+            row["customer_id"]: row
+            for row in Order.objects.filter(customer_id__in=ids)
+            .order_by()
+            .values("customer_id")
+            .annotate(
+                count=Count(
+                    "id", filter=~Q(payment_status=Order.PAYMENT_STATUS_FAILED)
+                ),
+                last=Max("placed_at"),
+            )
+        }
+        # Summed from the items directly, so order rows aren't multiplied
+        values = dict(
+            OrderItem.objects.filter(
+                order__customer_id__in=ids,
+                order__payment_status=Order.PAYMENT_STATUS_COMPLETE,
+            )
+            .order_by()
+            .values("order__customer_id")
+            .annotate(value=Sum(F("quantity") * F("unit_price")))
+            .values_list("order__customer_id", "value")
+        )
+        return {
+            customer_id: (
+                orders.get(customer_id, {}).get("count", 0),
+                values.get(customer_id) or Decimal(0),
+                orders.get(customer_id, {}).get("last"),
+            )
+            for customer_id in ids
+        }
+
+
 class Customer(models.Model):
     MEMBERSHIP_BRONZE = "B"
     MEMBERSHIP_SILVER = "S"
@@ -66,6 +268,16 @@ class Customer(models.Model):
         max_length=1, choices=MEMBERSHIP_CHOICES, default=MEMBERSHIP_BRONZE
     )
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Maintained by the order signal handlers and OrderQuerySet.update(),
+    # `manage.py backfill_customer_stats` recomputes them. Failed orders are
+    # not counted and only completed orders add to the lifetime value.
+    orders_count = models.IntegerField(default=0, editable=False)
+    lifetime_value = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    last_order_at = models.DateTimeField(null=True, editable=False)
+
+    objects = CustomerQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"{self.user.first_name} {self.user.last_name}"
@@ -91,6 +303,67 @@ class Address(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
 
+class OrderQuerySet(models.QuerySet):
+    """Keeps the customers' order stats and the sales rollups right for
+    status bulk updates"""
+
+    def with_totals(self):
+        return self.annotate(
+            total=Coalesce(
+                Sum(F("items__quantity") * F("items__unit_price")),
+                Value(Decimal(0)),
+                output_field=models.DecimalField(),
+            )
+        )
+
+    def update(self, **kwargs):
+        status = kwargs.get("payment_status")
+        if status is None:
+            return super().update(**kwargs)
+
+        # store.rollups imports this module
+        from .rollups import settle_payment_changes
+
+        with transaction.atomic(using=self.db):
+            # FOR UPDATE can't be combined with GROUP BY, so lock first
+            locked = list(self.select_for_update().values_list("pk", flat=True))
+            deltas, completed = {}, {}
+            for order_id, customer_id, previous, total in (
+                self.model.objects.filter(pk__in=locked)
+                .with_totals()
+                .values_list("pk", "customer_id", "payment_status", "total")
+            ):
+                deltas[customer_id] = order_stats_delta(
+                    previous, status, total, deltas.get(customer_id, (0, 0))
+                )
+                completed[order_id] = completed_delta(previous, status)
+            updated = super().update(**kwargs)
+            Customer.objects.adjust_order_stats(deltas)
+            settle_payment_changes(completed)
+        return updated
+
+
+def order_stats_contribution(payment_status, total):
+    """(orders, lifetime_value) an order in this status adds to its customer"""
+    if payment_status == Order.PAYMENT_STATUS_FAILED:
+        return 0, 0
+    if payment_status == Order.PAYMENT_STATUS_COMPLETE:
+        return 1, total
+    return 1, 0
+
+
+def order_stats_delta(previous, current, total, base=(0, 0)):
+    before = order_stats_contribution(previous, total)
+    after = order_stats_contribution(current, total)
+    return base[0] + after[0] - before[0], base[1] + after[1] - before[1]
+
+
+def completed_delta(previous, current):
+    """1 when a status change completes an order, -1 when it undoes that"""
+    complete = Order.PAYMENT_STATUS_COMPLETE
+    return (current == complete) - (previous == complete)
+
+
 class Order(models.Model):
     PAYMENT_STATUS_PENDING = "P"
     PAYMENT_STATUS_COMPLETE = "C"
@@ -107,9 +380,30 @@ class Order(models.Model):
     )
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    objects = OrderQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.payment_status
 
+    # Remember the loaded status, so the post_save handler can move the
+    # customer's order stats without re-reading the row.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_payment_status = instance.__dict__.get("payment_status")
+        return instance
+
+    # The customer stats updates in the signal handlers share the transaction.
+    # No savepoint: checkout saves orders inside its own transaction.
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            super().save(*args, **kwargs)
+        self._loaded_payment_status = self.payment_status
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            return super().delete(*args, **kwargs)
+
     class Meta:
         permissions = [("cancel_order", "Can cancel order")]
 
@@ -123,16 +417,156 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="items")
 
 
+class CartQuerySet(models.QuerySet):
+    def touch(self, cart_id):
+        """Record activity on the cart; returns 0 when there is no such cart.
+
+        Item writes go through raw SQL or querysets that skip Cart.save(), so
+        they call this to keep updated_at, which the abandoned cart reaper
+        goes by, current. The UPDATE also locks the cart row for the rest of
+        the transaction.
+        """
+        return self.filter(pk=cart_id).update(updated_at=timezone.now())
+
+
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last write to the cart or its items
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        # Keyset order of the abandoned cart reaper (store.tasks)
+        indexes = [models.Index(fields=["updated_at", "id"])]
+
+
+class CartItemQuerySet(models.QuerySet):
+    def _columns(self, connection):
+        """Quoted table, cart, product and quantity column names"""
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        return [
+            quote(meta.db_table),
+            *(quote(meta.get_field(name).column) for name in ("cart", "product")),
+            quote(meta.get_field("quantity").column),
+        ]
+
+    def _on_conflict(self, connection, increment, guard=False):
+        """With `guard`, an increment past MAX_QUANTITY leaves the row as is
+        (nothing is RETURNed) or, on MySQL, fails on the NOT NULL column"""
+        table, cart, product, quantity = self._columns(connection)
+        if connection.vendor == "mysql":
+            value = f"VALUES({quantity})"
+            if increment:
+                value = f"{table}.{quantity} + {value}"
+            if guard:
+                value = f"IF({value} <= {self.model.MAX_QUANTITY}, {value}, NULL)"
+            return f"ON DUPLICATE KEY UPDATE {quantity} = {value}"
+
+        value = f"excluded.{quantity}"
+        if increment:
+            value = f"{table}.{quantity} + {value}"
+        sql = f"ON CONFLICT ({cart}, {product}) DO UPDATE SET {quantity} = {value}"
+        if guard:
+            sql += f" WHERE {value} <= {self.model.MAX_QUANTITY}"
+        return sql
+
+    def upsert_quantities(self, cart_id, quantities, increment=False):
+        """Write {product_id: quantity} for one cart with a single multi-row
+        INSERT ... ON CONFLICT. With increment=True the quantities are added
+        to existing rows, otherwise they replace them. Products must exist,
+        and callers check the resulting quantities against MAX_QUANTITY.
+        """
+        if not quantities:
+            return
+        connection = connections[self.db]
+        table, cart, product, quantity = self._columns(connection)
+        cart_pk = Cart._meta.pk.get_db_prep_value(cart_id, connection)
+        rows = ", ".join(["(%s, %s, %s)"] * len(quantities))
+        params = [
+            value
+            for product_id, item_quantity in quantities.items()
+            for value in (cart_pk, product_id, item_quantity)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({cart}, {product}, {quantity}) "
+                f"VALUES {rows} {self._on_conflict(connection, increment)}",
+                params,
+            )
+
+    def add_quantity(self, cart_id, product_id, quantity):
+        """Insert the item or add to its quantity in one atomic statement,
+        after touching the cart (see CartQuerySet.touch).
+
+        The row is produced by SELECTing the product and cart, so a missing
+        one inserts nothing and None is returned instead of raising a
+        deferred FK error. None is also returned when the sum would exceed
+        MAX_QUANTITY. Concurrent adds of the same product can't hit the
+        (cart, product) unique constraint.
+        """
+        connection = connections[self.db]
+        try:
+            cart_pk = Cart._meta.pk.get_db_prep_value(cart_id, connection)
+        except ValidationError:
+            return None
+        if not Cart.objects.using(self.db).touch(cart_id):
+            return None
+        quote = connection.ops.quote_name
+        table, cart, product, quantity_column = self._columns(connection)
+        item_pk = quote(self.model._meta.pk.column)
+        cart_pk_column = quote(Cart._meta.pk.column)
+        product_pk_column = quote(Product._meta.pk.column)
+        params = [quantity, product_id, cart_pk]
+        insert = (
+            f"INSERT INTO {table} ({cart}, {product}, {quantity_column}) "
+            f"SELECT c.{cart_pk_column}, p.{product_pk_column}, %s "
+            f"FROM {quote(Product._meta.db_table)} p, {quote(Cart._meta.db_table)} c "
+            f"WHERE p.{product_pk_column} = %s AND c.{cart_pk_column} = %s "
+        )
+        on_conflict = self._on_conflict(connection, True, guard=True)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                # No RETURNING on MySQL: read the row back by its unique key
+                try:
+                    with transaction.atomic(using=self.db):
+                        cursor.execute(insert + on_conflict, params)
+                except IntegrityError:
+                    return None
+                if cursor.rowcount == 0:
+                    return None
+                cursor.execute(
+                    f"SELECT {item_pk}, {quantity_column} FROM {table} "
+                    f"WHERE {cart} = %s AND {product} = %s",
+                    [cart_pk, product_id],
+                )
+            else:
+                cursor.execute(
+                    f"{insert}{on_conflict} RETURNING {item_pk}, {quantity_column}",
+                    params,
+                )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return self.model(
+            id=row[0], cart_id=cart_id, product_id=product_id, quantity=row[1]
+        )
 
 
 class CartItem(models.Model):
+    # Upper end of PositiveSmallIntegerField on every database
+    MAX_QUANTITY = 32767
+
     quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [["cart", "product"]]
 
@@ -144,3 +578,74 @@ class Review(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateField(auto_now_add=True)
+
+
+class OutboxEvent(models.Model):
+    """Event written in the transaction that caused it and delivered after
+    commit by store.tasks.relay_outbox (at least once, in id order per key)"""
+
+    topic = models.CharField(max_length=100)
+    # Events sharing a key (e.g. an order id) are delivered in order
+    key = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["processed_at", "available_at", "id"])]
+
+    def __str__(self) -> str:
+        return f"{self.topic} #{self.key}"
+
+
+##############################################################################
+# SALES ROLLUPS
+#
+# Maintained incrementally by store.tasks.rollup_sales from completed orders
+# past the high-water mark in SalesRollupWatermark (see store.rollups);
+# reports read only these tables.
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [["date", "product"]]
+
+
+class DailyCollectionSales(models.Model):
+    date = models.DateField()
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="+"
+    )
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [["date", "collection"]]
+
+
+class DailyMembershipSales(models.Model):
+    date = models.DateField()
+    # The customer's tier when the order was rolled up
+    membership = models.CharField(max_length=1, choices=Customer.MEMBERSHIP_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [["date", "membership"]]
+
+
+class SalesRollupWatermark(models.Model):
+    """(placed_at, order_id) of the last order included in the rollups"""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    placed_at = models.DateTimeField(null=True)
+    order_id = models.PositiveBigIntegerField(default=0)
@@ -0,0 +1,133 @@
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Opaque ?cursor= pagination with no COUNT(*) and no OFFSET scans.
+
+    The ordering comes from the view's OrderingFilter (or `ordering` below)
+    and `id` is always appended, so every row has a unique position. The
+    cursor holds the whole position (e.g. unit_price and id of the last row)
+    and the next page is read with a row comparison on all of its fields:
+    rows sharing the same unit_price / last_update are never skipped with an
+    OFFSET, however many of them there are.
+    """
+
+    page_size = 10
+    ordering = ("id",)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering += ("-id",) if ordering[0].startswith("-") else ("id",)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.after(ordering, current_position))
+
+        # Positions are unique, so the offset is only ever set by cursors
+        # made by the base class; one extra row tells if there is a next page
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, ordering, position):
+        """Rows past `position` in `ordering`: (a > x) OR (a = x AND b > y) ..."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            (
+                instance[field.lstrip("-")]
+                if isinstance(instance, dict)
+                else getattr(instance, field.lstrip("-"))
+            )
+            for field in ordering
+        ]
+        return json.dumps([str(value) for value in values])
+
+
+class KeysetOptInMixin:
+    """Lets clients opt in to keyset pagination with ?pagination=cursor.
+
+    Next/previous links keep the query string, so once a client follows a
+    cursor link it stays in keyset mode.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    keyset_query_param = "pagination"
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return params.get(self.keyset_query_param) == "cursor" or bool(
+            params.get(self.keyset_pagination_class.cursor_query_param)
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.use_keyset_pagination():
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
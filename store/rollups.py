@@ -0,0 +1,121 @@
+from collections import defaultdict
+from django.db.models import Q
+from django.utils import timezone
+from .models import (
+    DailyCollectionSales,
+    DailyMembershipSales,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    SalesRollupWatermark,
+)
+
+# Daily sales rollups count completed orders only, like
+# Customer.lifetime_value.
+#
+# store.tasks.rollup_sales folds in the completed orders past the watermark.
+# Orders behind it that move into or out of the completed status afterwards
+# are added or taken back by settle_payment_changes(), which the status
+# bookkeeping calls next to Customer.objects.adjust_order_stats().
+
+
+def merge_rollup(model, key_fields, totals):
+    """Add {(date, key): {field: amount}} onto the rollup rows, creating the
+    missing ones; rows are locked for the caller's transaction.
+
+    Amounts taken back never push a row below zero: the membership tier an
+    order was added under may have changed since.
+    """
+    if not totals:
+        return
+    date_field, key_field = key_fields
+    rows = {
+        (getattr(row, date_field), getattr(row, key_field)): row
+        for row in model.objects.select_for_update().filter(
+            **{
+                f"{date_field}__in": {date for date, _ in totals},
+                f"{key_field}__in": {key for _, key in totals},
+            }
+        )
+    }
+
+    created, updated = [], []
+    for (date, key), amounts in totals.items():
+        row = rows.get((date, key))
+        if row is None:
+            if all(amount >= 0 for amount in amounts.values()):
+                created.append(model(**{date_field: date, key_field: key}, **amounts))
+            continue
+        for field, amount in amounts.items():
+            setattr(row, field, max(getattr(row, field) + amount, 0))
+        updated.append(row)
+
+    model.objects.bulk_create(created)
+    if updated:
+        fields = list(next(iter(totals.values())))
+        model.objects.bulk_update(updated, fields)
+
+
+def merge_order_sales(order_ids, sign=1):
+    """Add the orders' items to the rollups, or take them back with sign=-1"""
+    if not order_ids:
+        return
+    products = defaultdict(lambda: {"quantity": 0, "revenue": 0})
+    collections = defaultdict(lambda: {"quantity": 0, "revenue": 0})
+    memberships = defaultdict(lambda: {"orders": 0, "quantity": 0, "revenue": 0})
+    counted_orders = set()
+    for item in OrderItem.objects.filter(order_id__in=order_ids).values(
+        "order_id",
+        "order__placed_at",
+        "order__customer__membership",
+        "product_id",
+        "product__collection_id",
+        "quantity",
+        "unit_price",
+    ):
+        date = timezone.localdate(item["order__placed_at"])
+        membership = memberships[date, item["order__customer__membership"]]
+        quantity = sign * item["quantity"]
+        revenue = quantity * item["unit_price"]
+        for totals in [
+            products[date, item["product_id"]],
+            collections[date, item["product__collection_id"]],
+            membership,
+        ]:
+            totals["quantity"] += quantity
+            totals["revenue"] += revenue
+        if item["order_id"] not in counted_orders:
+            counted_orders.add(item["order_id"])
+            membership["orders"] += sign
+
+    merge_rollup(DailyProductSales, ["date", "product_id"], products)
+    merge_rollup(DailyCollectionSales, ["date", "collection_id"], collections)
+    merge_rollup(DailyMembershipSales, ["date", "membership"], memberships)
+
+
+def settle_payment_changes(deltas):
+    """Apply {order_id: completed_delta} to the rollups for the orders that
+    are already rolled up; must run in the transaction of the change.
+
+    The watermark is locked, so a rollup_sales batch running meanwhile either
+    sees the new status or moves the watermark before this reads it.
+    """
+    deltas = {order_id: delta for order_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    watermark = (
+        SalesRollupWatermark.objects.select_for_update()
+        .filter(name="sales", placed_at__isnull=False)
+        .first()
+    )
+    if watermark is None:
+        return
+    rolled_up = Order.objects.filter(pk__in=deltas).filter(
+        Q(placed_at__lt=watermark.placed_at)
+        | Q(placed_at=watermark.placed_at, id__lte=watermark.order_id)
+    )
+    order_ids = list(rolled_up.values_list("id", flat=True))
+    for sign in [1, -1]:
+        merge_order_sales(
+            [order_id for order_id in order_ids if deltas[order_id] == sign], sign
+        )
@@ -0,0 +1,137 @@
+import re
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .models import Product
+
+# Full-text search over Product.title / Product.description.
+#
+# Every backend narrows the queryset through a database-maintained index and
+# annotates a `relevance` score (higher is better), so `?ordering=-relevance`
+# can be combined with `?search=`. The index lives next to store_product and
+# is kept current by the database itself (generated column, triggers or
+# InnoDB FULLTEXT), so saves, bulk updates and admin edits never go stale.
+# The index itself is created by migration 0023_product_search_index.
+
+TABLE = Product._meta.db_table
+
+
+class SearchBackend:
+    vendor = None
+
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+
+########################################################################################
+# POSTGRESQL: weighted tsvector generated column + GIN index
+
+
+class PostgresSearchBackend(SearchBackend):
+    vendor = "postgresql"
+    config = "english"
+
+    def search(self, queryset, terms):
+        query = f"websearch_to_tsquery('{self.config}', %s)"
+        return queryset.filter(
+            RawSQL(
+                f"{TABLE}.search_vector @@ {query}",
+                [terms],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            relevance=RawSQL(
+                f"ts_rank_cd({TABLE}.search_vector, {query})",
+                [terms],
+                output_field=FloatField(),
+            )
+        )
+
+
+########################################################################################
+# SQLITE (dev / test): FTS5 external-content table synced by triggers
+#
+# NOTE: SQLite rebuilds a table for most ALTERs, which drops these triggers.
+# A migration that remakes store_product must create them again afterwards
+# (see 0023_product_search_index).
+
+
+class SQLiteSearchBackend(SearchBackend):
+    vendor = "sqlite"
+    fts_table = f"{TABLE}_fts"
+
+    def to_match_expression(self, terms):
+        # Quote every token so user input can never be parsed as FTS5 syntax,
+        # and prefix-match the last one for type-ahead searches.
+        tokens = [f'"{token}"' for token in re.findall(r"\w+", terms)]
+        if tokens:
+            tokens[-1] += "*"
+        return " ".join(tokens)
+
+    def search(self, queryset, terms):
+        match = self.to_match_expression(terms)
+        if not match:
+            return queryset.none()
+
+        return queryset.filter(
+            RawSQL(
+                f"{TABLE}.id IN (SELECT rowid FROM {self.fts_table} "
+                f"WHERE {self.fts_table} MATCH %s)",
+                [match],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            # bm25() is lower-is-better; title matches weigh 10x description
+            relevance=RawSQL(
+                f"(SELECT -bm25({self.fts_table}, 10.0, 1.0) FROM {self.fts_table} "
+                f"WHERE {self.fts_table} MATCH %s AND rowid = {TABLE}.id)",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+
+########################################################################################
+# MYSQL: InnoDB FULLTEXT index
+
+
+class MySQLSearchBackend(SearchBackend):
+    vendor = "mysql"
+
+    def search(self, queryset, terms):
+        match = f"MATCH ({TABLE}.title, {TABLE}.description) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        return queryset.filter(
+            RawSQL(match, [terms], output_field=BooleanField())
+        ).annotate(relevance=RawSQL(match, [terms], output_field=FloatField()))
+
+
+########################################################################################
+# FALLBACK: unindexed ILIKE scan for databases without a full-text index
+
+
+class LikeSearchBackend(SearchBackend):
+    fields = ["title", "description"]
+
+    def search(self, queryset, terms):
+        for term in terms.split():
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f"{field}__icontains": term})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(relevance=Value(0.0, output_field=FloatField()))
+
+
+SEARCH_BACKENDS = {
+    backend.vendor: backend
+    for backend in [PostgresSearchBackend, SQLiteSearchBackend, MySQLSearchBackend]
+}
+
+
+def get_search_backend(using="default") -> SearchBackend:
+    """STORE_SEARCH_BACKEND overrides the per-database default."""
+    path = getattr(settings, "STORE_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    return SEARCH_BACKENDS.get(connections[using].vendor, LikeSearchBackend)()
@@ -1,19 +1,84 @@
 from decimal import Decimal
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from rest_framework import serializers
-from .signals import order_created
+from rest_framework.exceptions import NotFound
+from .carts import get_cart_store, too_many_message
+from .tasks import relay_outbox
 from .models import (
     Cart,
     CartItem,
     Collection,
     Customer,
+    DailyCollectionSales,
+    DailyMembershipSales,
+    DailyProductSales,
     Order,
     OrderItem,
+    OutboxEvent,
     Product,
     ProductImage,
     Review,
 )
 
+#######################################################################################
+# SPARSE FIELDSETS
+
+
+class DynamicFieldsMixin:
+    """?fields= keeps only the listed fields, ?omit= drops fields and ?expand=
+    swaps a relation for the nested serializer in Meta.expandable_fields.
+
+    Only applied to GET requests of the top-level serializer; viewsets call
+    get_field_selection() to trim their querysets the same way.
+    """
+
+    @staticmethod
+    def _split_param(request, name):
+        return {
+            value for value in request.query_params.get(name, "").split(",") if value
+        }
+
+    @classmethod
+    def get_field_selection(cls, request):
+        expandable = getattr(cls.Meta, "expandable_fields", {})
+        names = [
+            *cls.Meta.fields,
+            *(name for name in expandable if name not in cls.Meta.fields),
+        ]
+        if request is None or request.method != "GET":
+            return [name for name in names if name in cls.Meta.fields], set()
+
+        expand = cls._split_param(request, "expand") & set(expandable)
+        names = [name for name in names if name in cls.Meta.fields or name in expand]
+        if "fields" in request.query_params:
+            requested = cls._split_param(request, "fields")
+            names = [name for name in names if name in requested]
+        omitted = cls._split_param(request, "omit")
+        names = [name for name in names if name not in omitted]
+        return names, expand & set(names)
+
+    @classmethod
+    def get_field_columns(cls, names, expand):
+        """Model columns for .only() that the selected fields read"""
+        field_columns = getattr(cls.Meta, "field_columns", {})
+        columns = {"id"}
+        for name in names:
+            columns.update(field_columns.get(name, [name]))
+            if name in expand:
+                nested = cls.Meta.expandable_fields[name]
+                columns.update(f"{name}__{field}" for field in nested.Meta.fields)
+        return columns
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names, expand = self.get_field_selection(self.context.get("request"))
+        for name in set(self.fields) - set(names):
+            self.fields.pop(name)
+        for name in expand:
+            self.fields[name] = self.Meta.expandable_fields[name](read_only=True)
+
 
 #######################################################################################
 # COLLECTION
@@ -41,11 +106,19 @@ class ProductImageSerializer(serializers.ModelSerializer):
         return ProductImage.objects.create(product_id=product_id, **validated_data)
 
 
+class SimpleCollectionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Collection
+        fields = ["id", "title"]
+
+
 #######################################################################################
 # PRODUCT
 
+TAX_RATE = Decimal(1.2)
+
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
 
     class Meta:
@@ -62,6 +135,12 @@ class ProductSerializer(serializers.ModelSerializer):
             "order_id",
             "images",
         ]
+        expandable_fields = {"collection": SimpleCollectionSerializer}
+        field_columns = {
+            "price_with_tax": ["unit_price"],
+            "order_id": [],
+            "images": [],
+        }
 
     price_with_tax = serializers.SerializerMethodField(method_name="calculate_tax")
     collection = serializers.HyperlinkedRelatedField(
@@ -70,7 +149,7 @@ class ProductSerializer(serializers.ModelSerializer):
     order_id = serializers.IntegerField(read_only=True)
 
     def calculate_tax(self, product: Product):
-        return product.unit_price * Decimal(1.2)
+        return product.unit_price * TAX_RATE
 
 
 #########################################################################################
@@ -120,7 +199,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     'cart.items' returns a Manager Object """
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)  # get Product queryset
 
@@ -134,6 +213,7 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ["id", "items", "total_price"]
+        field_columns = {"items": [], "total_price": []}
 
 
 #########################################################################################
@@ -143,28 +223,26 @@ class CartSerializer(serializers.ModelSerializer):
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError("Product does not exist")
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context["cart_id"]
         product_id = self.validated_data["product_id"]
         quantity = self.validated_data["quantity"]
 
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            # If the cart_item exists -> Update an existing item
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-
-        except CartItem.DoesNotExist:
-            # If cart_item doesn't exist -> Create a new item
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data
-            )
+        # One INSERT ... ON CONFLICT that also validates the product and cart
+        self.instance = CartItem.objects.add_quantity(cart_id, product_id, quantity)
+
+        if self.instance is None:
+            if not Product.objects.filter(pk=product_id).exists():
+                raise serializers.ValidationError(
+                    {"product_id": ["Product does not exist"]}
+                )
+            try:
+                cart_exists = Cart.objects.filter(pk=cart_id).exists()
+            except DjangoValidationError:
+                cart_exists = False
+            if not cart_exists:
+                raise NotFound("No cart with the given ID was found")
+            raise serializers.ValidationError({"quantity": [too_many_message()]})
 
         return self.instance
 
@@ -173,6 +251,129 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product_id", "quantity"]
 
 
+#####################################################################################
+# BATCH OF CART ITEM OPERATIONS
+
+
+class CartItemOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=["add", "set", "remove"])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(
+        min_value=1, max_value=CartItem.MAX_QUANTITY, required=False
+    )
+
+    def validate(self, data):
+        if data["op"] != "remove" and "quantity" not in data:
+            raise serializers.ValidationError(
+                {"quantity": [f"Required for '{data['op']}'"]}
+            )
+        return data
+
+
+class CartItemBatchSerializer(serializers.Serializer):
+    operations = CartItemOperationSerializer(many=True, allow_empty=False)
+
+    def fold_operations(self):
+        """Collapse the ordered operations into one (op, quantity) per product"""
+        changes = {}
+        for operation in self.validated_data["operations"]:
+            product_id, op = operation["product_id"], operation["op"]
+            quantity = operation.get("quantity")
+            previous_op, previous_quantity = changes.get(product_id, (None, None))
+
+            if op == "add" and previous_op == "remove":
+                changes[product_id] = ("set", quantity)
+            elif op == "add" and previous_op in ("add", "set"):
+                changes[product_id] = (previous_op, previous_quantity + quantity)
+            else:
+                changes[product_id] = (op, quantity)
+
+        too_many = sorted(
+            product_id
+            for product_id, (op, quantity) in changes.items()
+            if op != "remove" and quantity > CartItem.MAX_QUANTITY
+        )
+        if too_many:
+            raise serializers.ValidationError(
+                {"operations": [too_many_message(too_many)]}
+            )
+        return changes
+
+    def group_operations(self, find_products):
+        """The folded operations as {"add" / "set" / "remove": {product_id:
+        quantity}}, and find_products(ids) of the products they write.
+
+        find_products returns {product_id: ...} of the existing ones, the
+        rest fail validation. Used by save() and the stored cart batch.
+        """
+        changes = self.fold_operations()
+        grouped = {
+            op: {
+                product_id: quantity
+                for product_id, (change, quantity) in changes.items()
+                if change == op
+            }
+            for op in ["add", "set", "remove"]
+        }
+
+        written = {*grouped["add"], *grouped["set"]}
+        found = find_products(written) if written else {}
+        missing = written - set(found)
+        if missing:
+            raise serializers.ValidationError(
+                {"operations": [f"Products do not exist: {sorted(missing)}"]}
+            )
+        return grouped, found
+
+    def save(self, **kwargs):
+        cart_id = self.context["cart_id"]
+
+        def find_products(product_ids):
+            # What the cart holds of each product, read in the same query
+            return dict(
+                Product.objects.filter(pk__in=product_ids)
+                .annotate(
+                    in_cart=Subquery(
+                        CartItem.objects.filter(
+                            cart_id=cart_id, product_id=OuterRef("pk")
+                        ).values("quantity")
+                    )
+                )
+                .values_list("id", "in_cart")
+            )
+
+        with transaction.atomic():
+            # Touching the cart locks its row, which serializes concurrent
+            # batches on it
+            try:
+                cart_exists = bool(Cart.objects.touch(cart_id))
+            except DjangoValidationError:
+                cart_exists = False
+            if not cart_exists:
+                raise NotFound("No cart with the given ID was found")
+
+            # The cart is locked, so the quantities in it can't grow meanwhile
+            grouped, in_cart = self.group_operations(find_products)
+            too_many = sorted(
+                product_id
+                for product_id, quantity in grouped["add"].items()
+                if quantity + (in_cart[product_id] or 0) > CartItem.MAX_QUANTITY
+            )
+            if too_many:
+                raise serializers.ValidationError(
+                    {"operations": [too_many_message(too_many)]}
+                )
+
+            if grouped["remove"]:
+                CartItem.objects.filter(
+                    cart_id=cart_id, product_id__in=grouped["remove"]
+                ).delete()
+            CartItem.objects.upsert_quantities(cart_id, grouped["add"], increment=True)
+            CartItem.objects.upsert_quantities(cart_id, grouped["set"])
+
+        return Cart.objects.prefetch_related("items__product").get(pk=cart_id)
+
+
 #####################################################################################
 # UPDATE A QUANTITY OF A PRODUCT IN THE CART ITEM
 
@@ -193,7 +394,17 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Customer
-        fields = ["id", "user_id", "phone", "birth_date", "membership"]
+        fields = [
+            "id",
+            "user_id",
+            "phone",
+            "birth_date",
+            "membership",
+            "orders_count",
+            "lifetime_value",
+            "last_order_at",
+        ]
+        read_only_fields = ["orders_count", "lifetime_value", "last_order_at"]
 
 
 #####################################################################################
@@ -206,12 +417,14 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "unit_price", "quantity"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
 
     class Meta:
         model = Order
         fields = ["id", "customer_id", "placed_at", "payment_status", "items"]
+        expandable_fields = {"customer": CustomerSerializer}
+        field_columns = {"customer_id": ["customer"], "items": []}
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -224,35 +437,95 @@ class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError("No card with the given ID was found")
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError("The cart is empty")
+        store = get_cart_store()
+        if not store.materialized:
+            quantities = store.get_quantities(cart_id)
+            if quantities is None:
+                raise serializers.ValidationError("No card with the given ID was found")
+            if not quantities:
+                raise serializers.ValidationError("The cart is empty")
+        # Database carts are checked by save() while their rows are locked
         return cart_id
 
     def save(self, **kwargs):
         with transaction.atomic():
             cart_id = self.validated_data["cart_id"]
-
-            customer = Customer.objects.get(user_id=self.context["user_id"])
-            order = Order.objects.create(customer=customer)
-
-            cart_items = CartItem.objects.select_related("product").filter(
-                cart_id=cart_id
+            # Carts kept outside the database become rows only now
+            get_cart_store().materialize(cart_id)
+
+            # One locked read validates and prices the cart; a concurrent
+            # checkout of the same cart waits here and then finds it gone
+            cart_items = list(
+                CartItem.objects.select_for_update(of=("self",))
+                .filter(cart_id=cart_id)
+                .values("product_id", "quantity", "product__unit_price")
             )
+            if not cart_items:
+                if not Cart.objects.filter(pk=cart_id).exists():
+                    raise serializers.ValidationError(
+                        {"cart_id": ["No card with the given ID was found"]}
+                    )
+                raise serializers.ValidationError({"cart_id": ["The cart is empty"]})
+
+            out_of_stock = Product.objects.reserve_inventory(
+                {item["product_id"]: item["quantity"] for item in cart_items}
+            )
+            if out_of_stock:
+                raise serializers.ValidationError(
+                    {"cart_id": [f"Not enough inventory for products: {out_of_stock}"]}
+                )
 
-            order_items = [
+            customer_id = self.context.get("customer_id")
+            if customer_id is None:
+                customer_id = (
+                    Customer.objects.only("id").get(user_id=self.context["user_id"]).id
+                )
+            order = Order.objects.create(customer_id=customer_id)
+            OrderItem.objects.bulk_create(
                 OrderItem(
                     order=order,
-                    product=item.product,
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity,
+                    product_id=item["product_id"],
+                    unit_price=item["product__unit_price"],
+                    quantity=item["quantity"],
                 )
                 for item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items)
+            )
             Cart.objects.filter(pk=cart_id).delete()
 
-            order_created.send_robust(self.__class__, order=order)
+            # Receivers of order_created run in the outbox relay after commit
+            OutboxEvent.objects.create(
+                topic="order_created",
+                key=f"order:{order.id}",
+                payload={"order_id": order.id},
+            )
+            transaction.on_commit(relay_outbox.delay, robust=True)
 
             return order
+
+
+#####################################################################################
+# SALES REPORTS (read from the rollup tables only)
+
+
+class DailyProductSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyProductSales
+        fields = ["date", "product_id", "quantity", "revenue"]
+
+
+class DailyCollectionSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyCollectionSales
+        fields = ["date", "collection_id", "quantity", "revenue"]
+
+
+class DailyMembershipSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyMembershipSales
+        fields = ["date", "membership", "orders", "quantity", "revenue"]
+
+
+class TopProductSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -1,10 +1,176 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
-from store.models import Customer
+from store.cache import bump_generation
+from store.carts import get_cart_store
+from store.models import (
+    Collection,
+    Customer,
+    Order,
+    Product,
+    ProductImage,
+    Promotion,
+    completed_delta,
+    order_stats_contribution,
+    order_stats_delta,
+)
+from store.rollups import settle_payment_changes
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
     if kwargs["created"]:
         Customer.objects.create(user=kwargs["instance"])
+
+
+# Response cache generations touched by each catalog model.
+# Products feed the collections' products_count, so they bump both.
+CACHE_RESOURCES = {
+    Product: ["products", "collections"],
+    ProductImage: ["products"],
+    Promotion: ["products"],
+    Collection: ["collections"],
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Promotion)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_delete, sender=Collection)
+def invalidate_catalog_cache(sender, **kwargs):
+    resources = CACHE_RESOURCES[sender]
+    transaction.on_commit(lambda: bump_generation(*resources))
+
+
+# Queryset update() / bulk_update() bump in ProductQuerySet
+@receiver(m2m_changed, sender=Product.promotions.through)
+def invalidate_promotions_cache(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(lambda: bump_generation("products"))
+
+
+# Images render inside their product, so its conditional GET validators
+# (see store.conditional) have to move with them
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_image_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Product.objects.filter(pk=instance.product_id).update(last_update=Now())
+
+
+# Collection.products_count bookkeeping for single-row saves and deletes.
+# Bulk writes are handled by ProductQuerySet.
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_collection(sender, instance, raw=False, **kwargs):
+    # Instances that were not loaded from the database (e.g. Product(pk=1))
+    if raw or instance.pk is None or hasattr(instance, "_loaded_collection_id"):
+        return
+    instance._loaded_collection_id = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("collection_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else instance._loaded_collection_id
+    if previous != instance.collection_id:
+        deltas = {instance.collection_id: 1}
+        if previous is not None:
+            deltas[previous] = -1
+        Collection.objects.adjust_products_count(deltas)
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    Collection.objects.adjust_products_count({instance.collection_id: -1})
+
+
+# Customer order stats bookkeeping for single-row saves and deletes.
+# Status bulk updates are handled by OrderQuerySet.
+
+
+@receiver(post_save, sender=Order)
+def count_saved_order(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # Items are added after the order row, so new orders have no total yet
+        Customer.objects.adjust_order_stats(
+            {
+                instance.customer_id: order_stats_contribution(
+                    instance.payment_status, 0
+                )
+            },
+            last_order_at=instance.placed_at,
+        )
+        if instance.payment_status == Order.PAYMENT_STATUS_COMPLETE:
+            # Created complete (e.g. by the admin with inline items): its
+            # value is only known once the items are in
+            customer_id = instance.customer_id
+            transaction.on_commit(lambda: recount_order_stats(customer_id))
+        return
+
+    previous = getattr(instance, "_loaded_payment_status", None)
+    if previous is None or previous == instance.payment_status:
+        return
+    total = 0
+    if Order.PAYMENT_STATUS_COMPLETE in (previous, instance.payment_status):
+        total = (
+            Order.objects.filter(pk=instance.pk)
+            .with_totals()
+            .values_list("total", flat=True)
+            .get()
+        )
+    Customer.objects.adjust_order_stats(
+        {
+            instance.customer_id: order_stats_delta(
+                previous, instance.payment_status, total
+            )
+        }
+    )
+    settle_payment_changes(
+        {instance.pk: completed_delta(previous, instance.payment_status)}
+    )
+
+
+@receiver(post_delete, sender=Order)
+def count_deleted_order(sender, instance, **kwargs):
+    # Items are protected, so they are gone by now and the order's value and
+    # placed_at can't be taken back by a delta: recount from the other orders.
+    recount_order_stats(instance.customer_id)
+
+
+def recount_order_stats(customer_id):
+    # Queryset deletes and on_commit callbacks run outside of Order.delete()
+    # and Order.save(), hence the transaction.
+    with transaction.atomic():
+        customers = Customer.objects.select_for_update().filter(pk=customer_id)
+        for customer_id, stats in customers.recount_order_stats().items():
+            orders_count, lifetime_value, last_order_at = stats
+            Customer.objects.filter(pk=customer_id).update(
+                orders_count=orders_count,
+                lifetime_value=lifetime_value,
+                last_order_at=last_order_at,
+            )
+
+
+# Cart stores that price items from product snapshots
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def forget_cart_product_snapshot(sender, instance, **kwargs):
+    store = get_cart_store()
+    transaction.on_commit(lambda: store.forget_product(instance.pk))
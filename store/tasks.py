@@ -0,0 +1,225 @@
+import logging
+from datetime import timedelta
+from time import perf_counter
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import (
+    Cart,
+    CartItem,
+    Order,
+    OutboxEvent,
+    SalesRollupWatermark,
+)
+from .rollups import merge_order_sales
+from .signals import order_created
+
+logger = logging.getLogger(__name__)
+
+
+##############################################################################
+# ABANDONED CARTS
+
+
+@shared_task
+def reap_abandoned_carts(dry_run=False, batch_size=None):
+    """Delete database carts with no activity for STORE_ABANDONED_CART_TTL.
+
+    Activity is Cart.updated_at, which item writes touch. Carts are walked in
+    (updated_at, id) order, one short transaction per batch, so a pass never
+    holds locks on more than `batch_size` carts.
+    """
+    ttl = getattr(settings, "STORE_ABANDONED_CART_TTL", timedelta(days=7))
+    batch_size = batch_size or getattr(settings, "STORE_CART_REAPER_BATCH_SIZE", 500)
+    cutoff = timezone.now() - ttl
+
+    stats = {"carts": 0, "items": 0, "batches": 0, "dry_run": dry_run}
+    start = perf_counter()
+    after = None
+    while True:
+        batch_start = perf_counter()
+        queryset = Cart.objects.filter(updated_at__lt=cutoff)
+        if after is not None:
+            updated_at, cart_id = after
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=cart_id)
+            )
+
+        with transaction.atomic():
+            queryset = queryset.order_by("updated_at", "id")
+            if not dry_run:
+                # Item writes touch the cart first: one that commits before
+                # the lock drops out of the batch, a later one finds the cart
+                # gone instead of adding an item that is deleted with it
+                queryset = queryset.select_for_update()
+            batch = list(queryset.values_list("updated_at", "id")[:batch_size])
+            if not batch:
+                break
+            cart_ids = [cart_id for _, cart_id in batch]
+            if dry_run:
+                items = CartItem.objects.filter(cart_id__in=cart_ids).count()
+            else:
+                items = CartItem.objects.filter(cart_id__in=cart_ids).delete()[0]
+                Cart.objects.filter(pk__in=cart_ids).delete()
+
+        after = batch[-1]
+        stats["carts"] += len(batch)
+        stats["items"] += items
+        stats["batches"] += 1
+        logger.info(
+            "%s %d abandoned carts (%d items) in %.3fs",
+            "Would delete" if dry_run else "Deleted",
+            len(batch),
+            items,
+            perf_counter() - batch_start,
+        )
+
+    stats["seconds"] = round(perf_counter() - start, 3)
+    logger.info(
+        "Abandoned cart pass%s: %d carts, %d items, %d batches in %.3fs",
+        " (dry run)" if dry_run else "",
+        stats["carts"],
+        stats["items"],
+        stats["batches"],
+        stats["seconds"],
+    )
+    return stats
+
+
+##############################################################################
+# OUTBOX
+
+
+def dispatch_order_created(event):
+    order = Order.objects.get(pk=event.payload["order_id"])
+    for receiver, response in order_created.send_robust(OutboxEvent, order=order):
+        if isinstance(response, Exception):
+            raise response
+
+
+# Handlers subscribe to the signals; the relay maps each topic to its signal
+OUTBOX_DISPATCHERS = {
+    "order_created": dispatch_order_created,
+}
+
+
+@shared_task
+def relay_outbox(batch_size=None):
+    """Deliver pending outbox events to their handlers.
+
+    Delivery is at least once: an event is marked processed only after its
+    handlers ran, so handlers must tolerate duplicates. Failed events are
+    retried with exponential backoff, and later events with the same key wait
+    until the earlier one went through (or gave up after max attempts).
+    """
+    batch_size = batch_size or getattr(settings, "STORE_OUTBOX_BATCH_SIZE", 100)
+    max_attempts = getattr(settings, "STORE_OUTBOX_MAX_ATTEMPTS", 10)
+    stats = {"delivered": 0, "failed": 0}
+
+    while True:
+        with transaction.atomic():
+            pending = OutboxEvent.objects.filter(
+                processed_at__isnull=True, attempts__lt=max_attempts
+            )
+            earlier = pending.filter(key=OuterRef("key"), id__lt=OuterRef("id"))
+            # skip_locked lets several relays drain the table side by side
+            events = list(
+                pending.filter(available_at__lte=timezone.now())
+                .exclude(Exists(earlier))
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:batch_size]
+            )
+
+            failed_keys = set()
+            for event in events:
+                if event.key in failed_keys:
+                    continue
+                try:
+                    with transaction.atomic():
+                        OUTBOX_DISPATCHERS[event.topic](event)
+                except Exception as error:
+                    logger.exception("Outbox event %s failed", event.pk)
+                    failed_keys.add(event.key)
+                    event.attempts += 1
+                    event.last_error = repr(error)
+                    event.available_at = timezone.now() + timedelta(
+                        seconds=min(2**event.attempts, 60 * 60)
+                    )
+                    event.save(update_fields=["attempts", "last_error", "available_at"])
+                    stats["failed"] += 1
+                else:
+                    event.processed_at = timezone.now()
+                    event.save(update_fields=["processed_at"])
+                    stats["delivered"] += 1
+
+        if len(events) < batch_size:
+            break
+
+    if stats["delivered"] or stats["failed"]:
+        logger.info(
+            "Outbox relay: %d delivered, %d failed",
+            stats["delivered"],
+            stats["failed"],
+        )
+    return stats
+
+
+##############################################################################
+# SALES ROLLUPS
+
+
+@shared_task
+def rollup_sales(batch_size=None):
+    """Fold orders placed since the high-water mark into the daily rollups.
+
+    Orders are taken in (placed_at, id) order and the completed ones in each
+    batch are merged in the same transaction that moves the mark, so every
+    order is counted exactly once; later status changes are settled by
+    store.rollups.settle_payment_changes. Orders younger than STORE_SALES_ROLLUP_GRACE are left for
+    the next run: their checkout may still be committing items.
+    """
+    batch_size = batch_size or getattr(settings, "STORE_SALES_ROLLUP_BATCH_SIZE", 1000)
+    grace = getattr(settings, "STORE_SALES_ROLLUP_GRACE", timedelta(minutes=5))
+    horizon = timezone.now() - grace
+    stats = {"orders": 0, "batches": 0}
+
+    while True:
+        with transaction.atomic():
+            watermarks = SalesRollupWatermark.objects.select_for_update()
+            watermark, _ = watermarks.get_or_create(name="sales")
+            orders = Order.objects.filter(placed_at__lte=horizon)
+            if watermark.placed_at is not None:
+                orders = orders.filter(
+                    Q(placed_at__gt=watermark.placed_at)
+                    | Q(placed_at=watermark.placed_at, id__gt=watermark.order_id)
+                )
+            orders = orders.order_by("placed_at", "id")
+            batch = list(
+                orders.values_list("placed_at", "id", "payment_status")[:batch_size]
+            )
+            if not batch:
+                break
+
+            merge_order_sales(
+                [
+                    order_id
+                    for _, order_id, payment_status in batch
+                    if payment_status == Order.PAYMENT_STATUS_COMPLETE
+                ]
+            )
+
+            watermark.placed_at, watermark.order_id, _ = batch[-1]
+            watermark.save()
+
+        stats["orders"] += len(batch)
+        stats["batches"] += 1
+        if len(batch) < batch_size:
+            break
+
+    if stats["orders"]:
+        logger.info(
+            "Sales rollup: %d orders in %d batches", stats["orders"], stats["batches"]
+        )
+    return stats
@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from rest_framework.test import APIClient
 import pytest
 
@@ -8,6 +9,12 @@ def api_client():
     return APIClient()
 
 
+# Cached responses must not leak between tests that reuse the same ids
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
 # Define a global fixture for authenticating users
 @pytest.fixture
 def authenticate_user(api_client):
@@ -15,3 +22,16 @@ def authenticate_user(api_client):
         return api_client.force_authenticate(user=User(is_staff=is_staff))
 
     return do_authenticate_user
+
+
+# Fail an endpoint that needs more than `budget` queries. Seed more rows than
+# a page holds so N+1 queries show up as a blown budget.
+@pytest.fixture
+def query_budget(api_client, django_assert_max_num_queries):
+    def do_query_budget(url, budget):
+        with django_assert_max_num_queries(budget):
+            response = api_client.get(url)
+        assert response.status_code == 200, response.data
+        return response
+
+    return do_query_budget
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+import pytest
+from store.models import Customer, Order
+from model_bakery import baker
+
+
+@pytest.fixture
+def user():
+    return get_user_model().objects.create_user(
+        username="buyer", email="buyer@dev.com", password="secret-password"
+    )
+
+
+@pytest.fixture
+def tokens(api_client, user):
+    response = api_client.post(
+        "/auth/jwt/create/", {"username": "buyer", "password": "secret-password"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.data
+
+
+@pytest.mark.django_db
+class TestClaimsJWT:
+    def test_access_token_carries_customer_claims(self, user, tokens):
+        claims = AccessToken(tokens["access"])
+
+        assert claims["customer_id"] == user.customer.id
+        assert claims["is_staff"] is False
+        assert claims["membership"] == Customer.MEMBERSHIP_BRONZE
+
+    def test_requests_do_not_load_the_user(self, api_client, user, tokens):
+        baker.make(Order, customer=user.customer, _quantity=2)
+        api_client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+
+        tables = [get_user_model()._meta.db_table, Customer._meta.db_table]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/store/orders/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 2
+        assert not any(
+            connection.ops.quote_name(table) in query["sql"]
+            for table in tables
+            for query in queries.captured_queries
+        )
+
+    def test_other_attributes_load_the_user_lazily(self, api_client, tokens):
+        api_client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+
+        response = api_client.get("/auth/users/me/")
+
+        assert response.data["username"] == "buyer"
+
+    def test_refresh_re_reads_the_claims(self, api_client, user, tokens):
+        user.is_staff = True
+        user.save()
+
+        response = api_client.post("/auth/jwt/refresh/", {"refresh": tokens["refresh"]})
+
+        assert AccessToken(response.data["access"])["is_staff"] is True
+
+    def test_refresh_is_refused_for_inactive_users(self, api_client, user, tokens):
+        user.is_active = False
+        user.save()
+
+        response = api_client.post("/auth/jwt/refresh/", {"refresh": tokens["refresh"]})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
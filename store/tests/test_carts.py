@@ -0,0 +1,398 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+import pytest
+from store.models import Cart, CartItem, Product
+from store.tasks import reap_abandoned_carts
+from model_bakery import baker
+
+
+@pytest.fixture
+def add_item(api_client):
+    def do_add_item(cart_id, product_id, quantity=1):
+        return api_client.post(
+            f"/store/carts/{cart_id}/items/",
+            {"product_id": product_id, "quantity": quantity},
+        )
+
+    return do_add_item
+
+
+@pytest.mark.django_db
+class TestAddCartItem:
+    def test_new_product_creates_an_item(self, add_item):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        response = add_item(cart.id, product.id, 2)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["product_id"] == product.id
+        assert response.data["quantity"] == 2
+
+    def test_same_product_increments_the_quantity(self, add_item):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        first = add_item(cart.id, product.id, 2)
+        second = add_item(cart.id, product.id, 3)
+
+        assert second.data["id"] == first.data["id"]
+        assert second.data["quantity"] == 5
+        assert CartItem.objects.get(cart=cart).quantity == 5
+
+    def test_missing_product_returns_400(self, add_item):
+        cart = baker.make(Cart)
+
+        response = add_item(cart.id, 999)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["product_id"] is not None
+
+    def test_missing_cart_returns_404(self, add_item):
+        product = baker.make(Product, inventory=10)
+
+        response = add_item("6a534217da3c4982b008bf23768e8da3", product.id)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_quantity_past_the_column_range_returns_400(self, add_item):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+        baker.make(CartItem, cart=cart, product=product, quantity=32000)
+
+        response = add_item(cart.id, product.id, 1000)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert CartItem.objects.get(cart=cart).quantity == 32000
+
+    def test_add_touches_the_cart_and_upserts_in_one_statement(
+        self, add_item, django_assert_num_queries
+    ):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        with django_assert_num_queries(2):
+            add_item(cart.id, product.id)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_adds_to_one_cart_are_all_counted():
+    # Shared-cache in-memory SQLite fails concurrent writers with "table is
+    # locked" instead of waiting; a file database or a server DB is needed.
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        pytest.skip("needs a test database that lets concurrent writers wait")
+
+    cart = baker.make(Cart)
+    product = baker.make(Product, inventory=10)
+    threads, adds_per_thread = 8, 25
+
+    def hammer():
+        client = APIClient()
+        try:
+            for _ in range(adds_per_thread):
+                response = client.post(
+                    f"/store/carts/{cart.id}/items/",
+                    {"product_id": product.id, "quantity": 1},
+                )
+                assert response.status_code == status.HTTP_201_CREATED
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(hammer) for _ in range(threads)]:
+            future.result()
+
+    item = CartItem.objects.get(cart=cart)
+    assert item.quantity == threads * adds_per_thread
+
+
+@pytest.mark.django_db
+class TestCartItemBatch:
+    def post_batch(self, api_client, cart_id, operations):
+        return api_client.post(
+            f"/store/carts/{cart_id}/items/batch/",
+            {"operations": operations},
+            format="json",
+        )
+
+    def test_operations_are_applied_in_order(self, api_client):
+        cart = baker.make(Cart)
+        kept, replaced, removed, new = baker.make(Product, inventory=10, _quantity=4)
+        baker.make(CartItem, cart=cart, product=kept, quantity=1)
+        baker.make(CartItem, cart=cart, product=replaced, quantity=5)
+        baker.make(CartItem, cart=cart, product=removed, quantity=1)
+
+        response = self.post_batch(
+            api_client,
+            cart.id,
+            [
+                {"op": "add", "product_id": kept.id, "quantity": 2},
+                {"op": "set", "product_id": replaced.id, "quantity": 1},
+                {"op": "remove", "product_id": removed.id},
+                {"op": "add", "product_id": new.id, "quantity": 1},
+                {"op": "add", "product_id": new.id, "quantity": 2},
+            ],
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        quantities = {
+            item["product"]["id"]: item["quantity"] for item in response.data["items"]
+        }
+        assert quantities == {kept.id: 3, replaced.id: 1, new.id: 3}
+
+    def test_query_count_does_not_grow_with_the_batch(
+        self, api_client, django_assert_max_num_queries
+    ):
+        cart = baker.make(Cart)
+        products = baker.make(Product, inventory=10, _quantity=20)
+        operations = [
+            {"op": "add", "product_id": product.id, "quantity": 1}
+            for product in products
+        ]
+
+        with django_assert_max_num_queries(8):
+            self.post_batch(api_client, cart.id, operations)
+
+    def test_unknown_product_rolls_back_the_batch(self, api_client):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        response = self.post_batch(
+            api_client,
+            cart.id,
+            [
+                {"op": "add", "product_id": product.id, "quantity": 1},
+                {"op": "add", "product_id": 999, "quantity": 1},
+            ],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+    def test_folded_quantities_past_the_column_range_return_400(self, api_client):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        response = self.post_batch(
+            api_client,
+            cart.id,
+            [{"op": "add", "product_id": product.id, "quantity": 20000}] * 2,
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+    def test_adds_past_the_column_range_return_400(self, api_client):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+        baker.make(CartItem, cart=cart, product=product, quantity=32000)
+
+        response = self.post_batch(
+            api_client,
+            cart.id,
+            [{"op": "add", "product_id": product.id, "quantity": 1000}],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert CartItem.objects.get(cart=cart).quantity == 32000
+
+    def test_missing_cart_returns_404(self, api_client):
+        response = self.post_batch(
+            api_client, "not-a-cart", [{"op": "remove", "product_id": 1}]
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture
+def redis_carts(settings, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr("django_redis.get_redis_connection", lambda alias: client)
+    settings.STORE_CART_BACKEND = "store.carts.RedisCartStore"
+    return client
+
+
+@pytest.mark.django_db
+class TestRedisCartStore:
+    def create_cart(self, api_client):
+        response = api_client.post("/store/carts/")
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data["id"]
+
+    def test_carts_and_items_are_not_written_to_the_database(
+        self, api_client, add_item, redis_carts
+    ):
+        product = baker.make(Product, inventory=10)
+
+        cart_id = self.create_cart(api_client)
+        add_item(cart_id, product.id, 2)
+        add_item(cart_id, product.id, 3)
+        response = api_client.get(f"/store/carts/{cart_id}/")
+
+        assert not Cart.objects.exists()
+        assert not CartItem.objects.exists()
+        (item,) = response.data["items"]
+        assert item["quantity"] == 5
+        assert response.data["total_price"] == 5 * product.unit_price
+
+    def test_cart_has_a_ttl(self, api_client, redis_carts):
+        cart_id = self.create_cart(api_client)
+
+        assert redis_carts.ttl(f"store:cart:{cart_id.replace('-', '')}") > 0
+
+    def test_missing_product_and_cart(self, api_client, add_item, redis_carts):
+        cart_id = self.create_cart(api_client)
+        product = baker.make(Product, inventory=10)
+
+        assert add_item(cart_id, 999).status_code == status.HTTP_400_BAD_REQUEST
+        assert (
+            add_item("6a534217da3c4982b008bf23768e8da3", product.id).status_code
+            == status.HTTP_404_NOT_FOUND
+        )
+
+    def test_update_and_remove_items(self, api_client, add_item, redis_carts):
+        cart_id = self.create_cart(api_client)
+        kept, removed = baker.make(Product, inventory=10, _quantity=2)
+        add_item(cart_id, kept.id)
+        add_item(cart_id, removed.id)
+
+        api_client.patch(f"/store/carts/{cart_id}/items/{kept.id}/", {"quantity": 4})
+        api_client.delete(f"/store/carts/{cart_id}/items/{removed.id}/")
+        response = api_client.get(f"/store/carts/{cart_id}/items/")
+
+        assert [(item["id"], item["quantity"]) for item in response.data] == [
+            (kept.id, 4)
+        ]
+
+    def test_batch_checks_the_products_like_the_database_store(
+        self, api_client, add_item, redis_carts
+    ):
+        cart_id = self.create_cart(api_client)
+        product = baker.make(Product, inventory=10)
+        url = f"/store/carts/{cart_id}/items/batch/"
+
+        applied = api_client.post(
+            url,
+            {"operations": [{"op": "add", "product_id": product.id, "quantity": 2}]},
+            format="json",
+        )
+        rejected = api_client.post(
+            url,
+            {"operations": [{"op": "add", "product_id": 999, "quantity": 1}]},
+            format="json",
+        )
+
+        assert [item["quantity"] for item in applied.data["items"]] == [2]
+        assert rejected.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_adds_past_the_column_range_return_400(
+        self, api_client, add_item, redis_carts
+    ):
+        cart_id = self.create_cart(api_client)
+        product = baker.make(Product, inventory=10)
+        add_item(cart_id, product.id, 20000)
+
+        response = add_item(cart_id, product.id, 20000)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        (item,) = api_client.get(f"/store/carts/{cart_id}/").data["items"]
+        assert item["quantity"] == 20000
+
+    def test_batch_adds_past_the_column_range_return_400(
+        self, api_client, add_item, redis_carts
+    ):
+        cart_id = self.create_cart(api_client)
+        product = baker.make(Product, inventory=10)
+        other = baker.make(Product, inventory=10)
+        add_item(cart_id, product.id, 20000)
+
+        response = api_client.post(
+            f"/store/carts/{cart_id}/items/batch/",
+            {
+                "operations": [
+                    {"op": "add", "product_id": other.id, "quantity": 1},
+                    {"op": "add", "product_id": product.id, "quantity": 20000},
+                ]
+            },
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert str(product.id) in response.data["operations"][0]
+        items = api_client.get(f"/store/carts/{cart_id}/").data["items"]
+        assert [(item["product"]["id"], item["quantity"]) for item in items] == [
+            (product.id, 20000)
+        ]
+
+    def test_checkout_materializes_the_cart(
+        self, api_client, add_item, redis_carts, django_capture_on_commit_callbacks
+    ):
+        product = baker.make(Product, inventory=10)
+        cart_id = self.create_cart(api_client)
+        add_item(cart_id, product.id, 2)
+        user = baker.make(settings.AUTH_USER_MODEL)
+        api_client.force_authenticate(user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post("/store/orders/", {"cart_id": cart_id})
+
+        assert response.status_code == status.HTTP_200_OK
+        (item,) = response.data["items"]
+        assert item["quantity"] == 2
+        assert not Cart.objects.exists()
+        assert api_client.get(f"/store/carts/{cart_id}/").status_code == (
+            status.HTTP_404_NOT_FOUND
+        )
+
+
+@pytest.mark.django_db
+class TestReapAbandonedCarts:
+    @pytest.fixture
+    def carts(self):
+        fresh, *stale = baker.make(Cart, _quantity=5)
+        for cart in [fresh, *stale]:
+            baker.make(CartItem, cart=cart, product=baker.make(Product), quantity=1)
+        Cart.objects.filter(pk__in=[cart.pk for cart in stale]).update(
+            updated_at=timezone.now() - timedelta(days=30)
+        )
+        return fresh, stale
+
+    def test_deletes_stale_carts_in_batches(self, carts):
+        fresh, stale = carts
+
+        stats = reap_abandoned_carts(batch_size=3)
+
+        assert list(Cart.objects.all()) == [fresh]
+        assert CartItem.objects.count() == 1
+        assert (stats["carts"], stats["items"], stats["batches"]) == (4, 4, 2)
+
+    def test_dry_run_deletes_nothing(self, carts):
+        stats = reap_abandoned_carts(dry_run=True, batch_size=3)
+
+        assert Cart.objects.count() == 5
+        assert (stats["carts"], stats["items"]) == (4, 4)
+
+    def test_item_writes_keep_an_old_cart(self, api_client, add_item, carts):
+        _, (added, updated, removed, _) = carts
+        Cart.objects.update(created_at=timezone.now() - timedelta(days=30))
+        product = baker.make(Product, inventory=10)
+        updated_item, removed_item = (
+            CartItem.objects.get(cart=updated),
+            CartItem.objects.get(cart=removed),
+        )
+
+        add_item(added.id, product.id)
+        api_client.patch(
+            f"/store/carts/{updated.id}/items/{updated_item.id}/", {"quantity": 2}
+        )
+        api_client.delete(f"/store/carts/{removed.id}/items/{removed_item.id}/")
+        stats = reap_abandoned_carts()
+
+        assert stats["carts"] == 1
+        assert Cart.objects.count() == 4
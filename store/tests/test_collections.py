@@ -1,6 +1,9 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
 from rest_framework import status
 import pytest
-from store.models import Collection
+from store.models import Collection, Product
 from model_bakery import baker
 
 # AAA (Arrange, Act, Assert)
@@ -61,3 +64,111 @@ class TestRetrieveCollection:
             "title": collection.title,
             "products_count": 0,
         }
+
+    def test_if_collection_is_unchanged_returns_304(self, api_client):
+        collection = baker.make(Collection)
+        url = f"/store/collections/{collection.id}/"
+        etag = api_client.get(url)["ETag"]
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_if_products_count_changed_returns_200(
+        self, api_client, django_capture_on_commit_callbacks
+    ):
+        collection = baker.make(Collection)
+        url = f"/store/collections/{collection.id}/"
+        etag = api_client.get(url)["ETag"]
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(Product, collection=collection)
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["products_count"] == 1
+
+
+@pytest.mark.django_db
+class TestProductsCount:
+    def products_count(self, collection):
+        collection.refresh_from_db()
+        return collection.products_count
+
+    def test_count_follows_product_saves_and_deletes(self):
+        first, second = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=first)
+        assert self.products_count(first) == 1
+
+        product.collection = second
+        product.save()
+        assert self.products_count(first) == 0
+        assert self.products_count(second) == 1
+
+        product.delete()
+        assert self.products_count(second) == 0
+
+    def test_count_follows_saves_of_deferred_products(self):
+        first, second = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=first)
+
+        product = Product.objects.only("title").get(pk=product.pk)
+        product.title = "Renamed"
+        product.save()
+        assert self.products_count(first) == 1
+
+        product = Product.objects.only("title").get(pk=product.pk)
+        product.collection = second
+        product.save()
+        assert self.products_count(first) == 0
+        assert self.products_count(second) == 1
+
+    def test_count_follows_bulk_writes(self):
+        first, second = baker.make(Collection, _quantity=2)
+        Product.objects.bulk_create(
+            baker.prepare(Product, collection=first, inventory=1, _quantity=3)
+        )
+        assert self.products_count(first) == 3
+
+        Product.objects.filter(
+            pk__in=Product.objects.filter(collection=first).values("pk")[:2]
+        ).update(collection=second)
+        assert self.products_count(first) == 1
+        assert self.products_count(second) == 2
+
+        Product.objects.all().delete()
+        assert self.products_count(first) == self.products_count(second) == 0
+
+    def test_reconcile_command_fixes_drift(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.update(products_count=7)
+
+        call_command("reconcile_products_count", stdout=StringIO())
+
+        assert self.products_count(collection) == 2
+
+    def test_reconcile_command_locks_without_grouping(self, monkeypatch):
+        # SQLite ignores FOR UPDATE: have it rendered, and record and drop it
+        monkeypatch.setattr(connection.features, "has_select_for_update", True)
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql.replace(" FOR UPDATE", ""), params, many, context)
+
+        baker.make(Product, collection=baker.make(Collection))
+        with connection.execute_wrapper(record):
+            call_command("reconcile_products_count", stdout=StringIO())
+
+        locking = [sql for sql in statements if "FOR UPDATE" in sql]
+        assert locking
+        assert not [sql for sql in locking if "GROUP BY" in sql or "JOIN" in sql]
+
+    def test_api_reads_the_stored_count(self, api_client):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+
+        response = api_client.get(f"/store/collections/{collection.id}/")
+
+        assert response.data["products_count"] == 2
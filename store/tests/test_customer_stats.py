@@ -0,0 +1,110 @@
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+import pytest
+from store.models import Customer, Order, OrderItem
+from model_bakery import baker
+
+
+@pytest.fixture
+def customer():
+    return baker.make(settings.AUTH_USER_MODEL).customer
+
+
+def place_order(customer, *prices):
+    order = Order.objects.create(customer=customer)
+    for price in prices:
+        baker.make(OrderItem, order=order, quantity=2, unit_price=Decimal(price))
+    return order
+
+
+def stats(customer):
+    customer = Customer.objects.get(pk=customer.pk)
+    return customer.orders_count, customer.lifetime_value, customer.last_order_at
+
+
+@pytest.mark.django_db
+class TestCustomerOrderStats:
+    def test_new_orders_are_counted(self, customer):
+        place_order(customer, "5.00")
+        order = place_order(customer, "1.50")
+
+        assert stats(customer) == (2, 0, order.placed_at)
+
+    def test_completed_orders_add_to_the_lifetime_value(self, customer):
+        order = place_order(customer, "5.00", "1.25")
+
+        order.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        order.save()
+        assert stats(customer)[:2] == (1, Decimal("12.50"))
+
+        order.payment_status = Order.PAYMENT_STATUS_FAILED
+        order.save()
+        assert stats(customer)[:2] == (0, 0)
+
+    def test_orders_created_complete_count_their_items_on_commit(
+        self, customer, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                order = Order.objects.create(
+                    customer=customer, payment_status=Order.PAYMENT_STATUS_COMPLETE
+                )
+                baker.make(
+                    OrderItem, order=order, quantity=2, unit_price=Decimal("5.00")
+                )
+
+        assert stats(customer) == (1, Decimal("10.00"), order.placed_at)
+
+    def test_bulk_status_updates(self, customer):
+        other = baker.make(settings.AUTH_USER_MODEL).customer
+        place_order(customer, "5.00")
+        place_order(customer, "2.00")
+        place_order(other, "1.00")
+
+        Order.objects.update(payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        assert stats(customer)[:2] == (2, Decimal("14.00"))
+        assert stats(other)[:2] == (1, Decimal("2.00"))
+
+        Order.objects.filter(customer=other).update(
+            payment_status=Order.PAYMENT_STATUS_FAILED
+        )
+        assert stats(other)[:2] == (0, 0)
+        assert stats(customer)[:2] == (2, Decimal("14.00"))
+
+    def test_deleted_orders_are_recounted(self, customer):
+        first = place_order(customer, "5.00")
+        last = place_order(customer, "1.50")
+        Order.objects.update(payment_status=Order.PAYMENT_STATUS_COMPLETE)
+
+        last.items.all().delete()
+        last.delete()
+
+        assert stats(customer) == (1, Decimal("10.00"), first.placed_at)
+
+    def test_backfill_fixes_drift(self, customer):
+        order = place_order(customer, "5.00")
+        Order.objects.filter(pk=order.pk).update(
+            payment_status=Order.PAYMENT_STATUS_COMPLETE
+        )
+        Customer.objects.filter(pk=customer.pk).update(
+            orders_count=7, lifetime_value=0, last_order_at=None
+        )
+
+        call_command("backfill_customer_stats", chunk_size=1, stdout=StringIO())
+
+        assert stats(customer) == (1, Decimal("10.00"), order.placed_at)
+
+    def test_exposed_read_only_in_the_api(self, api_client, customer):
+        place_order(customer, "5.00")
+        api_client.force_authenticate(user=customer.user)
+
+        response = api_client.put(
+            "/store/customers/me/",
+            {"phone": "123", "orders_count": 100, "lifetime_value": "9.99"},
+        )
+
+        assert response.data["orders_count"] == 1
+        assert response.data["lifetime_value"] == 0
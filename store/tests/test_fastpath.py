@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.test import override_settings
+import pytest
+from store.models import Cart, CartItem, Order, OrderItem, Product, ProductImage
+from model_bakery import baker
+
+
+def fetch_both(api_client, url):
+    with override_settings(STORE_FAST_SERIALIZATION=False):
+        regular = api_client.get(url)
+    with override_settings(STORE_FAST_SERIALIZATION=True):
+        fast = api_client.get(url)
+    return regular, fast
+
+
+@pytest.fixture
+def catalog():
+    products = baker.make(Product, inventory=10, _quantity=4)
+    products[0].description = None
+    products[0].save()
+    baker.make(ProductImage, product=products[1], image="store/images/a.jpg")
+    baker.make(ProductImage, product=products[1], image="store/images/b.jpg")
+    return products
+
+
+@pytest.mark.django_db
+class TestFastPathOutputIsIdentical:
+    @pytest.mark.parametrize(
+        "query",
+        ["", "?ordering=-unit_price", "?fields=id,title,unit_price", "?omit=images"],
+    )
+    def test_product_list(self, api_client, authenticate_user, catalog, query):
+        authenticate_user()
+
+        regular, fast = fetch_both(api_client, f"/store/products/{query}")
+
+        assert regular.status_code == 200
+        assert fast.content == regular.content
+
+    def test_product_detail(self, api_client, authenticate_user, catalog):
+        authenticate_user()
+
+        regular, fast = fetch_both(api_client, f"/store/products/{catalog[1].id}/")
+
+        assert fast.content == regular.content
+
+    def test_order_list(self, api_client, authenticate_user, catalog):
+        authenticate_user(is_staff=True)
+        customer = baker.make(settings.AUTH_USER_MODEL).customer
+        for order in baker.make(Order, customer=customer, _quantity=3):
+            for product in catalog[:2]:
+                baker.make(
+                    OrderItem,
+                    order=order,
+                    product=product,
+                    unit_price=product.unit_price,
+                )
+
+        regular, fast = fetch_both(api_client, "/store/orders/")
+
+        assert regular.status_code == 200
+        assert fast.content == regular.content
+
+    def test_cart_detail(self, api_client, catalog):
+        cart = baker.make(Cart)
+        for product in catalog[:3]:
+            baker.make(CartItem, cart=cart, product=product, quantity=2)
+        empty_cart = baker.make(Cart)
+
+        for url in [f"/store/carts/{cart.id}/", f"/store/carts/{empty_cart.id}/"]:
+            regular, fast = fetch_both(api_client, url)
+
+            assert regular.status_code == 200
+            assert fast.content == regular.content
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "/store/products/999/",
+            "/store/products/not-a-number/",
+            "/store/carts/6a534217da3c4982b008bf23768e8da3/",
+            "/store/carts/not-a-uuid/",
+        ],
+    )
+    def test_missing_object_returns_404(self, api_client, url):
+        regular, fast = fetch_both(api_client, url)
+
+        assert fast.status_code == regular.status_code == 404
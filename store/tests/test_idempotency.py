@@ -0,0 +1,83 @@
+from django.conf import settings
+from rest_framework import status
+import pytest
+from store.models import Cart, CartItem, Order, Product
+from model_bakery import baker
+
+
+@pytest.mark.django_db
+class TestIdempotencyKey:
+    def add_item(self, api_client, cart_id, product_id, key, quantity=1):
+        return api_client.post(
+            f"/store/carts/{cart_id}/items/",
+            {"product_id": product_id, "quantity": quantity},
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retried_add_is_applied_once(self, api_client, django_assert_num_queries):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        first = self.add_item(api_client, cart.id, product.id, "retry-1", 2)
+        with django_assert_num_queries(0):
+            retry = self.add_item(api_client, cart.id, product.id, "retry-1", 2)
+
+        assert retry.status_code == first.status_code == status.HTTP_201_CREATED
+        assert retry.data == first.data
+        assert retry["Idempotent-Replayed"] == "true"
+        assert CartItem.objects.get(cart=cart).quantity == 2
+
+    def test_new_key_is_a_new_request(self, api_client):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        self.add_item(api_client, cart.id, product.id, "first")
+        self.add_item(api_client, cart.id, product.id, "second")
+
+        assert CartItem.objects.get(cart=cart).quantity == 2
+
+    def test_key_reused_for_another_request_returns_422(self, api_client):
+        cart = baker.make(Cart)
+        product = baker.make(Product, inventory=10)
+
+        self.add_item(api_client, cart.id, product.id, "reused", 1)
+        response = self.add_item(api_client, cart.id, product.id, "reused", 5)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_anonymous_keys_are_scoped_to_the_cart(self, api_client):
+        first_cart, second_cart = baker.make(Cart, _quantity=2)
+        product = baker.make(Product, inventory=10)
+
+        self.add_item(api_client, first_cart.id, product.id, "shared")
+        response = self.add_item(api_client, second_cart.id, product.id, "shared")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "Idempotent-Replayed" not in response
+        assert CartItem.objects.filter(product=product).count() == 2
+
+    def test_anonymous_requests_without_a_cart_are_not_replayed(self, api_client):
+        responses = [
+            api_client.post("/store/carts/", HTTP_IDEMPOTENCY_KEY="new-cart")
+            for _ in range(2)
+        ]
+
+        assert responses[0].data["id"] != responses[1].data["id"]
+        assert Cart.objects.count() == 2
+
+    def test_retried_checkout_places_one_order(self, api_client):
+        product = baker.make(Product, inventory=10)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=1)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        responses = [
+            api_client.post(
+                "/store/orders/", {"cart_id": cart.id}, HTTP_IDEMPOTENCY_KEY="order-1"
+            )
+            for _ in range(2)
+        ]
+
+        assert [response.status_code for response in responses] == [200, 200]
+        assert responses[0].data == responses[1].data
+        assert Order.objects.count() == 1
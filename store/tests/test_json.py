@@ -0,0 +1,103 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+from uuid import uuid4
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+import pytest
+from core.middleware import CompressionMiddleware, accepted_encodings
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from store.models import Product
+from model_bakery import baker
+
+
+class TestORJSON:
+    def test_renders_like_drf(self):
+        data = {
+            "id": uuid4(),
+            "price": Decimal("9.99"),
+            "placed_at": datetime(2024, 5, 1, 12, 30, 5, 1234, tzinfo=timezone.utc),
+            "items": [{"title": "Café  "}],
+            1: None,
+        }
+
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_indented_output_falls_back_to_drf(self):
+        data = {"a": [1, 2]}
+
+        assert ORJSONRenderer().render(
+            data, "application/json; indent=2"
+        ) == JSONRenderer().render(data, "application/json; indent=2")
+
+    def test_parses_json(self):
+        parser = ORJSONParser()
+
+        assert parser.parse(BytesIO(b'{"quantity": 2}')) == {"quantity": 2}
+        with pytest.raises(ParseError):
+            parser.parse(BytesIO(b'{"quantity": '))
+
+
+def test_accept_encoding_negotiation():
+    class Request:
+        headers = {"Accept-Encoding": "gzip;q=0.5, br, identity;q=0, deflate"}
+
+    assert accepted_encodings(Request) == ["br", "deflate", "gzip"]
+
+
+@pytest.mark.django_db
+class TestCompression:
+    @pytest.fixture
+    def products(self):
+        return baker.make(Product, description="x" * 200, _quantity=10)
+
+    def test_large_json_responses_are_gzipped(self, api_client, products):
+        plain = api_client.get("/store/products/")
+        response = api_client.get("/store/products/", HTTP_ACCEPT_ENCODING="gzip")
+
+        assert "Content-Encoding" not in plain
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+        assert json.loads(gzip.decompress(response.content)) == plain.json()
+
+    def test_compressed_bodies_are_cached_by_content(
+        self, api_client, products, monkeypatch
+    ):
+        calls = []
+        monkeypatch.setattr(
+            "core.middleware.compress",
+            lambda body, encoding: calls.append(encoding) or gzip.compress(body),
+        )
+
+        first = api_client.get("/store/products/", HTTP_ACCEPT_ENCODING="gzip")
+        second = api_client.get("/store/products/", HTTP_ACCEPT_ENCODING="gzip")
+
+        assert first["ETag"].startswith("W/")
+        assert second.content == first.content
+        assert calls == ["gzip"]
+
+    def test_changed_bodies_under_the_same_etag_are_compressed_again(self, rf):
+        bodies = iter([json.dumps({"name": letter * 2000}) for letter in "xy"])
+
+        def get_response(request):
+            response = HttpResponse(next(bodies), content_type="application/json")
+            response["ETag"] = '"same"'
+            return response
+
+        middleware = CompressionMiddleware(get_response)
+        first, second = [
+            middleware(rf.get("/store/products/", HTTP_ACCEPT_ENCODING="gzip"))
+            for _ in range(2)
+        ]
+
+        assert gzip.decompress(first.content).count(b"x") == 2000
+        assert gzip.decompress(second.content).count(b"y") == 2000
+
+    def test_small_responses_are_sent_as_is(self, api_client):
+        response = api_client.get("/store/collections/", HTTP_ACCEPT_ENCODING="gzip")
+
+        assert "Content-Encoding" not in response
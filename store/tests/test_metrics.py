@@ -0,0 +1,83 @@
+import json
+import os
+import pytest
+from core.metrics import registry
+from store.models import Product
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    registry.reset()
+    yield tmp_path
+    registry.reset()
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_requests_are_measured_per_view_action(self, api_client):
+        baker.make(Product, _quantity=2)
+        api_client.get("/store/products/")
+        api_client.get("/store/products/")
+
+        text = api_client.get("/metrics").content.decode()
+
+        assert (
+            'storefront_requests_total{method="GET",status="200",view="products-list"} 2'
+            in text
+        )
+        assert (
+            'storefront_request_duration_seconds_count{view="products-list"} 2' in text
+        )
+        assert 'storefront_db_queries_bucket{view="products-list",le="+Inf"} 2' in text
+        assert (
+            'storefront_serializer_duration_seconds_count{view="products-list"} 1'
+            in text
+        )
+        assert (
+            'storefront_cache_requests_total{cache="response",result="hit",view="products-list"} 1'
+            in text
+        )
+        assert "# TYPE storefront_request_duration_seconds histogram" in text
+
+    def test_processes_are_added_up(self, api_client, metrics_dir):
+        api_client.get("/store/collections/")
+        # Another worker's totals
+        key = [
+            "storefront_requests_total",
+            [["method", "GET"], ["status", 200], ["view", "collection-list"]],
+        ]
+        (metrics_dir / "other.json").write_text(json.dumps([[*key, 3]]))
+
+        text = api_client.get("/metrics").content.decode()
+
+        assert (
+            'storefront_requests_total{method="GET",status="200",view="collection-list"} 4'
+            in text
+        )
+
+    def test_scrapes_can_require_a_token(self, api_client, settings):
+        settings.METRICS_TOKEN = "secret"
+
+        assert api_client.get("/metrics").status_code == 403
+        response = api_client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        assert response.status_code == 200
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_workers_write_their_own_files(metrics_dir):
+    registry.inc("storefront_requests_total", view="parent")
+    registry.flush(force=True)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            registry.inc("storefront_requests_total", view="child")
+            registry.flush(force=True)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    files = [json.loads(path.read_text()) for path in metrics_dir.glob("*.json")]
+    assert sorted(rows[0][1][0][1] for rows in files) == ["child", "parent"]
@@ -0,0 +1,80 @@
+from django.test import Client
+from rest_framework import status
+import pytest
+from core.checks import (
+    ADMIN_MIDDLEWARE,
+    check_admin_dependencies,
+    check_middleware_profiles,
+)
+from core.middleware import MiddlewareProfileMiddleware
+
+
+def test_longest_prefix_picks_the_profile(settings):
+    settings.MIDDLEWARE_PROFILE_PREFIXES = {
+        "/store/": "api",
+        "/store/admin/": "default",
+    }
+    middleware = MiddlewareProfileMiddleware(lambda request: None)
+
+    assert middleware.profile_name("/store/products/") == "api"
+    assert middleware.profile_name("/store/admin/") == "default"
+    assert middleware.profile_name("/playground/") == "default"
+
+
+def test_checks_pass_with_the_configured_profiles():
+    assert check_middleware_profiles(None) == []
+    assert not [
+        error
+        for error in check_admin_dependencies(None)
+        if error.id in ADMIN_MIDDLEWARE
+    ]
+
+
+def test_checks_report_broken_profiles(settings):
+    settings.MIDDLEWARE_PROFILES = {
+        "api": [
+            "django.contrib.auth.middleware.AuthenticationMiddleware",
+            "core.middleware.Missing",
+        ],
+    }
+    settings.MIDDLEWARE_PROFILE_PREFIXES = {"/store/": "apl"}
+
+    errors = check_middleware_profiles(None)
+
+    assert [error.id for error in errors] == [
+        "core.E001",
+        "core.E002",
+        "core.E003",
+        "core.E004",
+    ]
+
+
+def test_admin_profile_must_have_the_admin_middleware(settings):
+    settings.MIDDLEWARE_PROFILES = {
+        **settings.MIDDLEWARE_PROFILES,
+        "default": ["django.contrib.sessions.middleware.SessionMiddleware"],
+    }
+
+    errors = check_admin_dependencies(None)
+
+    assert sorted(error.id for error in errors if error.id in ADMIN_MIDDLEWARE) == [
+        "admin.E408",
+        "admin.E409",
+    ]
+
+
+@pytest.mark.django_db
+class TestMiddlewareProfiles:
+    def test_api_requests_skip_the_browser_middleware(self, api_client):
+        response = api_client.get("/store/collections/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Frame-Options" not in response
+        assert not hasattr(response.wsgi_request, "session")
+
+    def test_admin_gets_the_full_chain(self):
+        response = Client().get("/admin/login/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["X-Frame-Options"] == "DENY"
+        assert "csrftoken" in response.cookies
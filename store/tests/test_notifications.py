@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+import pytest
+from model_bakery import baker
+from playground import tasks
+from playground.tasks import get_progress, notify_customers, send_notification_chunk
+from storefront.celery import celery
+
+
+@pytest.fixture
+def eager_celery():
+    always_eager = celery.conf.task_always_eager
+    celery.conf.task_always_eager = True
+    yield
+    celery.conf.task_always_eager = always_eager
+
+
+@pytest.fixture
+def customers():
+    return baker.make(
+        settings.AUTH_USER_MODEL,
+        email=baker.seq("customer@dev.com"),
+        _quantity=7,
+    )
+
+
+@pytest.mark.django_db
+class TestNotifyCustomers:
+    def test_every_customer_gets_one_email(self, eager_celery, customers):
+        run_id = notify_customers("Big sale", chunk_size=3)
+
+        assert sorted(message.to[0] for message in mail.outbox) == sorted(
+            user.email for user in customers
+        )
+        assert mail.outbox[0].subject == "News from the Storefront"
+        assert "Big sale" in mail.outbox[0].body
+        assert get_progress(run_id) | {"message": None} == {
+            "message": None,
+            "cursor": customers[-1].id,
+            "chunks": 3,
+            "recipients": 7,
+            "done": True,
+            "sent": 7,
+        }
+
+    def test_chunks_share_one_connection(self, eager_celery, customers, monkeypatch):
+        opened = []
+        original = EmailBackend.open
+        monkeypatch.setattr(
+            EmailBackend, "open", lambda self: opened.append(self) or original(self)
+        )
+
+        notify_customers("Big sale", chunk_size=3)
+
+        assert len(opened) == 3
+
+    def test_resumes_after_the_stored_cursor(self, eager_celery, customers):
+        notify_customers("Big sale", chunk_size=3, run_id="run-1")
+        mail.outbox.clear()
+        late = baker.make(settings.AUTH_USER_MODEL, email="late@dev.com")
+
+        run = cache.get("playground:notify:run-1")
+        cache.set("playground:notify:run-1", run | {"done": False})
+        notify_customers("Big sale", chunk_size=3, run_id="run-1")
+
+        assert [message.to for message in mail.outbox] == [[late.email]]
+
+    def test_redelivered_run_resumes_under_the_task_id(self, eager_celery, customers):
+        notify_customers.apply(("Big sale",), {"chunk_size": 3}, task_id="task-1")
+        mail.outbox.clear()
+        late = baker.make(settings.AUTH_USER_MODEL, email="late@dev.com")
+
+        run = cache.get("playground:notify:task-1")
+        cache.set("playground:notify:task-1", run | {"done": False})
+        result = notify_customers.apply(
+            ("Big sale",), {"chunk_size": 3}, task_id="task-1"
+        )
+
+        assert result.get() == "task-1"
+        assert [message.to for message in mail.outbox] == [[late.email]]
+
+    def test_chunks_past_the_email_budget_wait_for_the_next_minute(
+        self, customers, settings, monkeypatch
+    ):
+        settings.NOTIFY_CUSTOMERS_EMAILS_PER_MINUTE = 5
+        monkeypatch.setattr(tasks, "time", SimpleNamespace(time=lambda: 630.0))
+        deferred = []
+        monkeypatch.setattr(
+            send_notification_chunk,
+            "apply_async",
+            lambda args, kwargs, countdown: deferred.append((args, countdown)),
+        )
+        ids = [user.id for user in customers]
+        chunks = [(ids[0] - 1, ids[2]), (ids[2], ids[5]), (ids[5], ids[6])]
+
+        for after_id, last_id in chunks:
+            send_notification_chunk.apply(
+                ("run-1", "Big sale", "emails/notification.html", after_id, last_id)
+            )
+
+        assert len(mail.outbox) == 4
+        assert deferred == [
+            (("run-1", "Big sale", "emails/notification.html", ids[2], ids[5]), 30.0)
+        ]
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient
+import pytest
+from store.models import Cart, CartItem, Order, OrderItem, Product
+from model_bakery import baker
+
+
+def make_cart(*items):
+    cart = baker.make(Cart)
+    for product, quantity in items:
+        baker.make(CartItem, cart=cart, product=product, quantity=quantity)
+    return cart
+
+
+@pytest.fixture
+def checkout():
+    def do_checkout(cart_id, user=None):
+        client = APIClient()
+        client.force_authenticate(user=user or baker.make(settings.AUTH_USER_MODEL))
+        return client.post("/store/orders/", {"cart_id": cart_id})
+
+    return do_checkout
+
+
+@pytest.mark.django_db
+class TestCheckout:
+    def test_creates_the_order_and_takes_inventory(self, checkout):
+        first, second = baker.make(Product, inventory=10, _quantity=2)
+        cart = make_cart((first, 2), (second, 10))
+
+        response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert {
+            (item["product"]["id"], item["quantity"], item["unit_price"])
+            for item in response.data["items"]
+        } == {
+            (first.id, 2, first.unit_price),
+            (second.id, 10, second.unit_price),
+        }
+        assert dict(Product.objects.values_list("id", "inventory")) == {
+            first.id: 8,
+            second.id: 0,
+        }
+        assert not Cart.objects.exists()
+
+    def test_insufficient_inventory_changes_nothing(self, checkout):
+        available, short = baker.make(Product, inventory=3, _quantity=2)
+        cart = make_cart((available, 1), (short, 4))
+
+        response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert str(short.id) in response.data["cart_id"][0]
+        assert Product.objects.get(pk=available.id).inventory == 3
+        assert not Order.objects.exists()
+        assert CartItem.objects.filter(cart=cart).count() == 2
+
+    def test_missing_and_empty_carts(self, checkout):
+        empty = baker.make(Cart)
+
+        missing = checkout("6a534217da3c4982b008bf23768e8da3")
+        response = checkout(empty.id)
+
+        assert missing.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["cart_id"] == ["The cart is empty"]
+
+    def test_query_count_does_not_grow_with_the_cart(
+        self, checkout, django_assert_max_num_queries
+    ):
+        products = baker.make(Product, inventory=10, _quantity=20)
+        cart = make_cart(*((product, 1) for product in products))
+        user = baker.make(settings.AUTH_USER_MODEL)
+
+        # Savepoints, the outbox event and the customer stats included; the cart is read once and
+        # inventory is one UPDATE
+        with django_assert_max_num_queries(17):
+            checkout(cart.id, user)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_never_oversell(checkout):
+    # SQLite only makes competing transactions wait (instead of failing with
+    # "database is locked") in IMMEDIATE mode, on a file database.
+    if connection.vendor == "sqlite" and (
+        connection.is_in_memory_db()
+        or connection.settings_dict["OPTIONS"].get("transaction_mode") != "IMMEDIATE"
+    ):
+        pytest.skip("needs a test database that lets concurrent writers wait")
+
+    product = baker.make(Product, inventory=5)
+    carts = [make_cart((product, 1)) for _ in range(8)]
+    users = baker.make(settings.AUTH_USER_MODEL, _quantity=8)
+
+    def buy(cart, user):
+        try:
+            return checkout(cart.id, user).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        codes = list(executor.map(buy, carts, users))
+
+    assert codes.count(status.HTTP_200_OK) == 5
+    assert codes.count(status.HTTP_400_BAD_REQUEST) == 3
+    assert Product.objects.get(pk=product.id).inventory == 0
+    assert OrderItem.objects.count() == 5
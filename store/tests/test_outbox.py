@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.dispatch import receiver
+from rest_framework import status
+import pytest
+from store.models import Cart, CartItem, Order, OutboxEvent, Product
+from store.signals import order_created
+from store.tasks import relay_outbox
+from model_bakery import baker
+
+
+@pytest.fixture
+def received():
+    orders = []
+
+    @receiver(order_created)
+    def record(sender, order, **kwargs):
+        orders.append(order.id)
+
+    yield orders
+    order_created.disconnect(record)
+
+
+@pytest.fixture
+def failing_receiver():
+    calls = []
+
+    @receiver(order_created)
+    def fail(sender, order, **kwargs):
+        calls.append(order.id)
+        if len(calls) == 1:
+            raise RuntimeError("webhook down")
+
+    yield calls
+    order_created.disconnect(fail)
+
+
+def make_order():
+    return baker.make(Order, customer=baker.make(settings.AUTH_USER_MODEL).customer)
+
+
+def make_event(order):
+    return OutboxEvent.objects.create(
+        topic="order_created", key=f"order:{order.id}", payload={"order_id": order.id}
+    )
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_checkout_writes_an_event_instead_of_dispatching(
+        self, api_client, received
+    ):
+        product = baker.make(Product, inventory=10)
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=product, quantity=1)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        response = api_client.post("/store/orders/", {"cart_id": cart.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert received == []
+        event = OutboxEvent.objects.get()
+        assert event.payload == {"order_id": response.data["id"]}
+
+    def test_relay_delivers_pending_events_once(self, received):
+        orders = [make_order() for _ in range(3)]
+        for order in orders:
+            make_event(order)
+
+        first = relay_outbox(batch_size=2)
+        second = relay_outbox()
+
+        assert received == [order.id for order in orders]
+        assert first["delivered"] == 3
+        assert second["delivered"] == 0
+        assert not OutboxEvent.objects.filter(processed_at__isnull=True).exists()
+
+    def test_failed_event_is_retried_later(self, failing_receiver):
+        event = make_event(make_order())
+
+        stats = relay_outbox()
+        event.refresh_from_db()
+
+        assert stats["failed"] == 1
+        assert event.processed_at is None
+        assert event.attempts == 1
+        assert "webhook down" in event.last_error
+
+        OutboxEvent.objects.update(available_at=event.created_at)
+        relay_outbox()
+        event.refresh_from_db()
+
+        assert event.processed_at is not None
+        assert len(failing_receiver) == 2
+
+    def test_events_with_the_same_key_wait_for_earlier_ones(self, failing_receiver):
+        order = make_order()
+        first, second = make_event(order), make_event(order)
+
+        relay_outbox()
+
+        assert failing_receiver == [order.id]
+        assert not OutboxEvent.objects.filter(processed_at__isnull=False).exists()
@@ -0,0 +1,319 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from rest_framework import status
+import pytest
+from store.cache import get_modified
+from store.models import Collection, Product, Promotion
+from model_bakery import baker
+
+
+@pytest.fixture
+def create_products():
+    def do_create_products(count, **kwargs):
+        collection = baker.make(Collection)
+        return baker.make(
+            Product, collection=collection, inventory=10, _quantity=count, **kwargs
+        )
+
+    return do_create_products
+
+
+@pytest.mark.django_db
+class TestListProducts:
+    def test_default_pagination_returns_count(self, api_client, create_products):
+        create_products(3)
+
+        response = api_client.get("/store/products/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 3
+
+    def test_cursor_pagination_has_no_count(self, api_client, create_products):
+        create_products(3)
+
+        response = api_client.get("/store/products/?pagination=cursor")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "count" not in response.data
+        assert len(response.data["results"]) == 3
+
+    def test_cursor_pagination_walks_every_product_once(
+        self, api_client, create_products
+    ):
+        products = create_products(25, unit_price=5)
+
+        ids = []
+        url = "/store/products/?pagination=cursor&ordering=-unit_price"
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            ids += [product["id"] for product in response.data["results"]]
+            url = response.data["next"]
+
+        assert ids == sorted(product.id for product in products)[::-1]
+
+    def test_cursor_pages_on_ties_use_no_offset(self, api_client, create_products):
+        create_products(25, unit_price=5)
+        url = api_client.get("/store/products/?pagination=cursor&ordering=unit_price")
+        url = url.data["next"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+
+        assert len(response.data["results"]) == 10
+        assert not any("OFFSET" in query["sql"] for query in queries)
+
+    def test_previous_link_returns_the_previous_page(self, api_client, create_products):
+        create_products(25, unit_price=5)
+        first = api_client.get("/store/products/?pagination=cursor&ordering=unit_price")
+        second = api_client.get(first.data["next"])
+
+        previous = api_client.get(second.data["previous"])
+
+        assert previous.data["results"] == first.data["results"]
+
+
+@pytest.mark.django_db
+class TestSearchProducts:
+    def test_search_matches_title_and_description(self, api_client, create_products):
+        red, blue, green = create_products(3, description="")
+        Product.objects.filter(pk=red.pk).update(title="Red shirt")
+        Product.objects.filter(pk=blue.pk).update(description="Navy, nearly red")
+        Product.objects.filter(pk=green.pk).update(title="Green shirt")
+
+        response = api_client.get("/store/products/?search=red&ordering=-relevance")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [product["id"] for product in response.data["results"]] == [
+            red.id,
+            blue.id,
+        ]
+
+    def test_search_index_follows_saves(self, api_client, create_products):
+        (product,) = create_products(1, title="Lamp")
+        product.title = "Desk light"
+        product.save()
+
+        assert api_client.get("/store/products/?search=lamp").data["count"] == 0
+        assert api_client.get("/store/products/?search=desk").data["count"] == 1
+
+    def test_search_input_is_not_parsed_as_query_syntax(self, api_client):
+        response = api_client.get('/store/products/?search="a" OR NEAR(')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_ordering_by_relevance_without_search_is_ignored(self, api_client):
+        response = api_client.get("/store/products/?ordering=relevance")
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestProductResponseCache:
+    def test_repeat_anonymous_request_is_served_from_cache(
+        self, api_client, create_products
+    ):
+        (product,) = create_products(1)
+
+        first = api_client.get(f"/store/products/{product.id}/")
+        second = api_client.get(f"/store/products/{product.id}/")
+
+        assert first["X-Cache"] == "MISS"
+        assert second["X-Cache"] == "HIT"
+        assert second.data == first.data
+
+    def test_saving_a_product_invalidates_the_cache(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        (product,) = create_products(1)
+        api_client.get(f"/store/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.title = "Renamed"
+            product.save()
+        response = api_client.get(f"/store/products/{product.id}/")
+
+        assert response["X-Cache"] == "MISS"
+        assert response.data["title"] == "Renamed"
+
+    def test_queryset_updates_invalidate_the_cache(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        (product,) = create_products(1)
+        api_client.get(f"/store/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(inventory=0)
+        response = api_client.get(f"/store/products/{product.id}/")
+
+        assert response["X-Cache"] == "MISS"
+        assert response.data["inventory"] == 0
+
+    def test_promotion_changes_invalidate_the_cache(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        (product,) = create_products(1)
+        api_client.get(f"/store/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.promotions.add(baker.make(Promotion))
+        response = api_client.get(f"/store/products/{product.id}/")
+
+        assert response["X-Cache"] == "MISS"
+
+
+@pytest.mark.django_db
+class TestConditionalGetProduct:
+    def test_response_carries_validators(self, api_client, create_products):
+        (product,) = create_products(1)
+
+        response = api_client.get(f"/store/products/{product.id}/")
+
+        assert response.has_header("ETag")
+
+    def test_matching_etag_returns_304(self, api_client, create_products):
+        (product,) = create_products(1)
+        etag = api_client.get(f"/store/products/{product.id}/")["ETag"]
+
+        response = api_client.get(
+            f"/store/products/{product.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+
+    def test_changed_product_returns_200(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        (product,) = create_products(1)
+        etag = api_client.get(f"/store/products/{product.id}/")["ETag"]
+        with django_capture_on_commit_callbacks(execute=True):
+            product.images.create(image="store/images/a.jpg")
+
+        response = api_client.get(
+            f"/store/products/{product.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_checkout_of_another_product_returns_304(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        product, other = create_products(2)
+        etag = api_client.get(f"/store/products/{product.id}/")["ETag"]
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.reserve_inventory({other.id: 1})
+
+        response = api_client.get(
+            f"/store/products/{product.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_if_modified_since_last_update_returns_304(
+        self, api_client, create_products
+    ):
+        (product,) = create_products(1)
+        last_modified = api_client.get(f"/store/products/{product.id}/")[
+            "Last-Modified"
+        ]
+
+        response = api_client.get(
+            f"/store/products/{product.id}/", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        product.refresh_from_db()
+
+        assert last_modified == http_date(product.last_update.timestamp())
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_is_last_modified_at_the_generation_bump(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        create_products(1)
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.update(inventory=5)
+
+        response = api_client.get("/store/products/")
+        not_modified = api_client.get(
+            "/store/products/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+
+        assert response["Last-Modified"] == http_date(get_modified("products"))
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_etag_depends_on_filters(self, api_client, create_products):
+        create_products(2)
+
+        first = api_client.get("/store/products/")
+        second = api_client.get("/store/products/?unit_price__gt=0")
+
+        assert first["ETag"] != second["ETag"]
+
+    def test_queryset_updates_change_the_etag(
+        self, api_client, create_products, django_capture_on_commit_callbacks
+    ):
+        (product,) = create_products(1)
+        etag = api_client.get("/store/products/")["ETag"]
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(inventory=0)
+
+        response = api_client.get("/store/products/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][0]["inventory"] == 0
+
+    def test_304_runs_no_query(
+        self, api_client, create_products, django_assert_num_queries
+    ):
+        create_products(2)
+        etag = api_client.get("/store/products/")["ETag"]
+
+        with django_assert_num_queries(0):
+            response = api_client.get("/store/products/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+class TestProductFieldSelection:
+    def test_fields_limits_the_representation(self, api_client, create_products):
+        (product,) = create_products(1)
+
+        response = api_client.get(
+            f"/store/products/{product.id}/?fields=id,title,unit_price"
+        )
+
+        assert response.data == {
+            "id": product.id,
+            "title": product.title,
+            "unit_price": product.unit_price,
+        }
+
+    def test_omit_drops_fields(self, api_client, create_products):
+        (product,) = create_products(1)
+
+        response = api_client.get(f"/store/products/{product.id}/?omit=images")
+
+        assert "images" not in response.data
+        assert "price_with_tax" in response.data
+
+    def test_expand_nests_the_collection(self, api_client, create_products):
+        (product,) = create_products(1)
+
+        response = api_client.get(f"/store/products/{product.id}/?expand=collection")
+
+        assert response.data["collection"] == {
+            "id": product.collection.id,
+            "title": product.collection.title,
+        }
+
+    def test_list_without_images_skips_the_prefetch(
+        self, api_client, create_products, django_assert_num_queries
+    ):
+        create_products(3)
+
+        # COUNT(*) and the page itself, no images prefetch
+        with django_assert_num_queries(2):
+            api_client.get("/store/products/?fields=id,title,unit_price")
@@ -0,0 +1,71 @@
+from django.conf import settings as django_settings
+from django.test import Client
+import pytest
+from core import profiling
+from store.models import Cart, CartItem, Product
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def profiles(settings, tmp_path):
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_TOKEN = "secret"
+    settings.PROFILING_SAMPLE_RATE = 0
+    settings.PROFILING_ROUTES = {}
+    return tmp_path
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    def test_checkout_profiles_show_the_serializer_and_sql(self, api_client):
+        cart = baker.make(Cart)
+        baker.make(
+            CartItem, cart=cart, product=baker.make(Product, inventory=5), quantity=1
+        )
+        api_client.force_authenticate(user=baker.make(django_settings.AUTH_USER_MODEL))
+
+        response = api_client.post(
+            "/store/orders/", {"cart_id": cart.id}, HTTP_X_PROFILE="secret"
+        )
+
+        profile, report = profiling.load_profile(
+            response["X-Profile-Id"], restrict="serializers"
+        )
+        assert profile["view"] == "orders-create"
+        assert profile["status"] == 200
+        assert any("store_order" in query["sql"] for query in profile["queries"])
+        assert "(save)" in report
+
+    def test_requests_are_sampled_by_route(self, api_client, settings):
+        settings.PROFILING_ROUTES = {"/store/collections/": 1}
+
+        sampled = api_client.get("/store/collections/")
+        skipped = api_client.get("/store/products/", HTTP_X_PROFILE="wrong")
+
+        assert "X-Profile-Id" in sampled
+        assert "X-Profile-Id" not in skipped
+
+    def test_only_the_newest_profiles_are_kept(self, api_client, settings):
+        settings.PROFILING_MAX_PROFILES = 2
+
+        ids = [
+            api_client.get("/store/collections/", HTTP_X_PROFILE="secret")[
+                "X-Profile-Id"
+            ]
+            for _ in range(3)
+        ]
+
+        assert [profile["id"] for profile in profiling.list_profiles()] == ids[:0:-1]
+
+    def test_admin_viewer(self, api_client):
+        profile_id = api_client.get("/store/collections/", HTTP_X_PROFILE="secret")[
+            "X-Profile-Id"
+        ]
+        client = Client()
+
+        assert client.get("/admin/profiles/").status_code == 302
+        client.force_login(baker.make(django_settings.AUTH_USER_MODEL, is_staff=True))
+        assert profile_id in client.get("/admin/profiles/").content.decode()
+        detail = client.get(f"/admin/profiles/{profile_id}/", {"sort": "tottime"})
+        assert detail.status_code == 200
+        assert client.get("/admin/profiles/missing/").status_code == 404
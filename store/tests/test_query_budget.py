@@ -0,0 +1,106 @@
+from django.conf import settings
+import pytest
+from store.models import (
+    Cart,
+    CartItem,
+    Collection,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+    Review,
+)
+from model_bakery import baker
+
+ROWS = 12  # more than a page
+
+
+@pytest.fixture
+def catalog():
+    collection = baker.make(Collection)
+    products = baker.make(Product, collection=collection, _quantity=ROWS)
+    product = products[0]
+    for other in baker.make(Collection, _quantity=ROWS - 1):
+        baker.make(Product, collection=other)
+    baker.make(ProductImage, product=product, _quantity=ROWS)
+    baker.make(Review, product=product, _quantity=ROWS)
+
+    cart = baker.make(Cart)
+    for item_product in products:
+        baker.make(CartItem, cart=cart, product=item_product, quantity=1)
+
+    user = baker.make(settings.AUTH_USER_MODEL, is_staff=True)
+    baker.make(settings.AUTH_USER_MODEL, _quantity=ROWS)  # with customers
+    orders = baker.make(Order, customer=user.customer, _quantity=ROWS)
+    for order in orders:
+        for item_product in products[:3]:
+            baker.make(
+                OrderItem,
+                order=order,
+                product=item_product,
+                unit_price=item_product.unit_price,
+                quantity=1,
+            )
+
+    return {
+        "user": user,
+        "collection": collection.id,
+        "product": product.id,
+        "image": product.images.first().id,
+        "review": product.reviews.first().id,
+        "cart": cart.id,
+        "item": cart.items.first().id,
+        "customer": user.customer.id,
+        "order": orders[0].id,
+    }
+
+
+# (url, budget) for every router endpoint in store/urls.py
+ENDPOINTS = [
+    ("/store/collections/", 2),
+    ("/store/collections/{collection}/", 2),  # + the Last-Modified read
+    ("/store/products/", 3),
+    ("/store/products/{product}/", 3),  # + the Last-Modified read
+    ("/store/products/{product}/images/", 2),
+    ("/store/products/{product}/images/{image}/", 1),
+    ("/store/products/{product}/reviews/", 2),
+    ("/store/products/{product}/reviews/{review}/", 1),
+    ("/store/carts/{cart}/", 3),
+    ("/store/carts/{cart}/items/", 2),
+    ("/store/carts/{cart}/items/{item}/", 1),
+    ("/store/customers/", 2),
+    ("/store/customers/{customer}/", 1),
+    ("/store/customers/me/", 1),
+    ("/store/orders/", 4),
+    ("/store/orders/{order}/", 3),
+    ("/store/reports/products/", 2),
+    ("/store/reports/products/top/", 1),
+    ("/store/reports/collections/", 2),
+    ("/store/reports/memberships/", 2),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url, budget", ENDPOINTS)
+def test_endpoint_stays_within_its_query_budget(
+    api_client, query_budget, catalog, url, budget
+):
+    api_client.force_authenticate(user=catalog["user"])
+
+    query_budget(url.format(**catalog), budget)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url, budget", [("/store/orders/", 4), ("/store/orders/{order}/", 3)]
+)
+def test_customer_orders_stay_within_their_query_budget(
+    api_client, query_budget, catalog, url, budget
+):
+    user = catalog["user"]
+    user.is_staff = False
+    api_client.force_authenticate(user=user)
+
+    response = query_budget(url.format(**catalog), budget)
+
+    assert response.data
@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework import status
+import pytest
+from core import routers
+from core.middleware import PIN_COOKIE, ReplicaMiddleware
+from core.routers import ReplicaRouter, replica_lag, replica_reads
+from store.models import Product
+from store.views import ProductViewSet
+from model_bakery import baker
+
+
+@pytest.fixture
+def lags(monkeypatch, settings):
+    """Replica lags by alias; the aliases asked about are recorded in `asked`"""
+    lags = {}
+    asked = []
+
+    def fake_lag(alias):
+        asked.append(alias)
+        return lags.get(alias, 0)
+
+    monkeypatch.setattr(routers, "replica_lag", fake_lag)
+    lags["asked"] = asked
+    return lags
+
+
+class TestReplicaRouter:
+    def test_reads_use_a_replica_only_when_allowed(self, lags, settings):
+        settings.DATABASE_REPLICAS = ["replica1", "replica2"]
+        lags["replica2"] = 10
+        router = ReplicaRouter()
+
+        assert router.db_for_read(Product) is None
+        with replica_reads():
+            assert router.db_for_read(Product) == "replica1"
+            with replica_reads(False):
+                assert router.db_for_read(Product) is None
+        assert router.db_for_write(Product) == "default"
+
+    def test_falls_back_to_the_primary_when_replicas_lag(self, lags, settings):
+        settings.DATABASE_REPLICAS = ["replica1"]
+        lags["replica1"] = settings.REPLICA_MAX_LAG + 1
+
+        with replica_reads():
+            assert ReplicaRouter().db_for_read(Product) == "default"
+
+    def test_replicas_are_not_migrated(self, settings):
+        settings.DATABASE_REPLICAS = ["replica1"]
+
+        assert ReplicaRouter().allow_migrate("replica1", "store") is False
+        assert ReplicaRouter().allow_migrate("default", "store") is None
+
+    def test_unreachable_replicas_count_as_infinitely_behind(self, monkeypatch):
+        def unreachable(alias):
+            raise DatabaseError("connection refused")
+
+        monkeypatch.setattr(routers, "measure_lag", unreachable)
+
+        assert replica_lag("replica1") == float("inf")
+        # Remembered until the next check
+        monkeypatch.setattr(routers, "measure_lag", lambda alias: 0)
+        assert replica_lag("replica1") == float("inf")
+
+
+@pytest.mark.django_db
+class TestReplicaMiddleware:
+    @pytest.fixture(autouse=True)
+    def replica(self, settings, lags):
+        # The default database plays the replica, lags["asked"] shows its use
+        settings.DATABASE_REPLICAS = ["default"]
+        return lags["asked"]
+
+    def test_catalog_reads_go_to_replicas(self, api_client, replica):
+        baker.make(Product)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        response = api_client.get("/store/products/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert replica
+
+    def test_other_views_and_writes_use_the_primary(self, api_client, replica):
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        api_client.get("/store/customers/me/")
+        api_client.post("/store/collections/", {"title": "a"})
+
+        assert not replica
+
+    def test_anonymous_cache_fills_use_the_primary(self, api_client, monkeypatch):
+        baker.make(Product)
+        allowed = []
+        get_queryset = ProductViewSet.get_queryset
+
+        def spy(view):
+            allowed.append(routers._replica_reads.get())
+            return get_queryset(view)
+
+        monkeypatch.setattr(ProductViewSet, "get_queryset", spy)
+
+        api_client.get("/store/products/")
+
+        assert allowed == [False]
+
+    def test_writers_are_pinned_to_the_primary(self, api_client, replica):
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        response = api_client.post("/store/carts/")
+        api_client.get("/store/products/")
+
+        assert PIN_COOKIE in response.cookies
+        assert not replica
+
+    def test_token_clients_are_pinned_in_the_cache(self):
+        factory = RequestFactory()
+        middleware = ReplicaMiddleware(lambda request: HttpResponse())
+
+        middleware(factory.post("/store/carts/", HTTP_AUTHORIZATION="JWT abc"))
+
+        assert middleware.is_pinned(
+            factory.get("/store/products/", HTTP_AUTHORIZATION="JWT abc")
+        )
+        assert not middleware.is_pinned(
+            factory.get("/store/products/", HTTP_AUTHORIZATION="JWT xyz")
+        )
@@ -0,0 +1,164 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+import pytest
+from store.models import (
+    Collection,
+    DailyCollectionSales,
+    DailyMembershipSales,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    Product,
+    SalesRollupWatermark,
+)
+from store.tasks import rollup_sales
+from model_bakery import baker
+
+
+@pytest.fixture
+def place_order():
+    def do_place_order(
+        items,
+        age=timedelta(hours=1),
+        membership="B",
+        payment_status=Order.PAYMENT_STATUS_COMPLETE,
+    ):
+        customer = baker.make(settings.AUTH_USER_MODEL).customer
+        customer.membership = membership
+        customer.save()
+        order = baker.make(Order, customer=customer, payment_status=payment_status)
+        Order.objects.filter(pk=order.pk).update(placed_at=timezone.now() - age)
+        for product, quantity in items:
+            baker.make(
+                OrderItem,
+                order=order,
+                product=product,
+                quantity=quantity,
+                unit_price=product.unit_price,
+            )
+        return order
+
+    return do_place_order
+
+
+@pytest.fixture
+def products():
+    collection = baker.make(Collection)
+    return [
+        baker.make(Product, collection=collection, unit_price=Decimal(price))
+        for price in ["10.00", "2.50"]
+    ]
+
+
+@pytest.mark.django_db
+class TestRollupSales:
+    def test_rolls_up_orders_per_product_collection_and_membership(
+        self, place_order, products
+    ):
+        first, second = products
+        place_order([(first, 2), (second, 4)])
+        place_order([(first, 1)], membership="G")
+
+        stats = rollup_sales()
+
+        today = timezone.localdate(timezone.now() - timedelta(hours=1))
+        assert stats["orders"] == 2
+        assert {
+            row.product_id: (row.quantity, row.revenue)
+            for row in DailyProductSales.objects.filter(date=today)
+        } == {first.id: (3, Decimal("30.00")), second.id: (4, Decimal("10.00"))}
+        assert DailyCollectionSales.objects.get().revenue == Decimal("40.00")
+        assert {
+            row.membership: (row.orders, row.revenue)
+            for row in DailyMembershipSales.objects.all()
+        } == {"B": (1, Decimal("30.00")), "G": (1, Decimal("10.00"))}
+
+    def test_only_new_orders_are_added(self, place_order, products):
+        first, _ = products
+        place_order([(first, 1)])
+        rollup_sales()
+
+        place_order([(first, 5)])
+        stats = rollup_sales(batch_size=1)
+        rollup_sales()
+
+        assert stats["orders"] == 1
+        assert DailyProductSales.objects.get().quantity == 6
+
+    def test_only_completed_orders_are_counted(self, place_order, products):
+        first, _ = products
+        place_order([(first, 1)])
+        place_order([(first, 2)], payment_status=Order.PAYMENT_STATUS_PENDING)
+        place_order([(first, 4)], payment_status=Order.PAYMENT_STATUS_FAILED)
+
+        stats = rollup_sales()
+
+        assert stats["orders"] == 3
+        assert DailyProductSales.objects.get().quantity == 1
+        assert DailyMembershipSales.objects.get().orders == 1
+
+    def test_status_changes_after_the_rollup_are_settled(self, place_order, products):
+        first, _ = products
+        pending = place_order([(first, 2)], payment_status=Order.PAYMENT_STATUS_PENDING)
+        completed = place_order([(first, 1)])
+        rollup_sales()
+
+        pending = Order.objects.get(pk=pending.pk)
+        pending.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        pending.save()
+        assert DailyProductSales.objects.get().quantity == 3
+
+        Order.objects.filter(pk=completed.pk).update(
+            payment_status=Order.PAYMENT_STATUS_FAILED
+        )
+        row = DailyMembershipSales.objects.get()
+        assert (row.orders, row.quantity, row.revenue) == (1, 2, Decimal("20.00"))
+
+    def test_recent_orders_wait_for_the_grace_period(self, place_order, products):
+        place_order([(products[0], 1)], age=timedelta(0))
+
+        assert rollup_sales()["orders"] == 0
+        assert not SalesRollupWatermark.objects.exclude(placed_at=None).exists()
+
+
+@pytest.mark.django_db
+class TestSalesReports:
+    def test_reports_are_for_staff_only(self, api_client, authenticate_user):
+        authenticate_user(is_staff=False)
+
+        response = api_client.get("/store/reports/products/")
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_top_products(self, api_client, authenticate_user, products):
+        first, second = products
+        today = timezone.localdate()
+        baker.make(DailyProductSales, date=today, product=first, quantity=1, revenue=5)
+        baker.make(
+            DailyProductSales,
+            date=today - timedelta(days=1),
+            product=second,
+            quantity=8,
+            revenue=20,
+        )
+        baker.make(
+            DailyProductSales,
+            date=today - timedelta(days=60),
+            product=first,
+            quantity=100,
+            revenue=1000,
+        )
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(
+            "/store/reports/products/top/",
+            {"date__gte": (today - timedelta(days=30)).isoformat()},
+        )
+
+        assert [(row["product_id"], row["revenue"]) for row in response.data] == [
+            (second.id, Decimal("20.00")),
+            (first.id, Decimal("5.00")),
+        ]
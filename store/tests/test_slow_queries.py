@@ -0,0 +1,117 @@
+from io import StringIO
+from django.conf import settings as django_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+import pytest
+from core.models import SlowQuery
+from core import slow_queries
+from core.slow_queries import fingerprint, log_slow_queries
+from store.models import Product
+from storefront.celery import celery
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def eager_log(settings):
+    always_eager = celery.conf.task_always_eager
+    celery.conf.task_always_eager = True
+    settings.SLOW_QUERY_THRESHOLD = 0
+    settings.SLOW_QUERY_EXPLAIN_RATE = 0
+    slow_queries._pending.set(None)
+    yield
+    celery.conf.task_always_eager = always_eager
+
+
+def test_fingerprints_drop_literals():
+    assert fingerprint(
+        "SELECT *  FROM store_product\n WHERE id IN (1, 2, 3) "
+        "AND title = 'it''s' AND price > 9.99 AND slug = %s"
+    ) == (
+        "SELECT * FROM store_product WHERE id IN (...) "
+        "AND title = ? AND price > ? AND slug = ?"
+    )
+
+
+@pytest.mark.parametrize("open_before", [True, False])
+def test_explain_leaves_the_connection_as_it_found_it(
+    settings, monkeypatch, open_before
+):
+    class Connection:
+        connection = object() if open_before else None
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    connection = Connection()
+    settings.SLOW_QUERY_EXPLAIN_RATE = 1
+    monkeypatch.setattr(slow_queries, "connections", {"default": connection})
+    monkeypatch.setattr(slow_queries, "explain", lambda *args: "plan")
+
+    plan = slow_queries.sample_plan("default", "SELECT 1", (), False)
+
+    assert plan == "plan"
+    assert connection.closed is not open_before
+
+
+@pytest.mark.django_db
+class TestSlowQueryLog:
+    def test_is_installed_on_connections(self):
+        connection.ensure_connection()
+
+        assert connection.execute_wrappers[0] is log_slow_queries
+
+    def test_slow_queries_are_counted_by_view(self, api_client):
+        baker.make(Product, _quantity=2)
+        api_client.get("/store/products/")
+        api_client.get("/store/products/?page=1")
+
+        query = SlowQuery.objects.get(
+            view="products-list",
+            fingerprint__startswith='SELECT "store_product"."id"',
+        )
+        assert query.calls >= 2
+        assert query.total_time >= query.max_time > 0
+        assert query.plan == ""
+
+    def test_fast_queries_are_ignored(self, api_client, settings):
+        settings.SLOW_QUERY_THRESHOLD = 60
+
+        api_client.get("/store/products/")
+
+        assert not SlowQuery.objects.exists()
+
+    def test_a_sample_gets_its_plan(self, api_client, settings):
+        settings.SLOW_QUERY_EXPLAIN_RATE = 1
+
+        api_client.get("/store/collections/")
+
+        queries = SlowQuery.objects.filter(view="collection-list")
+        assert queries
+        assert all(query.plan and query.plan_captured_at for query in queries)
+
+    def test_command_lists_the_top_offenders(self, api_client):
+        api_client.get("/store/collections/")
+        out = StringIO()
+
+        call_command("slow_queries", "--view", "collection-list", stdout=out)
+
+        assert "collection-list" in out.getvalue()
+        assert "store_collection" in out.getvalue()
+
+    def test_admin_lists_them(self, api_client):
+        api_client.get("/store/collections/")
+        client = Client()
+        client.force_login(
+            baker.make(
+                django_settings.AUTH_USER_MODEL, is_staff=True, is_superuser=True
+            )
+        )
+
+        changelist = client.get("/admin/core/slowquery/", {"o": "5"})
+        query = SlowQuery.objects.filter(view="collection-list").first()
+        detail = client.get(f"/admin/core/slowquery/{query.pk}/change/")
+
+        assert "collection-list" in changelist.content.decode()
+        assert detail.status_code == 200
@@ -2,13 +2,25 @@ from django.urls import path, include
 from rest_framework_nested import routers
 from . import views
 
-
 router = routers.DefaultRouter()
 router.register("collections", views.CollectionViewSet)
 router.register("products", views.ProductViewSet, basename="products")
 router.register("orders", views.OrderViewSet, basename="orders")
 router.register("carts", views.CartViewSet, basename="carts")
 router.register("customers", views.CustomerViewSet, basename="customers")
+router.register(
+    "reports/products", views.DailyProductSalesViewSet, basename="report-products"
+)
+router.register(
+    "reports/collections",
+    views.DailyCollectionSalesViewSet,
+    basename="report-collections",
+)
+router.register(
+    "reports/memberships",
+    views.DailyMembershipSalesViewSet,
+    basename="report-memberships",
+)
 
 
 products_router = routers.NestedDefaultRouter(router, "products", lookup="product")
@@ -1,8 +1,8 @@
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, F, Q, ExpressionWrapper
+from django.db.models import Count, F, Q, Sum, ExpressionWrapper
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework import status
-from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.mixins import (
     CreateModelMixin,
     RetrieveModelMixin,
@@ -17,8 +17,23 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
-from .filters import ProductFilter
+from .cache import CachedResponseMixin
+from .carts import StoredCartItemMixin, StoredCartMixin
+from .conditional import ConditionalGetMixin
+from .fastpath import (
+    FastCartSerializer,
+    FastOrderSerializer,
+    FastPathMixin,
+    FastProductSerializer,
+    FastRetrieveMixin,
+)
+from .filters import ProductFilter, ProductOrderingFilter, ProductSearchFilter
+from .idempotency import IdempotencyMixin, idempotent
+from .pagination import KeysetOptInMixin
 from .models import (
+    DailyCollectionSales,
+    DailyMembershipSales,
+    DailyProductSales,
     ProductImage,
     Product,
     Collection,
@@ -33,14 +48,19 @@ from .permissions import IsAdminOrReadOnly
 from .serializers import (
     AddCartItemSerializer,
     CartSerializer,
+    CartItemBatchSerializer,
     CartItemSerializer,
     CollectionSerializer,
     CreateOrderSerializer,
     CustomerSerializer,
+    DailyCollectionSalesSerializer,
+    DailyMembershipSalesSerializer,
+    DailyProductSalesSerializer,
     OrderSerializer,
     ProductSerializer,
     ProductImageSerializer,
     ReviewSerializer,
+    TopProductSerializer,
     UpdateOrderSerializer,
     UpdateCartItemSerializer,
 )
@@ -54,15 +74,42 @@ from .serializers import (
 """Add related_name='products' into the 'collection' field in the Product model"""
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.prefetch_related("images").all()
+class ProductViewSet(
+    KeysetOptInMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    FastPathMixin,
+    ModelViewSet,
+):
+    cache_resource = "products"
+    # ?expand=collection renders the collection too
+    last_modified_fields = ["last_update", "collection__last_update"]
+    read_from_replica = True
+    fast_serializer_class = FastProductSerializer
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ["title", "description"]
-    ordering_fields = ["unit_price", "last_update"]
+    ordering_fields = ["unit_price", "last_update", "relevance"]
     permission_classes = [IsAdminOrReadOnly]
 
+    def get_queryset(self):
+        if self.request.method != "GET":
+            return Product.objects.prefetch_related("images").all()
+
+        # Only join / prefetch / load what ?fields= ?omit= ?expand= asked for.
+        # Ordering columns stay loaded for the keyset paginator.
+        fields, expand = ProductSerializer.get_field_selection(self.request)
+        queryset = Product.objects.all()
+        if "images" in fields:
+            queryset = queryset.prefetch_related("images")
+        if "collection" in expand:
+            queryset = queryset.select_related("collection")
+        return queryset.only(
+            *ProductSerializer.get_field_columns(fields, expand),
+            "unit_price",
+            "last_update",
+        )
+
     def get_serializer_context(self):
         return {"request": self.request}
 
@@ -80,8 +127,10 @@ class ProductViewSet(ModelViewSet):
 """Add related_name='order_items' into the 'product' field in the OrderItem model"""
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(products_count=Count("products")).all()
+class CollectionViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Collection.objects.all()
+    cache_resource = "collections"
+    read_from_replica = True
     serializer_class = CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
 
@@ -107,9 +156,7 @@ class ProductImageViewSet(ModelViewSet):
     serializer_class = ProductImageSerializer
 
     def get_queryset(self):
-        return ProductImage.objects.select_related("product").filter(
-            product_id=self.kwargs["product_pk"]
-        )
+        return ProductImage.objects.filter(product_id=self.kwargs["product_pk"])
 
     def get_serializer_context(self):
         return {"product_id": self.kwargs["product_pk"]}
@@ -123,6 +170,7 @@ class ProductImageViewSet(ModelViewSet):
 
 class ReviewViewSet(ModelViewSet):
     serializer_class = ReviewSerializer
+    read_from_replica = True
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs["product_pk"])
@@ -141,10 +189,23 @@ class ReviewViewSet(ModelViewSet):
 
 
 class CartViewSet(
-    CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet
+    IdempotencyMixin,
+    StoredCartMixin,
+    FastRetrieveMixin,
+    CreateModelMixin,
+    RetrieveModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
 ):
-    queryset = Cart.objects.prefetch_related("items__product").all()
     serializer_class = CartSerializer
+    fast_serializer_class = FastCartSerializer
+
+    def get_queryset(self):
+        fields, expand = CartSerializer.get_field_selection(self.request)
+        queryset = Cart.objects.all()
+        if "items" in fields or "total_price" in fields:
+            queryset = queryset.prefetch_related("items__product")
+        return queryset.only(*CartSerializer.get_field_columns(fields, expand))
 
     def get_serialiser_context(self):
         return {"request": self.request}
@@ -161,10 +222,13 @@ class CartViewSet(
 # CART ITEM, ADD ITEM TO THE CART
 
 
-class CartItemViewSet(ModelViewSet):
+class CartItemViewSet(IdempotencyMixin, StoredCartItemMixin, ModelViewSet):
     http_method_names = ["get", "post", "patch", "delete"]
+    idempotent_actions = ["create", "batch"]
 
     def get_serializer_class(self):
+        if self.action == "batch":
+            return CartItemBatchSerializer
         if self.request.method == "POST":
             return AddCartItemSerializer
         elif self.request.method == "PATCH":
@@ -181,6 +245,33 @@ class CartItemViewSet(ModelViewSet):
             cart_id=self.kwargs["cart_pk"]
         )
 
+    def get_idempotency_scope(self, request):
+        # The cart id is issued by the server, so it scopes anonymous clients
+        return (
+            super().get_idempotency_scope(request) or f"cart:{self.kwargs['cart_pk']}"
+        )
+
+    # Item writes count as cart activity for the abandoned cart reaper
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        Cart.objects.touch(self.kwargs["cart_pk"])
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        Cart.objects.touch(self.kwargs["cart_pk"])
+
+    # POST /store/carts/{cart_pk}/items/batch/
+    # {"operations": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}]}
+    @action(detail=False, methods=["POST"])
+    @idempotent
+    def batch(self, request, cart_pk=None):
+        if not self.cart_store.materialized:
+            return self.stored_batch(request, cart_pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = serializer.save()
+        return Response(CartSerializer(cart, context={"request": request}).data)
+
 
 ################################################################################
 
@@ -192,7 +283,11 @@ class CustomerViewSet(ModelViewSet):
 
     @action(detail=False, methods=["GET", "PUT"], permission_classes=[IsAuthenticated])
     def me(self, request):
-        customer = Customer.objects.get(user_id=request.user.id)
+        customer_id = getattr(request.user, "customer_id", None)
+        if customer_id is not None:
+            customer = Customer.objects.get(pk=customer_id)
+        else:
+            customer = Customer.objects.get(user_id=request.user.id)
         if request.method == "GET":
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
@@ -210,21 +305,29 @@ class CustomerViewSet(ModelViewSet):
 """Add related_name='items' into the 'order' field in the OrderItem model"""
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(IdempotencyMixin, FastPathMixin, ModelViewSet):
+    fast_serializer_class = FastOrderSerializer
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
+    read_from_replica = True
 
     def get_permissions(self):
         if self.request.method in ["PATCH", "DELETE"]:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serialiser = CreateOrderSerializer(
-            data=request.data, context={"user_id": self.request.user.pk}
+            data=request.data,
+            context={
+                "user_id": self.request.user.pk,
+                "customer_id": getattr(self.request.user, "customer_id", None),
+            },
         )
         serialiser.is_valid(raise_exception=True)
         order = serialiser.save()
 
+        order = Order.objects.prefetch_related("items__product").get(pk=order.pk)
         serialiser = OrderSerializer(order)
         return Response(serialiser.data)
 
@@ -239,7 +342,68 @@ class OrderViewSet(ModelViewSet):
         user = self.request.user
 
         if user.is_staff:
-            return Order.objects.all()
+            queryset = Order.objects.all()
+        else:
+            # Token claims when present, otherwise a join rather than a lookup
+            customer_id = getattr(user, "customer_id", None)
+            if customer_id is not None:
+                queryset = Order.objects.filter(customer_id=customer_id)
+            else:
+                queryset = Order.objects.filter(customer__user_id=user.pk)
+
+        if self.request.method != "GET":
+            return queryset
+
+        fields, expand = OrderSerializer.get_field_selection(self.request)
+        if "items" in fields:
+            queryset = queryset.prefetch_related("items__product")
+        if "customer" in expand:
+            queryset = queryset.select_related("customer")
+        return queryset.only(*OrderSerializer.get_field_columns(fields, expand))
+
+
+###############################################################################
+# SALES REPORTS: http://127.0.0.1:8000/store/reports/
+# Served from the rollups kept by store.tasks.rollup_sales, never from orders.
+# ?date__gte=2024-01-01&date__lte=2024-01-31
+
+
+class SalesReportViewSet(ReadOnlyModelViewSet):
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    ordering_fields = ["date", "quantity", "revenue"]
+    ordering = ["-date"]
+
+
+class DailyProductSalesViewSet(SalesReportViewSet):
+    queryset = DailyProductSales.objects.all()
+    serializer_class = DailyProductSalesSerializer
+    filterset_fields = {"date": ["gte", "lte"], "product_id": ["exact"]}
+
+    # GET /store/reports/products/top/?date__gte=...&limit=10
+    @action(detail=False)
+    def top(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 100)
+        except ValueError:
+            limit = 10
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .order_by()
+            .values("product_id")
+            .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+            .order_by("-revenue", "product_id")[:limit]
+        )
+        return Response(TopProductSerializer(rows, many=True).data)
+
+
+class DailyCollectionSalesViewSet(SalesReportViewSet):
+    queryset = DailyCollectionSales.objects.all()
+    serializer_class = DailyCollectionSalesSerializer
+    filterset_fields = {"date": ["gte", "lte"], "collection_id": ["exact"]}
+
 
-        customer_id = Customer.objects.only("id").get(user_id=user.pk)
-        return Order.objects.filter(customer_id=customer_id)
+class DailyMembershipSalesViewSet(SalesReportViewSet):
+    queryset = DailyMembershipSales.objects.all()
+    serializer_class = DailyMembershipSalesSerializer
+    filterset_fields = {"date": ["gte", "lte"], "membership": ["exact"]}
@@ -11,11 +11,13 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # from config import SQL_PASSWORD
 from datetime import timedelta
 from celery.schedules import crontab
+from corsheaders.defaults import default_headers
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -61,17 +63,85 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8001",
 ]
 
+# Retried POSTs (orders, cart items) carry an Idempotency-Key
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.MiddlewareProfileMiddleware",
+]
+
+# JSON responses at least this big are gzip / brotli compressed (brotli needs
+# the brotli package). Compressed bodies of responses with an ETag are cached
+# by a digest of the uncompressed body.
+COMPRESSION_MIN_SIZE = 1024  # bytes
+COMPRESSION_CACHE_TIMEOUT = 10 * 60
+
+# Request metrics, scraped from /metrics (see core.metrics). Worker processes
+# share totals through files in METRICS_DIR; set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on scrapes.
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "storefront-metrics")
+)
+METRICS_FLUSH_INTERVAL = 5  # seconds
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Sampled cProfile + SQL profiles of requests, viewed at /admin/profiles/
+# (see core.profiling). PROFILING_ROUTES maps path prefixes to their own
+# sample rate, e.g. {"/store/orders/": 0.05}; "X-Profile: <PROFILING_TOKEN>"
+# profiles any request.
+PROFILING_ENABLED = True
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_ROUTES = {}
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_DIR = os.environ.get(
+    "PROFILING_DIR", os.path.join(tempfile.gettempdir(), "storefront-profiles")
+)
+PROFILING_MAX_PROFILES = 200
+
+# Queries slower than SLOW_QUERY_THRESHOLD are counted by fingerprint and view
+# in core.SlowQuery (see core.slow_queries), listed in the admin and by
+# `manage.py slow_queries`. A sample of them also gets its EXPLAIN plan;
+# EXPLAIN ANALYZE runs the query again, so it is only used on replicas.
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", 0.2))  # seconds
+SLOW_QUERY_EXPLAIN_RATE = 0.1
+SLOW_QUERY_EXPLAIN_ANALYZE = False
+
+# The rest of the middleware depends on the URL (see core.middleware): the
+# JWT API doesn't need sessions, CSRF, messages or the debug toolbar.
+MIDDLEWARE_PROFILES = {
+    "default": [
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.middleware.csrf.CsrfViewMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "core.middleware.ReplicaMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+        "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    ],
+    "api": [
+        "core.middleware.ReplicaMiddleware",
+    ],
+}
+MIDDLEWARE_PROFILE_PREFIXES = {
+    "/store/": "api",
+    "/auth/": "api",
+    "/admin/": "default",
+    "/metrics": "api",
+}
+
+# The toolbar only looks for its middleware in MIDDLEWARE, it is in the
+# "default" profile. The profiles themselves are checked by core.checks.
+SILENCED_SYSTEM_CHECKS = [
+    "debug_toolbar.W001",
 ]
 
 # if DEBUG:
@@ -82,8 +152,18 @@ REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # orjson backed when it is installed, DRF's json otherwise
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.ClaimsJWTAuthentication",
     ),
     # "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
 }
@@ -98,8 +178,13 @@ DJOSER = {
 
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("JWT",),
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=300),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=300),
+    # Access tokens carry customer_id / is_staff / membership claims that are
+    # trusted without a database hit, so they must be short-lived. Refreshing
+    # re-checks that the user is active and re-reads the claims.
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
+    "TOKEN_OBTAIN_SERIALIZER": "core.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "core.serializers.TokenRefreshSerializer",
 }
 
 ROOT_URLCONF = "storefront.urls"
@@ -129,6 +214,15 @@ WSGI_APPLICATION = "storefront.wsgi.application"
 
 # Moved to /storefront/settings/dev.py/
 
+# Catalog, review and order history GETs read from these DATABASES aliases
+# (see core.routers). Locally, a second alias for the same database will do.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_MAX_LAG = 2  # seconds
+REPLICA_LAG_CHECK_INTERVAL = 5  # seconds
+# Clients read their own writes from the primary for this long
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -189,12 +283,23 @@ ADMINS = [("Admin", "fake.admin@dev.com")]
 # https://djangocentral.com/how-to-use-celery-with-django/#celery-broker
 
 
+# playground.tasks.notify_customers emails every customer, so it is started
+# on demand (notify_customers.delay(message)) rather than scheduled.
 CELERY_BEAT_SCHEDULE = {
-    "notify_customers": {
-        "task": "playground.tasks.notify_customers",
-        "schedule": 5,  # sec
-        "args": ["Hello world"],
-    }
+    "reap_abandoned_carts": {
+        "task": "store.tasks.reap_abandoned_carts",
+        "schedule": crontab(minute=30, hour=3),  # daily, off-peak
+    },
+    # Checkout triggers the relay on commit; this catches missed triggers
+    # and retries failed events.
+    "relay_outbox": {
+        "task": "store.tasks.relay_outbox",
+        "schedule": 60,  # sec
+    },
+    "rollup_sales": {
+        "task": "store.tasks.rollup_sales",
+        "schedule": crontab(minute="*/15"),
+    },
 }
 
 # Optional settings from Celery docs
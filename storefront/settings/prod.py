@@ -8,10 +8,27 @@ SECRET_KEY = os.environ["SECRET_KEY"]
 
 ALLOWED_HOSTS = ["buy-store-prod-17b181031b24.herokuapp.com"]
 
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+
+MIDDLEWARE_PROFILES = {
+    name: [path for path in paths if not path.startswith("debug_toolbar.")]
+    for name, paths in MIDDLEWARE_PROFILES.items()
+}
+
 DATABASE_URL = os.environ["HEROKU_POSTGRESQL_PINK_URL"]
 
 DATABASES = {"default": dj_database_url.config()}
 
+# Comma-separated URLs of read replicas of the default database
+for i, url in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(","))
+):
+    DATABASES[f"replica{i}"] = {
+        **dj_database_url.parse(url),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
 REDIS_URL = os.environ["REDIS_URL"]
 
 CELERY_BROKER_URL = REDIS_URL  # Replace with your Redis URL
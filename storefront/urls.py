@@ -22,9 +22,6 @@ from django.urls import path, include
 from django.views.generic import RedirectView
 
 
-import debug_toolbar
-
-
 admin.site.site_header = "Storefront Admin"
 admin.site.index_title = "Admin"
 
@@ -36,9 +33,12 @@ urlpatterns = [
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.jwt")),
     path("playground/", include("playground.urls")),
-    path("__debug__/", include(debug_toolbar.urls)),
 ]
 
+# Not installed in production
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    urlpatterns += [path("__debug__/", include("debug_toolbar.urls"))]
+
 
 if settings.DEBUG:
     urlpatterns += static(